@@ -0,0 +1,226 @@
+import pandas as pd
+
+# Alternative execution engine for the groupby heavy aggregation functions in source.py.  The 'polars' engine
+# runs the aggregations on Polars' multi-threaded columnar engine and only converts the (much smaller)
+# aggregated result back to pandas, shaped exactly like the pandas result.  The engine can be chosen per call
+# with the engine argument of each aggregation function, or for the whole session with set_engine.
+#
+# Polars is an optional dependency and is only imported when the polars engine is first used.
+
+ENGINES = ["pandas", "polars"]
+
+_engine = "pandas"
+
+
+def set_engine(engine):
+    """Set the default engine used by the aggregation functions.
+
+    PARAMETERS:
+      - engine is either 'pandas' or 'polars'.
+    """
+    global _engine
+    _engine = check_engine(engine)
+
+
+def get_engine():
+    """Return the default engine used by the aggregation functions."""
+    return _engine
+
+
+def check_engine(engine):
+    if engine not in ENGINES:
+        raise Exception(f"Invalid engine - Needs one of {ENGINES}.")
+    return engine
+
+
+def resolve_engine(engine):
+    """Return the engine to use for a call, falling back to the session default when engine is None."""
+    return get_engine() if engine is None else check_engine(engine)
+
+
+def import_polars():
+    try:
+        import polars as pl
+    except ImportError:
+        raise ImportError("The polars engine needs the polars package, install it with 'pip install polars'.")
+    return pl
+
+
+def to_polars(dataf, columns):
+    """Convert only the columns an aggregation needs to a Polars dataframe, including the index if it is one
+    of them."""
+    pl = import_polars()
+    if dataf.index.name in columns:
+        dataf = dataf.reset_index()
+
+    return pl.from_pandas(dataf[columns])
+
+
+def group_mean(dataf, keys, day_key=None):
+    """Mean Count by keys on the Polars engine, sorted and with missing keys dropped like a pandas groupby.
+
+    VALUE: return a Pandas dataframe of the keys and mean Count
+
+    PARAMETERS:
+      - dataf is a Pandas Dataframe.
+      - keys is a list of key columns.
+      - day_key is an optional datetime key column to truncate to the day first.
+    """
+    pl = import_polars()
+    frame = to_polars(dataf, keys + ['Count'])
+    if day_key is not None:
+        frame = frame.with_columns(pl.col(day_key).dt.truncate("1d"))
+
+    result = (frame.drop_nulls(keys)
+              .group_by(keys)
+              .agg(pl.col('Count').cast(pl.Float64).mean())
+              .sort(keys)
+              .to_pandas())
+
+    return result
+
+
+def group_sum(dataf, key):
+    """Sum of Count by a single key on the Polars engine.
+
+    VALUE: return a Pandas Series of summed Count indexed by key
+    """
+    pl = import_polars()
+    result = (to_polars(dataf, [key, 'Count'])
+              .drop_nulls([key])
+              .group_by(key)
+              .agg(pl.col('Count').sum())
+              .sort(key)
+              .to_pandas())
+
+    return result.set_index(key)['Count']
+
+
+def mean_hourly(dataf, freq, location=False):
+    """Polars engine version of source.mean_hourly and source.mean_hourly_location.
+
+    PARAMETERS:
+      - dataf is a Pandas Dataframe.
+      - freq is the time frequency you'd like to resample to.
+      - location, if True, groups by Location first as in mean_hourly_location.
+    """
+    prefix = ['Location'] if location else []
+
+    if freq == "day":
+        keys = prefix + ['DateTime', 'BRCWeekNum', 'BRCMonth', 'BRCYear']
+        return group_mean(dataf, keys, day_key='DateTime').set_index(keys)['Count']
+    elif freq == "month":
+        return group_mean(dataf, prefix + ['BRCMonthNum', 'BRCMonth', 'BRCYear'])
+    elif freq == "week":
+        keys = prefix + ['BRCWeekNum'] + ([] if location else ['BRCYear'])
+        return group_mean(dataf, keys).set_index(keys)['Count']
+    elif freq == "year":
+        keys = prefix + ['BRCYear']
+        return group_mean(dataf, keys).set_index(keys)['Count']
+
+    return dataf
+
+
+def daily_sums(dataf):
+    """Daily sum of Count from a DateTime index on the Polars engine, with a row for every day in the range.
+
+    VALUE: return a Pandas Series of daily footfall indexed by DateTime
+    """
+    pl = import_polars()
+    name = dataf.index.name if dataf.index.name is not None else 'DateTime'
+    frame = pl.from_pandas(pd.DataFrame({name: dataf.index, 'Count': dataf['Count'].values}))
+
+    result = (frame.group_by(pl.col(name).dt.truncate("1d"))
+              .agg(pl.col('Count').sum())
+              .sort(name)
+              .to_pandas()
+              .set_index(name)['Count'])
+
+    # Days without any records are zero in a pandas resample
+    days = pd.date_range(result.index.min(), result.index.max(), freq='D', name=name)
+
+    return result.reindex(days, fill_value=0)
+
+
+def resample_day(data):
+    """Polars engine version of source.resample_day."""
+    daily = daily_sums(data).to_frame()
+    daily['weekday'] = daily.index.dayofweek
+    daily['weekdayname'] = daily.index.day_name()
+
+    return daily.groupby(['weekday', 'weekdayname'])['Count'].agg(['sum', 'mean']).droplevel(level=0)
+
+
+def calculate_baseline(dataf):
+    """Polars engine version of source.calculate_baseline.
+
+    The daily aggregation runs on Polars and the baseline comparison, which only touches one row per day, runs
+    in pandas.  Unlike the pandas engine the input dataframe is not given a Day_Name column.
+    """
+    daily = daily_sums(dataf)
+    # A pandas resample by day and Day_Name only keeps the days with records
+    daily = daily.loc[daily.index.isin(dataf.index.normalize().unique())]
+
+    dataf = pd.DataFrame({'Day_Name': daily.index.day_name(), 'Count': daily.values}, index=daily.index)
+
+    baseline = dataf[(dataf.index >= "2020-01-03") & (dataf.index <= "2020-03-05")]
+    baseline = baseline.groupby('Day_Name')['Count'].median()
+
+    dataf = dataf.loc[dataf.index > "2020-03-05"].copy()
+    dataf.loc[:, 'baseline'] = dataf.Day_Name.map(baseline.to_dict())
+    dataf.loc[:, 'baseline_change'] = dataf.Count - dataf.baseline
+    dataf.loc[:, 'baseline_per_change'] = (dataf.baseline_change / dataf.baseline) * 100
+
+    return dataf
+
+
+def cross_check(func, dataf, *args, **kwargs):
+    """Run an aggregation function on both engines and check the results match.
+
+    VALUE: return the pandas engine result, raising an AssertionError if the polars result differs
+
+    PARAMETERS:
+      - func is one of the source.py aggregation functions taking an engine argument.
+      - dataf is the Pandas Dataframe to aggregate, copied for each engine.
+      - args and kwargs are passed on to func.
+    """
+    expected = func(dataf.copy(), *args, engine="pandas", **kwargs)
+    result = func(dataf.copy(), *args, engine="polars", **kwargs)
+
+    # The pandas engine's daily results keep the 'D' frequency of the resample, which the polars engine does not
+    # set, so only the index values are compared
+    if isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_index_type=False, check_freq=False)
+    else:
+        pd.testing.assert_series_equal(result, expected, check_dtype=False, check_index_type=False, check_freq=False)
+
+    return expected
+
+
+def cross_check_all(dataf):
+    """Cross check every aggregation function with a polars engine on the same footfall data.
+
+    VALUE: return a list of the names of the functions checked, raising an AssertionError on the first mismatch
+
+    PARAMETERS:
+      - dataf is a cleaned Pandas Dataframe with Location, DateTime, Count and the BRC calendar columns.
+    """
+    from footfall import core
+
+    indexed = dataf.set_index('DateTime')
+    checks = [(core.resample_day, indexed[['Count']], ()),
+              (core.resample_week, indexed, ()),
+              (core.resample_month, indexed, ()),
+              (core.resample_year, indexed, ()),
+              (core.calculate_baseline, indexed, ())]
+    checks += [(func, dataf, (freq, )) for func in [core.mean_hourly, core.mean_hourly_location]
+               for freq in ['day', 'week', 'month', 'year']]
+
+    checked = []
+    for func, data, args in checks:
+        name = " ".join([func.__name__] + list(args))
+        cross_check(func, data, *args)
+        print(f"{name}: engines match")
+        checked.append(name)
+
+    return checked
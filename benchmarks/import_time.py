@@ -0,0 +1,130 @@
+import argparse
+import datetime
+import json
+import os, os.path
+import platform
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Import time benchmark for the footfall library.  Each module is imported in a fresh interpreter several times,
+# recording the import time, peak memory and which heavy libraries the import pulled in.  Importing the library
+# should never load the plotting or modelling stacks, so any of those showing up counts as a regression, as does
+# a slowdown against a stored baseline.
+#
+# Run from the repository root:
+#   python -m benchmarks.import_time --output import_results.json
+#   python -m benchmarks.import_time --baseline import_baseline.json
+
+MODULES = ["footfall.core", "footfall.features", "footfall.modelling", "footfall.charts", "source"]
+
+# Libraries that should only be imported when a chart or model is first made
+HEAVY_MODULES = ["sklearn", "scipy", "plotly.express", "plotly.graph_objects", "statsmodels", "joblib", "polars",
+                 "prophet"]
+
+# Script run in a fresh interpreter to time one import
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+try:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+except ImportError:
+    peak = None
+print(json.dumps({{'time_s': elapsed, 'peak_rss_mb': peak,
+                  'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(module, repeats):
+    """Import a module in a fresh interpreter several times.
+
+    VALUE: return a dictionary of the median and minimum import time, the peak memory and the heavy libraries loaded
+
+    PARAMETERS:
+      - module is the module name to import.
+      - repeats is the number of fresh interpreters to time it in.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    probe = PROBE.format(module=module, heavy=HEAVY_MODULES)
+
+    runs = []
+    for i in range(repeats):
+        output = subprocess.run([sys.executable, "-c", probe], cwd=root, capture_output=True, text=True, check=True)
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    times = [run['time_s'] for run in runs]
+    peaks = [run['peak_rss_mb'] for run in runs if run['peak_rss_mb'] is not None]
+
+    return {'module': module,
+            'time_s': float(np.median(times)),
+            'time_min_s': float(np.min(times)),
+            'peak_rss_mb': float(np.median(peaks)) if peaks else None,
+            'heavy': runs[0]['heavy']}
+
+
+def compare_results(results, baseline, tolerance):
+    """Compare import times with a baseline run.
+
+    VALUE: return a Pandas dataframe of import times against the baseline, with a regression flag
+
+    PARAMETERS:
+      - results and baseline are import benchmark dictionaries as written to json.
+      - tolerance is the fractional slowdown allowed before a module counts as a regression.
+    """
+    current = pd.DataFrame(results['results']).set_index('module')
+    previous = pd.DataFrame(baseline['results']).set_index('module')
+    comparison = current[['time_s']].join(previous[['time_s']], rsuffix='_baseline', how='inner')
+
+    comparison['time_ratio'] = comparison.time_s / comparison.time_s_baseline
+    comparison['regression'] = comparison.time_ratio > 1 + tolerance
+
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the footfall library.")
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", default="import_results.json")
+    parser.add_argument("--baseline", help="json results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    results = [time_import(module, args.repeats) for module in args.modules]
+
+    output = {'meta': {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                       'python': platform.python_version(),
+                       'platform': platform.platform()},
+              'results': results}
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+
+    print(pd.DataFrame(results).set_index('module').to_string())
+    print(f"Results written to {args.output}")
+
+    failed = False
+    heavy = [result for result in results if result['heavy']]
+    for result in heavy:
+        print(f"{result['module']} imports {', '.join(result['heavy'])}")
+        failed = True
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        comparison = compare_results(output, baseline, args.tolerance)
+        print(comparison.to_string())
+        failed = failed or comparison.regression.any()
+
+    if failed:
+        print("Import regressions found")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os, os.path
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_footfall_csvs
+from footfall_data_download import import_data
+from source import *
+
+# Benchmark suite for the footfall pipeline.  Generates synthetic Data Mill North CSVs at several scales, then
+# times and memory-profiles each stage of the pipeline and writes the results to json so runs can be compared
+# against a stored baseline.
+#
+# Run from the repository root:
+#   python -m benchmarks.run_benchmarks --scales small medium --output bench_results.json
+#   python -m benchmarks.run_benchmarks --baseline bench_baseline.json
+
+SCALES = {
+    "small": {'n_cameras': 3, 'n_years': 1},
+    "medium": {'n_cameras': 10, 'n_years': 3},
+    "large": {'n_cameras': 25, 'n_years': 10},
+}
+
+
+def clean_pipeline(dataf):
+    """The cleaning chain used by the analysis notebooks."""
+    return (dataf
+            .pipe(start_pipeline)
+            .pipe(set_start_date, '2008-08-27')
+            .pipe(combine_cameras)
+            .pipe(check_remove_dup)
+            .pipe(remove_new_cameras)
+            .pipe(create_BRC_MonthNum))
+
+
+def daily_total(dataf):
+    """Resample cleaned footfall to the all-camera daily total used for modelling."""
+    daily = dataf.groupby([pd.Grouper(key='DateTime', freq='D')])['Count'].sum().to_frame()
+    return daily.astype(float)
+
+
+def model_frame(daily, n_in):
+    """Build the walk forward validation frame from the daily total and lockdown predictors."""
+    supervised = series_to_supervised(daily[['Count']], n_in)
+    predictors = create_lockdown_predictors(daily.drop(columns='Count'))
+    return predictors.join(supervised, how='inner')
+
+
+def measure(func, args, repeats):
+    """Time a function over several repeats and record its peak memory allocation in one further run.
+
+    Timing and memory are measured in separate runs because tracemalloc slows the code it traces.
+
+    VALUE: return a tuple of the function's result and a dictionary of timings and peak memory
+
+    PARAMETERS:
+      - func is the function to benchmark.
+      - args is a tuple of arguments for func.
+      - repeats is the number of timed runs.
+    """
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = func(*args)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return result, {'time_s': float(np.median(times)),
+                    'time_min_s': float(np.min(times)),
+                    'times_s': times,
+                    'peak_mem_mb': peak / 1024 ** 2}
+
+
+def benchmark_scale(name, n_cameras, n_years, repeats, workdir, n_test=7, n_in=7, tree=10):
+    """Run every stage benchmark at one scale.
+
+    VALUE: return a list of result dictionaries, one per stage
+
+    PARAMETERS:
+      - name is the scale name.
+      - n_cameras and n_years set the size of the synthetic data.
+      - repeats is the number of timed runs per stage.
+      - workdir is a scratch directory for the synthetic CSVs.
+      - n_test, n_in and tree configure the walk forward validation stage.
+    """
+    datadir = os.path.join(workdir, name)
+    generate_footfall_csvs(datadir, n_cameras, n_years)
+
+    imported, import_stats = measure(import_data, (datadir,), repeats)
+    imported = imported.astype({'Count': float, 'BRCYear': int, 'BRCWeekNum': int})
+    cleaned, clean_stats = measure(clean_pipeline, (imported,), repeats)
+    daily = daily_total(cleaned)
+    lockdown, lockdown_stats = measure(create_lockdown_predictors, (daily.copy(),), repeats)
+    supervised, supervised_stats = measure(series_to_supervised, (daily[['Count']], n_in), repeats)
+    data = model_frame(daily, n_in)
+    scalecols = [f'var1(t-{i})' for i in range(1, n_in + 1)]
+    validation, validation_stats = measure(walk_forward_validation, (data, n_test, scalecols, n_in, tree), 1)
+
+    stages = [("import_data", len(imported), import_stats),
+              ("clean_pipeline", len(cleaned), clean_stats),
+              ("create_lockdown_predictors", len(daily), lockdown_stats),
+              ("series_to_supervised", len(supervised), supervised_stats),
+              ("walk_forward_validation", len(data), validation_stats)]
+
+    return [dict({'stage': stage, 'scale': name, 'n_cameras': n_cameras, 'n_years': n_years, 'rows': rows}, **stats)
+            for stage, rows, stats in stages]
+
+
+def compare_results(results, baseline, tolerance):
+    """Compare benchmark results with a baseline run.
+
+    VALUE: return a Pandas dataframe of stage timings and memory against the baseline, with a regression flag
+
+    PARAMETERS:
+      - results and baseline are benchmark result dictionaries as written to json.
+      - tolerance is the fractional slowdown or memory growth allowed before a stage counts as a regression.
+    """
+    current = pd.DataFrame(results['results']).set_index(['stage', 'scale'])
+    previous = pd.DataFrame(baseline['results']).set_index(['stage', 'scale'])
+    comparison = current[['time_s', 'peak_mem_mb']].join(
+        previous[['time_s', 'peak_mem_mb']], rsuffix='_baseline', how='inner')
+
+    comparison['time_ratio'] = comparison.time_s / comparison.time_s_baseline
+    comparison['mem_ratio'] = comparison.peak_mem_mb / comparison.peak_mem_mb_baseline
+    comparison['regression'] = (comparison.time_ratio > 1 + tolerance) | (comparison.mem_ratio > 1 + tolerance)
+
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the footfall pipeline on synthetic data.")
+    parser.add_argument("--scales", nargs="+", default=["small", "medium"], choices=list(SCALES))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="json results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="footfall_bench_")
+    try:
+        results = []
+        for name in args.scales:
+            print(f"Benchmarking {name} scale ({SCALES[name]['n_cameras']} cameras, {SCALES[name]['n_years']} years)")
+            results += benchmark_scale(name, SCALES[name]['n_cameras'], SCALES[name]['n_years'], args.repeats,
+                                       workdir)
+    finally:
+        shutil.rmtree(workdir)
+
+    output = {'meta': {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                       'python': platform.python_version(),
+                       'pandas': pd.__version__,
+                       'numpy': np.__version__,
+                       'platform': platform.platform()},
+              'results': results}
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+
+    print(pd.DataFrame(results).set_index(['stage', 'scale'])[['rows', 'time_s', 'peak_mem_mb']].to_string())
+    print(f"Results written to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        comparison = compare_results(output, baseline, args.tolerance)
+        print(comparison.to_string())
+        if comparison.regression.any():
+            print("Performance regressions found against the baseline")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import json
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_footfall
+from forecast_service import ForecastService, make_handler, save_service, train_service_models
+from multi_series import daily_location_counts
+from source import create_lockdown_predictors
+
+# End to end check of the forecast service.  Trains small models on synthetic footfall, saves them, starts the
+# HTTP server on a free localhost port in a background thread and checks each endpoint's status codes and
+# responses, including the error cases.
+#
+# Run from the repository root:
+#   python -m benchmarks.service_check
+
+
+def fixture_service(dirpath, n_cameras=2, n_in=7, n_out=7, tree=10):
+    """Train and save forecast models for a year of synthetic footfall.
+
+    VALUE: return the list of camera names
+
+    PARAMETERS:
+      - dirpath is the directory to save the service to.
+      - n_cameras is the number of cameras.
+      - n_in is the number of time lags.
+      - n_out is the longest forecast horizon.
+      - tree is the number of trees.
+    """
+    daily = daily_location_counts(synthetic_footfall(n_cameras, 1, start="2020-01-01"))
+    days = pd.date_range(daily.index[0], daily.index[-1] + pd.Timedelta(days=n_out), freq='D')
+    shared = create_lockdown_predictors(pd.DataFrame(index=days))
+
+    save_service(dirpath, train_service_models(daily, shared, n_in, n_out, tree), shared)
+
+    return list(daily.columns)
+
+
+def get_json(url):
+    """Request a url, returning the status code and decoded JSON body for successes and errors alike."""
+    try:
+        with urlopen(url) as response:
+            return response.status, json.load(response)
+    except HTTPError as e:
+        return e.code, json.load(e)
+
+
+def check_service(dirpath, cameras):
+    """Serve the saved models on localhost and query every endpoint.
+
+    VALUE: return a list of failure messages, empty if every check passed
+
+    PARAMETERS:
+      - dirpath is a directory written by save_service.
+      - cameras is the list of cameras the models were trained for.
+    """
+    service = ForecastService(dirpath)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(service))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    camera = cameras[0].replace(" ", "%20")
+
+    checks = [("cameras", "/cameras", 200),
+              ("forecast", f"/forecast?camera={camera}&days=3", 200),
+              ("cached forecast", f"/forecast?camera={camera}&days=3", 200),
+              ("missing camera", "/forecast?days=3", 400),
+              ("unknown camera", "/forecast?camera=Nowhere&days=3", 404),
+              ("days out of range", f"/forecast?camera={camera}&days=99", 400),
+              ("days not a number", f"/forecast?camera={camera}&days=three", 400),
+              ("unknown path", "/nowhere", 404),
+              ("metrics", "/metrics", 200)]
+
+    failures = []
+    responses = {}
+    try:
+        for name, path, expected in checks:
+            status, body = get_json(base + path)
+            responses[name] = body
+            print(f"{name}: {status} {json.dumps(body)[:80]}")
+            if status != expected:
+                failures.append(f"{name} returned {status}, expected {expected}")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    if responses['cameras'].get('cameras') != sorted(cameras):
+        failures.append("cameras did not list every trained camera")
+    if len(responses['forecast'].get('forecast', [])) != 3:
+        failures.append("forecast did not return 3 days")
+    if responses['cached forecast'] != responses['forecast']:
+        failures.append("cached forecast differs from the first forecast")
+    if responses['metrics'].get('cache_hits') != 1:
+        failures.append("cached forecast was not served from the cache")
+
+    # Results handed out by the service must not share the cached lists
+    first = service.forecast(cameras[0], 3)
+    first[0]['predicted'] = -1.0
+    if service.forecast(cameras[0], 3)[0]['predicted'] == -1.0:
+        failures.append("changing a returned forecast changed the cached forecast")
+
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the forecast service end to end on localhost.")
+    parser.add_argument("--cameras", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        cameras = fixture_service(dirpath, args.cameras)
+        failures = check_service(dirpath, cameras)
+
+    for failure in failures:
+        print(failure)
+    if failures:
+        print("Forecast service checks failed")
+        sys.exit(1)
+    print("Forecast service checks passed")
+
+
+if __name__ == "__main__":
+    main()
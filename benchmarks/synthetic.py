@@ -0,0 +1,143 @@
+import calendar
+import os, os.path
+
+import numpy as np
+import pandas as pd
+
+# Synthetic footfall generator.  Writes monthly CSV files in the layout of the Data Mill North footfall feed,
+# rotating through the column name and hour format variants that import_data has to cope with, for any number
+# of cameras and years.
+
+CAMERA_NAMES = ["Albion Street North", "Albion Street South", "Briggate", "Briggate at McDonalds",
+                "Commercial Street at Lush", "Commercial Street at Sharps", "Dortmund Square", "Headrow",
+                "Park Row", "Albion Street at McDonalds"]
+
+# Each variant maps the cleaned column names to the names used in one generation of the feed, along with the
+# format the Hour column was published in
+COLUMN_VARIANTS = [
+    {'Location': 'Location', 'Count': 'Count', 'BRCYear': 'BRCYear', 'BRCMonth': 'BRCMonthName',
+     'BRCWeekNum': 'BRCWeekNum', 'hour_format': 'int'},
+    {'Location': 'LocationName', 'Count': 'InCount', 'BRCYear': 'Year', 'BRCMonth': 'Month',
+     'BRCWeekNum': 'WeekNum', 'hour_format': 'time'},
+    {'Location': 'Location', 'Count': 'InCount', 'BRCYear': 'BRCYear', 'BRCMonth': 'BRCMonthName',
+     'BRCWeekNum': 'BRCWeek', 'hour_format': 'float'},
+    {'Location': 'LocationName', 'Count': 'Count', 'BRCYear': 'Year', 'BRCMonth': 'Month',
+     'BRCWeekNum': 'BRCWeekNum', 'hour_format': 'time'},
+]
+
+
+def camera_names(n_cameras):
+    """Return n_cameras camera names, starting with real Leeds camera names so the cleaning steps that look for
+    specific cameras have work to do."""
+    names = CAMERA_NAMES[:n_cameras]
+    names += [f"Camera {i}" for i in range(len(names), n_cameras)]
+
+    return names
+
+
+def synthetic_footfall(n_cameras, n_years, start="2015-01-01", seed=0):
+    """Create hourly footfall for a number of cameras in the cleaned column layout.
+
+    Counts follow a daily profile peaking around lunchtime, a weekly cycle and a yearly cycle, scaled per camera,
+    with Poisson noise.
+
+    VALUE: return a Pandas dataframe with Location, Date, Hour, Count, DateTime, BRCWeekNum, BRCMonth and BRCYear
+    columns
+
+    PARAMETERS:
+      - n_cameras is the number of cameras.
+      - n_years is the number of years of hourly data.
+      - start is the first day of data.
+      - seed is the random seed.
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(start)
+    end = start + pd.DateOffset(years=n_years) - pd.Timedelta(hours=1)
+    datetimes = pd.date_range(start, end, freq='h')
+
+    hour = datetimes.hour.values
+    daily_profile = np.exp(-((hour - 13) / 4.0) ** 2)
+    weekly = 1 + 0.3 * (datetimes.dayofweek.values == 5)
+    yearly = 1 + 0.2 * np.cos(2 * np.pi * (datetimes.dayofyear.values - 350) / 365.25)
+    shape = 50 + 1500 * daily_profile * weekly * yearly
+
+    names = camera_names(n_cameras)
+    scale = rng.uniform(0.3, 1.5, n_cameras)
+    counts = rng.poisson(np.outer(scale, shape))
+
+    n_hours = len(datetimes)
+    dataf = pd.DataFrame({'Location': np.repeat(names, n_hours),
+                          'Date': np.tile(datetimes.normalize(), n_cameras),
+                          'Hour': np.tile(hour, n_cameras),
+                          'Count': counts.ravel(),
+                          'DateTime': np.tile(datetimes, n_cameras)})
+    dataf['BRCWeekNum'] = dataf.DateTime.dt.isocalendar().week.astype(int).values
+    dataf['BRCMonth'] = dataf.DateTime.dt.month_name()
+    dataf['BRCYear'] = dataf.DateTime.dt.year
+
+    return dataf
+
+
+def format_hours(hours, hour_format):
+    """Format an integer hour column the way one generation of the feed published it."""
+    if hour_format == 'time':
+        return pd.Series(hours).map(lambda h: f"{h:02d}:00:00").values
+    if hour_format == 'float':
+        return hours.astype(float)
+
+    return hours
+
+
+def write_footfall_csvs(dataf, outdir):
+    """Write footfall to one CSV per month in the Data Mill North feed layout.
+
+    Months rotate through COLUMN_VARIANTS, dates are written day first and some location names are padded with
+    whitespace as in the real files.
+
+    VALUE: return a list of the file paths written
+
+    PARAMETERS:
+      - dataf is a Pandas Dataframe from synthetic_footfall.
+      - outdir is the directory to write to, created if it doesn't exist.
+    """
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    paths = []
+    months = dataf.DateTime.dt.to_period('M')
+    for i, (month, frame) in enumerate(dataf.groupby(months)):
+        variant = COLUMN_VARIANTS[i % len(COLUMN_VARIANTS)]
+        locations = frame.Location.values
+        if i % 3 == 0:
+            locations = np.char.add(locations.astype(str), " ")
+
+        out = pd.DataFrame({variant['Location']: locations,
+                            'Date': frame.Date.dt.strftime("%d/%m/%Y").values,
+                            'Hour': format_hours(frame.Hour.values, variant['hour_format']),
+                            variant['Count']: frame.Count.values,
+                            variant['BRCYear']: frame.BRCYear.values,
+                            variant['BRCMonth']: frame.BRCMonth.values,
+                            variant['BRCWeekNum']: frame.BRCWeekNum.values})
+
+        filename = f"Monthly%20Data%20Feed-{calendar.month_name[month.month]}%20{month.year}.csv"
+        path = os.path.join(outdir, filename)
+        # The downloaded files keep the index written by the download script
+        out.to_csv(path)
+        paths.append(path)
+
+    return paths
+
+
+def generate_footfall_csvs(outdir, n_cameras, n_years, start="2015-01-01", seed=0):
+    """Generate synthetic hourly footfall and write it as Data Mill North style monthly CSVs.
+
+    VALUE: return a list of the file paths written
+
+    PARAMETERS:
+      - outdir is the directory to write to.
+      - n_cameras is the number of cameras.
+      - n_years is the number of years of hourly data.
+      - start is the first day of data.
+      - seed is the random seed.
+    """
+    return write_footfall_csvs(synthetic_footfall(n_cameras, n_years, start, seed), outdir)
@@ -0,0 +1,212 @@
+import numpy as np
+import pandas as pd
+
+from footfall.lazy import lazy_import
+
+# Chart data layer.  Long series are downsampled on the server to a number of points matched to the width of
+# the chart before being sent to the browser, and dense traces are drawn with WebGL (Scattergl) instead of SVG,
+# so figure size and render time stay bounded however much history is plotted.
+
+go = lazy_import('plotly.graph_objects')
+
+# Default chart width in pixels and the number of points kept per pixel when downsampling
+DEFAULT_WIDTH = 1200
+POINTS_PER_PIXEL = 2
+
+# Traces with more points than this are drawn with WebGL
+WEBGL_THRESHOLD = 2000
+
+
+def as_numeric(x):
+    """Return x as float64 values, converting datetimes to nanoseconds, for the downsampling arithmetic."""
+    x = pd.Series(x)
+    if pd.api.types.is_datetime64_any_dtype(x):
+        return x.values.astype('datetime64[ns]').astype(np.int64).astype(float)
+
+    return x.values.astype(float)
+
+
+def lttb_indices(x, y, n_out):
+    """Choose points to keep with the largest-triangle-three-buckets algorithm.
+
+    The first and last points are always kept.  The points in between are split into n_out - 2 buckets and
+    from each bucket the point forming the largest triangle with the previously kept point and the mean of the
+    next bucket is kept, which preserves the visual shape of the line.
+
+    VALUE: return a numpy array of the positions of the points to keep
+
+    PARAMETERS:
+      - x and y are numpy arrays of point coordinates, x in ascending order.
+      - n_out is the number of points to keep.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Mean of the next bucket, or the last point for the final bucket
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) -
+                      (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        keep[i + 1] = previous
+
+    return keep
+
+
+def minmax_indices(y, n_out):
+    """Choose points to keep by taking the minimum and maximum of each of n_out / 2 buckets.
+
+    VALUE: return a numpy array of the positions of the points to keep, in ascending order
+
+    PARAMETERS:
+      - y is a numpy array of values.
+      - n_out is the number of points to keep.
+    """
+    n = len(y)
+    n_buckets = n_out // 2
+    if n_out >= n or n_buckets < 1:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)[:-1]
+    lengths = np.diff(np.append(edges, n))
+    # Position of each point's bucket, then argmin/argmax within buckets via a sort by (bucket, value)
+    bucket = np.repeat(np.arange(n_buckets), lengths)
+    order = np.lexsort((y, bucket))
+    first = np.append(0, np.cumsum(lengths)[:-1])
+    last = np.cumsum(lengths) - 1
+
+    return np.unique(np.concatenate([order[first], order[last]]))
+
+
+def downsample(x, y, width=DEFAULT_WIDTH, method="lttb", points_per_pixel=POINTS_PER_PIXEL):
+    """Downsample a series to the number of points a chart of the given width can show.
+
+    Series short enough to show in full are returned unchanged.  Longer series are split on their runs of
+    missing values and each segment is downsampled with a share of the points matching its length, with the
+    first missing point of each run kept between segments so line charts still break at the gaps.
+
+    VALUE: return a tuple of the kept x and y values
+
+    PARAMETERS:
+      - x and y are array-likes of point coordinates, x in ascending order.
+      - width is the chart width in pixels, or None to keep every point.
+      - method is either 'lttb' or 'minmax'.
+      - points_per_pixel is the number of points kept per pixel of width.
+    """
+    if method not in ["lttb", "minmax"]:
+        raise Exception("Invalid downsampling method - Needs either 'lttb' or 'minmax'.")
+
+    x, y = pd.Series(x).reset_index(drop=True), pd.Series(y).reset_index(drop=True)
+    n_out = int(width * points_per_pixel) if width is not None else None
+    valid = y.notna().values
+    if n_out is None or len(x) <= n_out:
+        return x.values, y.values
+
+    # Segments are the runs of valid values, each followed by the missing point that starts the next gap
+    edges = np.flatnonzero(np.diff(np.concatenate([[False], valid, [False]]).astype(int)))
+    starts, ends = edges[::2], edges[1::2]
+    gaps = ends[:-1]
+
+    x_numeric, y_values = as_numeric(x), y.values.astype(float)
+    budget = n_out - len(gaps)
+    keep = [gaps]
+    for start, end in zip(starts, ends):
+        n_segment = max(3, int(budget * (end - start) / valid.sum()))
+        if method == "lttb":
+            segment = lttb_indices(x_numeric[start:end], y_values[start:end], n_segment)
+        else:
+            segment = minmax_indices(y_values[start:end], n_segment)
+        keep.append(start + segment)
+    keep = np.sort(np.concatenate(keep))
+
+    return x.values[keep], y.values[keep]
+
+
+def scatter_trace(x, y, width=DEFAULT_WIDTH, method="lttb", webgl_threshold=WEBGL_THRESHOLD, **kwargs):
+    """Create a line trace from downsampled data, using WebGL when there are still many points.
+
+    VALUE: return a plotly go.Scatter or go.Scattergl trace
+
+    PARAMETERS:
+      - x and y are array-likes of point coordinates, x in ascending order.
+      - width is the chart width in pixels, or None to keep every point.
+      - method is either 'lttb' or 'minmax'.
+      - webgl_threshold is the number of points above which the trace is drawn with WebGL.
+      - kwargs are passed on to the plotly trace, e.g. name or mode.
+    """
+    x, y = downsample(x, y, width, method)
+    trace = go.Scattergl if len(x) > webgl_threshold else go.Scatter
+
+    return trace(x=x, y=y, **kwargs)
+
+
+def line_chart(dataf, x, y, color=None, width=DEFAULT_WIDTH, method="lttb", **kwargs):
+    """Line chart of a long format dataframe in the style of px.line, with each line downsampled.
+
+    Use for the long hourly series in the data quality plots, e.g. hourly counts per camera.
+
+    VALUE: return a plotly figure
+
+    PARAMETERS:
+      - dataf is a Pandas Dataframe in long format.
+      - x and y are the column names to plot, x may be the name of the index.
+      - color is an optional column name to draw one line per value of.
+      - width is the chart width in pixels, or None to keep every point.
+      - method is either 'lttb' or 'minmax'.
+      - kwargs are passed on to each plotly trace.
+    """
+    dataf = dataf.reset_index() if x not in dataf.columns else dataf
+    groups = dataf.groupby(color, sort=False) if color is not None else [(y, dataf)]
+
+    fig = go.Figure()
+    for name, group in groups:
+        group = group.sort_values(x)
+        fig.add_trace(scatter_trace(group[x], group[y], width, method, name=str(name), mode='lines', **kwargs))
+
+    fig.update_xaxes(title_text=x)
+    fig.update_yaxes(title_text=y)
+
+    return fig
+
+
+def zoomable_figure(fig, series, width=DEFAULT_WIDTH, method="lttb"):
+    """Turn a figure into a widget that re-downsamples its traces to the visible range whenever it is zoomed.
+
+    Needs a Jupyter frontend with ipywidgets.  The full resolution data stays in the Python kernel and only the
+    points for the current view are sent to the browser.
+
+    VALUE: return a plotly go.FigureWidget
+
+    PARAMETERS:
+      - fig is a plotly figure whose traces were built with scatter_trace.
+      - series is a list of (x, y) full resolution data, one per trace in fig.
+      - width is the chart width in pixels.
+      - method is either 'lttb' or 'minmax'.
+    """
+    widget = go.FigureWidget(fig)
+    full = [(pd.Series(x).reset_index(drop=True), pd.Series(y).reset_index(drop=True)) for x, y in series]
+
+    def rescale(layout, x_range):
+        with widget.batch_update():
+            for trace, (x, y) in zip(widget.data, full):
+                if x_range is None:
+                    visible = np.ones(len(x), dtype=bool)
+                else:
+                    lower, upper = x_range
+                    if pd.api.types.is_datetime64_any_dtype(x):
+                        lower, upper = pd.Timestamp(lower), pd.Timestamp(upper)
+                    visible = ((x >= lower) & (x <= upper)).values
+                trace.x, trace.y = downsample(x[visible], y[visible], width, method)
+
+    widget.layout.xaxis.on_change(rescale, 'range')
+
+    return widget
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+# Vectorised seasonal decomposition.  Decomposes every camera's series at once from a 2-D (series x time) array
+# using a centred moving average trend and per-period seasonal means, the same method as statsmodels'
+# seasonal_decompose, with explicit handling of missing values and an optional robust mode.
+
+
+def weighted_moving_average(values, weights, period, min_valid=1.0):
+    """Centred moving average along the time axis of a 2-D array, computed for every series in one pass.
+
+    Even periods use the 2 x period moving average (half weight on the two end points) so the result stays
+    centred, matching seasonal_decompose.  Missing values and their weights are left out of each window.
+
+    VALUE: return a 2-D numpy array the same shape as values, NaN where too little of the window is observed
+
+    PARAMETERS:
+      - values is a 2-D numpy array of series x time, with NaN for missing values.
+      - weights is a 2-D numpy array of observation weights the same shape as values.
+      - period is the seasonal period in time steps.
+      - min_valid is the fraction of the window's weight that must be observed to produce a value.
+    """
+    n_series, n_time = values.shape
+    half = period // 2
+    observed = ~np.isnan(values)
+    w = np.where(observed, weights, 0.0)
+    wx = np.where(observed, values * weights, 0.0)
+
+    # Window sums from cumulative sums along time, padded so every window start has a zero before it
+    def window_sum(a):
+        cumsum = np.zeros((n_series, n_time + 1))
+        np.cumsum(a, axis=1, out=cumsum[:, 1:])
+        sums = np.full((n_series, n_time), np.nan)
+        sums[:, half:n_time - half] = cumsum[:, 2 * half + 1:] - cumsum[:, :n_time - 2 * half]
+        return sums
+
+    numerator, denominator = window_sum(wx), window_sum(w)
+
+    if period % 2 == 0:
+        # Take off half of the two end points of each window
+        numerator[:, half:n_time - half] -= 0.5 * (wx[:, :n_time - 2 * half] + wx[:, 2 * half:])
+        denominator[:, half:n_time - half] -= 0.5 * (w[:, :n_time - 2 * half] + w[:, 2 * half:])
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        trend = numerator / denominator
+        observed_share = window_sum(observed.astype(float)) / (2 * half + 1)
+
+    trend[~(observed_share >= min_valid)] = np.nan
+    trend[~(denominator > 0)] = np.nan
+
+    return trend
+
+
+def seasonal_means(detrended, weights, period):
+    """Average the detrended values at each position of the seasonal cycle, for every series at once.
+
+    VALUE: return a 2-D numpy array of series x period seasonal effects
+
+    PARAMETERS:
+      - detrended is a 2-D numpy array of series x time, with NaN for missing values.
+      - weights is a 2-D numpy array of observation weights the same shape as detrended.
+      - period is the seasonal period in time steps.
+    """
+    n_series, n_time = detrended.shape
+    n_cycles = -(-n_time // period)
+    padding = n_cycles * period - n_time
+
+    # Fold the time axis into cycles so each seasonal position is one column
+    folded = np.pad(detrended, ((0, 0), (0, padding)), constant_values=np.nan).reshape(n_series, n_cycles, period)
+    folded_weights = np.pad(weights, ((0, 0), (0, padding))).reshape(n_series, n_cycles, period)
+    observed = ~np.isnan(folded)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = (np.where(observed, folded * folded_weights, 0).sum(axis=1) /
+                 np.where(observed, folded_weights, 0).sum(axis=1))
+
+    return means
+
+
+def decompose(values, period, model='additive', robust=False, iterations=3, min_valid=1.0):
+    """Decompose many series into trend, seasonal and residual components in one vectorised pass.
+
+    In robust mode the decomposition is repeated with bisquare robustness weights taken from the previous
+    residuals, as in STL, so that outliers such as camera faults have little influence on the trend and seasonal
+    components.  Trend and seasonal estimates are still moving averages and means rather than STL's loess fits.
+
+    VALUE: return a dictionary of 2-D numpy arrays (observed, trend, seasonal, residuals), each series x time
+
+    PARAMETERS:
+      - values is a 2-D numpy array of series x time, with NaN for missing values.
+      - period is the seasonal period in time steps (e.g. 7 or 365 for daily data, 24 for hourly data).
+      - model is either 'additive' or 'multiplicative'.
+      - robust, if True, downweights outliers using robustness iterations.
+      - iterations is the number of robustness iterations.
+      - min_valid is the fraction of each trend window that must be observed to estimate the trend.
+    """
+    if model not in ['additive', 'multiplicative']:
+        raise Exception("Invalid model - Needs either 'additive' or 'multiplicative'.")
+
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    if values.shape[1] < 2 * period:
+        raise Exception(f"Each series needs at least two complete cycles ({2 * period} observations).")
+
+    weights = np.ones_like(values)
+    for i in range(iterations if robust else 1):
+        trend = weighted_moving_average(values, weights, period, min_valid)
+
+        if model == 'additive':
+            means = seasonal_means(values - trend, weights, period)
+            means -= np.nanmean(means, axis=1, keepdims=True)
+        else:
+            means = seasonal_means(values / trend, weights, period)
+            means /= np.nanmean(means, axis=1, keepdims=True)
+
+        seasonal = np.tile(means, -(-values.shape[1] // period))[:, :values.shape[1]]
+        residuals = values - trend - seasonal if model == 'additive' else values / (trend * seasonal)
+
+        if robust:
+            # Bisquare weights on the size of each residual relative to six times its series' median absolute
+            # residual.  Points without a residual keep their previous weight.
+            centred = residuals if model == 'additive' else residuals - 1
+            scale = 6 * np.nanmedian(np.abs(centred), axis=1, keepdims=True)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                u = np.abs(centred) / scale
+            weights = np.where(np.isnan(u), weights, np.clip(1 - u ** 2, 0, None) ** 2)
+
+    return {'observed': values, 'trend': trend, 'seasonal': seasonal, 'residuals': residuals}
+
+
+def decompose_frame(dataf, period, model='additive', robust=False, iterations=3, min_valid=1.0):
+    """Decompose every column of a wide time series dataframe and return a tidy result for charting.
+
+    VALUE: return a Pandas dataframe with Location, DateTime, variable (observed, trend, seasonal, residuals)
+    and value columns
+
+    PARAMETERS:
+      - dataf is a Pandas Dataframe indexed by time with one column per camera (see daily_location_counts).
+      - period, model, robust, iterations and min_valid are passed to decompose.
+    """
+    components = decompose(dataf.values.T, period, model, robust, iterations, min_valid)
+
+    n_series, n_time = components['observed'].shape
+    frames = []
+    for variable, array in components.items():
+        frames.append(pd.DataFrame({'Location': np.repeat(dataf.columns.values, n_time),
+                                    'DateTime': np.tile(dataf.index.values, n_series),
+                                    'variable': variable,
+                                    'value': array.ravel()}))
+
+    return pd.concat(frames, ignore_index=True)
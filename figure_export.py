@@ -0,0 +1,168 @@
+import json
+import os, os.path
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+# Batch static image export for the report figures.  Figures are rendered by a small pool of worker processes
+# that each start the Kaleido renderer once and keep it warm for every figure they are given, instead of paying
+# the renderer start-up cost on each fig.write_image call.  A manifest in the output folder records a hash of
+# each exported figure's spec and export settings, so figures that haven't changed since the last export are
+# skipped.
+#
+# Example:
+#   export_figures({"Model1Validation100.svg": fig100, "lagplot1.svg": lagfig}, "images")
+
+MANIFEST = ".export_manifest.json"
+
+# The worker pool, kept between export_figures calls so the renderers stay warm for the whole session
+_pool = None
+_pool_workers = None
+
+# Whether the renderer has been started in this process for max_workers=0 exports
+_local_renderer = False
+
+
+def start_renderer():
+    """Start the Kaleido renderer in the current process and render a blank figure so it is ready for use.
+
+    Kaleido 1.x runs a persistent browser through start_sync_server.  Older versions keep their renderer
+    process alive after the first figure, so the blank render is what warms them up.
+    """
+    try:
+        import kaleido
+        if hasattr(kaleido, 'start_sync_server'):
+            kaleido.start_sync_server(silence_warnings=True)
+    except ImportError:
+        raise ImportError("Image export needs the kaleido package, install it with 'pip install kaleido'.")
+
+    pio.to_image(go.Figure(), format="png", width=10, height=10)
+
+
+def start_local_renderer():
+    """Start the renderer in this process, once per session."""
+    global _local_renderer
+    if not _local_renderer:
+        start_renderer()
+        _local_renderer = True
+
+
+def render_figure(spec, path, fmt, width, height, scale):
+    """Render one figure to an image file.
+
+    VALUE: return a tuple of the path and the seconds taken to render it
+
+    PARAMETERS:
+      - spec is the figure as a plotly json string, which is much cheaper to send to a worker than the figure.
+      - path is the image file to write.
+      - fmt is the image format, e.g. 'svg' or 'png'.
+      - width, height and scale are passed on to plotly's write_image, None for the figure's own settings.
+    """
+    start = time.perf_counter()
+    pio.write_image(pio.from_json(spec, skip_invalid=True), path, format=fmt, width=width, height=height,
+                    scale=scale)
+
+    return path, time.perf_counter() - start
+
+
+def get_pool(max_workers):
+    """Return the session's pool of warm renderer processes, starting it if needed.
+
+    PARAMETERS:
+      - max_workers is the number of renderer processes.
+    """
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != max_workers:
+        shutdown_renderers()
+        _pool = ProcessPoolExecutor(max_workers=max_workers, initializer=start_renderer)
+        _pool_workers = max_workers
+
+    return _pool
+
+
+def shutdown_renderers():
+    """Stop the session's renderer processes."""
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown()
+    _pool, _pool_workers = None, None
+
+
+def figure_hash(spec, fmt, width, height, scale):
+    """Return a hash of a figure's json spec and export settings."""
+    return joblib.hash((spec, fmt, width, height, scale))
+
+
+def load_manifest(outdir):
+    path = os.path.join(outdir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(outdir, manifest):
+    with open(os.path.join(outdir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def export_figures(figures, outdir, fmt=None, width=None, height=None, scale=None, max_workers=2, force=False):
+    """Export many figures to image files concurrently, skipping figures unchanged since the last export.
+
+    VALUE: return a Pandas dataframe with one row per figure of the file, whether it was exported or skipped
+    and the seconds taken to render it
+
+    PARAMETERS:
+      - figures is a dictionary of file names (e.g. 'lagplot1.svg') and plotly figures.
+      - outdir is the folder to write the images to.
+      - fmt is the image format, e.g. 'svg' or 'png'.  If None the format is taken from each file extension.
+      - width, height and scale are passed on to plotly's write_image, None for the figure's own settings.
+      - max_workers is the number of renderer processes, 0 to render in this process.
+      - force, if True, exports every figure even if it is unchanged.
+    """
+    os.makedirs(outdir, exist_ok=True)
+    manifest = load_manifest(outdir)
+
+    jobs, results = {}, []
+    for name, fig in figures.items():
+        path = os.path.join(outdir, name)
+        name_fmt = fmt if fmt is not None else os.path.splitext(name)[1].lstrip(".")
+        if name_fmt == "":
+            raise Exception("Invalid figure name - Needs a file extension when fmt is None.")
+
+        spec = pio.to_json(fig)
+        spec_hash = figure_hash(spec, name_fmt, width, height, scale)
+        if not force and manifest.get(name) == spec_hash and os.path.exists(path):
+            results.append({'name': name, 'path': path, 'status': 'skipped', 'render_s': 0.0})
+            continue
+
+        jobs[name] = (spec, path, name_fmt, spec_hash)
+
+    if jobs:
+        print(f"Exporting {len(jobs)} figures ({len(figures) - len(jobs)} unchanged)")
+
+    futures = {}
+    if jobs and max_workers == 0:
+        start_local_renderer()
+    elif jobs:
+        pool = get_pool(max_workers)
+        futures = {name: pool.submit(render_figure, spec, path, name_fmt, width, height, scale)
+                   for name, (spec, path, name_fmt, spec_hash) in jobs.items()}
+
+    try:
+        for name, (spec, path, name_fmt, spec_hash) in jobs.items():
+            if max_workers == 0:
+                path, seconds = render_figure(spec, path, name_fmt, width, height, scale)
+            else:
+                path, seconds = futures[name].result()
+            manifest[name] = spec_hash
+            results.append({'name': name, 'path': path, 'status': 'exported', 'render_s': seconds})
+    finally:
+        # Record whatever was exported, even if a later figure failed
+        save_manifest(outdir, manifest)
+
+    return pd.DataFrame(results, columns=['name', 'path', 'status', 'render_s'])
@@ -0,0 +1,238 @@
+import pandas as pd
+from footfall.lazy import lazy_import, lazy_from
+from chart_data import DEFAULT_WIDTH, scatter_trace, line_chart, zoomable_figure
+from footfall.features import lockdown_key_dates, lockdown_phases
+
+# Charts layer: plotly charts of footfall, predictions and the lockdown timeline.  plotly is only imported when
+# the first chart is made.
+
+px = lazy_import('plotly.express')
+go = lazy_import('plotly.graph_objects')
+pio = lazy_import('plotly.io')
+make_subplots = lazy_from('plotly.subplots', 'make_subplots')
+joblib = lazy_import('joblib')
+
+# Cache of the compiled lockdown shapes and annotations, built once per session
+lockdown_layer_cache = {}
+
+
+def lockdown_annotation_layer():
+
+    """Compiles the lockdown key dates and phases into plotly shapes and annotations, once per session.
+
+           VALUE: return a tuple of a list of shape dictionaries and a list of annotation dictionaries
+
+           PARAMETERS:
+             - None, the layer is built from lockdown_key_dates and lockdown_phases
+           """
+
+    key = joblib.hash((lockdown_key_dates, lockdown_phases))
+    if key not in lockdown_layer_cache:
+        shapes = [dict(type='line', x0=row.date, x1=row.date, xref='x', y0=0, y1=1, yref='y domain',
+                       line=dict(color='green', dash='dash'))
+                  for row in lockdown_key_dates.itertuples()]
+        shapes += [dict(type='rect', x0=row.start, x1=row.end, xref='x', y0=0, y1=1, yref='y domain',
+                        fillcolor=row.fillcolor, opacity=0.25, line=dict(width=0))
+                   for row in lockdown_phases.itertuples()]
+
+        annotations = [dict(x=row.date, xref='x', y=1, yref='y domain', xanchor='center', yanchor='bottom',
+                            text=row.label, font=dict(size=8), textangle=0, showarrow=row.showarrow, arrowhead=1)
+                       for row in lockdown_key_dates.itertuples()]
+
+        lockdown_layer_cache[key] = (shapes, annotations)
+
+    return lockdown_layer_cache[key]
+
+
+def lockdown_template(base=None):
+
+    """Creates a plotly template carrying the lockdown shapes and annotations.
+
+           VALUE: return a plotly layout Template
+
+           PARAMETERS:
+             - base is the name of the template to extend, defaulting to the session's default plotly template
+           """
+
+    template = go.layout.Template(pio.templates[base if base is not None else pio.templates.default])
+    shapes, annotations = lockdown_annotation_layer()
+    template.layout.shapes = shapes
+    template.layout.annotations = annotations
+
+    return template
+
+
+def chart_lockdown_dates(fig):
+
+    """Adds chosen key lockdown dates to footfall chart as vertical lines and rectangles.
+
+           The lines, rectangles and labels are compiled once by lockdown_annotation_layer and added to the
+           figure in a single layout update.
+
+           VALUE: a chart figure object
+
+           PARAMETERS:
+             - fig is a chart figure object
+           """
+
+    shapes, annotations = lockdown_annotation_layer()
+    fig.update_layout(shapes=list(fig.layout.shapes) + shapes,
+                      annotations=list(fig.layout.annotations) + annotations)
+
+    return fig
+
+
+def validation_plot(y,yhat,width=DEFAULT_WIDTH):
+    # plot expected vs predicted
+    fig = make_subplots()
+    # Add traces
+    fig.add_trace(
+        scatter_trace(x=pd.Series(y).index, y=pd.Series(y), width=width, name="Expected",mode='lines',hovertemplate='%{y}'),
+    )
+    fig.add_trace(
+        scatter_trace(x=pd.Series(y).index, y=pd.Series(yhat), width=width, name="Predicted",mode='lines',hovertemplate='%{y}'),
+    )
+
+    # Set x-axis title
+    fig.update_xaxes(title_text="Time Series (Day)")
+
+    # Set y-axes titles
+    fig.update_yaxes(title_text="Daily Footfall")
+
+    return fig
+
+
+def daily_predicted_chart(yhat_list,finaldata,width=DEFAULT_WIDTH):
+    finaldata = finaldata.loc[finaldata.index >= '2018']
+    fig = make_subplots()
+
+    # Add traces
+    fig.add_trace(
+        scatter_trace(x=finaldata.index, y=finaldata['roll_7_mean'], width=width, name="Observed"),
+    )
+
+    fig.add_trace(
+        scatter_trace(x=yhat_list[0].index, y=yhat_list[0]['roll_7_mean'], width=width, name="Predicted"),
+    )
+
+    # Add figure title
+    fig.update_layout(
+        title_text="Rolling 7 day mean predictions"
+    )
+
+    # Set x-axis title
+    fig.update_xaxes(title_text="Date")
+
+    # Set y-axes titles
+    fig.update_yaxes(title_text="Footfall")
+
+    fig.update_layout(
+        title={
+            'y': 0.9,
+            'x': 0.5,
+            'xanchor': 'center',
+            'yanchor': 'top'}
+    )
+
+
+    fig_comparison = make_subplots()
+    # Add traces
+    fig_comparison.add_trace(
+        scatter_trace(x=finaldata.index, y=finaldata['roll_7_mean'], width=width, name="Observed"),
+    )
+
+    fig_comparison.add_trace(
+        scatter_trace(x=yhat_list[0].index, y=yhat_list[0]['roll_7_mean'], width=width, name="Predicted_1_lag"),
+    )
+
+
+    fig_comparison.add_trace(
+        scatter_trace(x=yhat_list[1].index, y=yhat_list[1]['roll_7_mean'], width=width, name="Predicted_3_lag"),
+    )
+
+    fig_comparison.add_trace(
+        scatter_trace(x=yhat_list[2].index, y=yhat_list[2]['roll_7_mean'], width=width, name="Predicted_7_lag"),
+    )
+
+    # Add figure title
+    fig_comparison.update_layout(
+        title_text="Rolling 7 day mean predictions"
+    )
+
+    # Set x-axis title
+    fig_comparison.update_xaxes(title_text="DateTime")
+
+    # Set y-axes titles
+    fig_comparison.update_yaxes(title_text="Footfall")
+
+    fig_comparison.update_layout(
+        title={
+            'y': 0.9,
+            'x': 0.5,
+            'xanchor': 'center',
+            'yanchor': 'top'}
+    )
+
+    return fig, fig_comparison
+
+
+def weekly_predicted_chart(yhat_dataf,finaldata,width=DEFAULT_WIDTH):
+    finaldata = finaldata.loc[finaldata.index >= '2018']
+    finaldata = finaldata.resample('W').agg({'var1(t)':'sum'})
+    yhat_dataf = yhat_dataf.resample('W').agg({'predicted':'sum'})
+    # Create figure with secondary y-axis
+    fig = make_subplots()
+
+    # Add traces
+    fig.add_trace(
+        scatter_trace(x=finaldata.index, y=finaldata['var1(t)'], width=width, name="yaxis data", connectgaps=False),
+    )
+
+    fig.add_trace(
+        scatter_trace(x=yhat_dataf.index, y=yhat_dataf['predicted'], width=width, name="yaxis2 data",connectgaps=False),
+    )
+
+    # Add figure title
+    fig.update_layout(
+        title_text="Double Y Axis Example"
+    )
+
+    # Set x-axis title
+    fig.update_xaxes(title_text="xaxis title")
+
+    # Set y-axes titles
+    fig.update_yaxes(title_text="<b>primary</b> yaxis title", secondary_y=False)
+    fig.update_yaxes(title_text="<b>secondary</b> yaxis title", secondary_y=True)
+
+    return fig
+
+
+def monthly_predicted_chart(yhat_dataf,finaldata,width=DEFAULT_WIDTH):
+    finaldata = finaldata.loc[finaldata.index >= '2019']
+    finaldata = finaldata.resample('M').agg({'var1(t)':'sum'})
+    yhat_dataf = yhat_dataf.resample('M').agg({'predicted':'sum'})
+    # Create figure with secondary y-axis
+    fig = make_subplots()
+
+    # Add traces
+    fig.add_trace(
+        scatter_trace(x=finaldata.index, y=finaldata['var1(t)'], width=width, name="yaxis data", connectgaps=False),
+    )
+
+    fig.add_trace(
+        scatter_trace(x=yhat_dataf.index, y=yhat_dataf['predicted'], width=width, name="yaxis2 data",connectgaps=False),
+    )
+
+    # Add figure title
+    fig.update_layout(
+        title_text="Double Y Axis Example"
+    )
+
+    # Set x-axis title
+    fig.update_xaxes(title_text="xaxis title")
+
+    # Set y-axes titles
+    fig.update_yaxes(title_text="<b>primary</b> yaxis title", secondary_y=False)
+    fig.update_yaxes(title_text="<b>secondary</b> yaxis title", secondary_y=True)
+
+    return fig
@@ -0,0 +1,748 @@
+import pandas as pd
+from collections import deque
+import numpy as np
+from numpy import asarray
+import os, os.path
+import sys
+from urllib.request import (
+    urlopen, urlretrieve)
+import datetime
+import time
+from instrumentation import instrument_stage, trace_pipeline
+import aggregation_engine
+from aggregation_engine import set_engine, get_engine, resolve_engine
+
+# Core layer: loading, cleaning and aggregating the footfall data.  Needs only pandas and numpy, so ingest
+# scripts can import it without the plotting or modelling libraries.
+
+@instrument_stage
+def start_pipeline(dataf):
+    """Create a copy of dataset ready for the start of a processing pipeline.
+
+    VALUE: return a copy of a dataframe
+
+    PARAMETERS:
+      - dataf is a Pandas Dataframe.
+    """
+    return dataf.copy()
+
+
+@instrument_stage
+def create_BRC_MonthNum(dataf):
+    """Create the relevant British Retail Consortium Month number from the Month name.
+
+    VALUE: return a Pandas dataframe with an extra 'BRCMonthNum' column
+
+    PARAMETERS:
+      - dataf is a Pandas Dataframe.
+    """
+    conditions = [
+        dataf['BRCMonth'] == "January",dataf['BRCMonth'] == "February",dataf['BRCMonth'] == "March",
+        dataf['BRCMonth'] == "April",dataf['BRCMonth'] == "May",dataf['BRCMonth'] == "June",
+        dataf['BRCMonth'] == "July",dataf['BRCMonth'] == "August",dataf['BRCMonth'] == "September",
+        dataf['BRCMonth'] == "October",dataf['BRCMonth'] == "November",dataf['BRCMonth'] == "December"
+    ]
+
+    outputs = [i for i in range(1, 13)]
+
+    dataf['BRCMonthNum'] = np.select(conditions, outputs)
+
+    return dataf
+
+
+@instrument_stage
+def check_remove_dup(dataf):
+
+    """Check for duplicate records and remove if necessary.
+
+    VALUE: return a copy of a dataframe
+
+    PARAMETERS:
+      - dataf is a Pandas Dataframe.
+    """
+
+    # Groups footfall data by location and datetime, counting the number of occurrences by calling size.
+    # Also Resets the index to restore the grouped columns and renames the size column to UniqueRowsCount
+    unq_loc_datetime = dataf.groupby(
+        ['Location', 'DateTime']).size().reset_index().rename(columns={0: 'UniqueRowsCount'})
+    unq_loc_datetime
+
+    # Check to see if there are any values in the UniqueRowsCount column greater than one (indicating there are
+    # duplicate rows)
+    if len(unq_loc_datetime[unq_loc_datetime.UniqueRowsCount > 1]) > 1:
+        # Drop duplicates from dataframe (amended from initial code to concentrate only on Location and DateTime).
+        ffd_no_dup = dataf.drop_duplicates(subset=['Location', 'DateTime'])
+        # Rerun duplicate check and print to console.
+        unq_loc_datetime = ffd_no_dup.groupby(
+            ['Location', 'DateTime']).size().reset_index().rename(columns={0: 'UniqueRowsCount'})
+        print(f"There are {len(unq_loc_datetime[unq_loc_datetime.UniqueRowsCount > 1])} duplicates left")
+        return ffd_no_dup
+    else:
+        return dataf
+
+
+def time_dico():
+    """Create a dictionary with time period codes and frequencies for various pandas functions.
+
+    VALUE: return a dictionary
+
+    """
+    time_dico = {
+        "interval": ["hours", "day", "week", "month", "year"],
+        "code": ["%H", "%a", "%W", "%b", "%y"],
+        "freq": ["H", "D", "W", "MS", "Y"]
+    }
+    return time_dico
+
+
+def resample_day(data, engine=None):
+    """Resample a data frame to daily frequency.
+
+    VALUE: return an edited dataframe
+
+    PARAMETERS:
+      - data is a Pandas Dataframe.
+      - engine is 'pandas' or 'polars', defaulting to the engine set with set_engine.
+    """
+
+    if resolve_engine(engine) == "polars":
+        return aggregation_engine.resample_day(data)
+
+    data = data.resample("D").sum()
+    data['weekday'] = data.index.dayofweek
+    data['weekdayname'] = data.index.day_name()
+    data = data.groupby(['weekday', 'weekdayname'])['Count'].agg(['sum', 'mean']).droplevel(level=0)
+
+    return data
+
+
+def resample_week(data, engine=None):
+
+    """Resample a data frame to weekly frequency.
+
+     VALUE: return an edited dataframe
+
+     PARAMETERS:
+       - data is a Pandas Dataframe.
+       - engine is 'pandas' or 'polars', defaulting to the engine set with set_engine.
+     """
+
+    if resolve_engine(engine) == "polars":
+        return aggregation_engine.group_sum(data, 'BRCWeekNum')
+
+    data = data.groupby(['BRCWeekNum'])['Count'].sum()
+
+    return data
+
+
+def resample_month(data, engine=None):
+
+    """Resample a data frame to monthly frequency.
+
+         VALUE: return an edited dataframe
+
+         PARAMETERS:
+           - data is a Pandas Dataframe.
+           - engine is 'pandas' or 'polars', defaulting to the engine set with set_engine.
+         """
+
+    if resolve_engine(engine) == "polars":
+        return aggregation_engine.group_sum(data, 'BRCMonth')
+
+    data = data.groupby(['BRCMonth'])['Count'].sum()
+
+    return data
+
+
+def resample_year(data, engine=None):
+
+    """Resample a data frame to yearly frequency.
+
+         VALUE: return an edited dataframe
+
+         PARAMETERS:
+           - data is a Pandas Dataframe.
+           - engine is 'pandas' or 'polars', defaulting to the engine set with set_engine.
+         """
+
+    if resolve_engine(engine) == "polars":
+        return aggregation_engine.group_sum(data, 'BRCYear')
+
+    data = data.groupby(['BRCYear'])['Count'].sum()
+
+    return data
+
+
+def invalid_op(data):
+    raise Exception("Invalid Time Frequency - Needs either 'day', 'week', 'month' or 'year'.")
+
+
+@instrument_stage
+def mean_hourly(dataf, freq, engine=None):
+
+    """Resample a data frame to a specified frequency.
+
+         VALUE: return an edited dataframe
+
+         PARAMETERS:
+           - dataf is a Pandas Dataframe
+           - freq is the time frequency you'd like to resample to.
+           - engine is 'pandas' or 'polars', defaulting to the engine set with set_engine.
+         """
+
+    if resolve_engine(engine) == "polars":
+        return aggregation_engine.mean_hourly(dataf, freq)
+
+    if freq == "day":
+        dataf = dataf.groupby([
+            pd.Grouper(key="DateTime",freq="D"),'BRCWeekNum','BRCMonth','BRCYear'])['Count'].aggregate(np.mean)
+    elif freq == "month":
+        dataf = dataf.groupby(
+            ['BRCMonthNum',pd.Grouper(key="BRCMonth"),'BRCYear'])['Count'].aggregate(np.mean).reset_index()
+    elif freq == "week":
+        dataf = dataf.set_index('DateTime').groupby(
+            [pd.Grouper(key="BRCWeekNum"),'BRCYear'])['Count'].aggregate(np.mean)
+    elif freq == "year":
+        dataf = dataf.set_index('DateTime').groupby(
+            [pd.Grouper(key="BRCYear")])['Count'].aggregate(np.mean)
+
+    return dataf
+
+
+@instrument_stage
+def remove_new_cameras(dataf):
+
+    """Remove new cameras that recently came online due to missing periods of time.
+
+         VALUE: return an edited dataframe
+
+         PARAMETERS:
+           - dataf is a Pandas Dataframe.
+         """
+
+    dataf.drop(dataf[ (dataf['Location'] == "Albion Street at McDonalds") & (dataf['Location'] == "Park Row")].index,inplace=True)
+
+    return dataf
+
+
+@instrument_stage
+def reset_df_index(dataf):
+
+    """Reset the index of a data frame.
+
+         VALUE: return an edited dataframe
+
+         PARAMETERS:
+           - dataf is a Pandas Dataframe.
+         """
+
+    dataf = dataf.reset_index()
+    return dataf
+
+
+@instrument_stage
+def set_dt_index(dataf):
+
+    """Set the index as DateTime.
+
+         VALUE: return an edited dataframe
+
+         PARAMETERS:
+           - dataf is a Pandas Dataframe.
+         """
+
+    dataf = dataf.set_index('DateTime')
+
+    return dataf
+
+
+@instrument_stage
+def date_range(dataf,startdate,enddate):
+
+    """Filter dataframe between two dates
+
+         VALUE: return an edited dataframe
+
+         PARAMETERS:
+           - dataf is a Pandas Dataframe.
+           - startdate is the earliest date you'd like the records to begin
+           - enddate is the latest date you'd like the records to begin
+         """
+
+    dataf = dataf[(dataf.index >= startdate) & (dataf.index <= enddate)]
+
+    return dataf
+
+
+@instrument_stage
+def per_change(dataf,freq):
+
+    """Calculate percentage change of footfall.
+
+         VALUE: return an edited dataframe
+
+         PARAMETERS:
+           - dataf is a Pandas Dataframe
+           - freq is the time frequency you'd like to resample to.
+         """
+
+    dataf[f'{freq}_per_change'] = dataf.Count.pct_change() * 100
+
+    return dataf
+
+
+@instrument_stage
+def mean_hourly_location(dataf,freq,engine=None):
+
+    """Create resampled dataframe aggregated by mean hourly footfall.
+
+           VALUE: return an edited dataframe
+
+           PARAMETERS:
+             - dataf is a Pandas Dataframe
+             - freq is the time frequency you'd like to resample to.
+             - engine is 'pandas' or 'polars', defaulting to the engine set with set_engine.
+           """
+
+    if resolve_engine(engine) == "polars":
+        return aggregation_engine.mean_hourly(dataf, freq, location=True)
+
+    if freq == "day":
+        dataf = dataf.groupby(['Location',
+            pd.Grouper(key="DateTime",freq="D"),'BRCWeekNum','BRCMonth','BRCYear'])['Count'].aggregate(np.mean)
+    elif freq == "month":
+        dataf = dataf.groupby(
+            ['Location','BRCMonthNum',pd.Grouper(key="BRCMonth"),'BRCYear'])['Count'].aggregate(np.mean).reset_index()
+    elif freq == "week":
+        dataf = dataf.set_index('DateTime').groupby(
+            ['Location',pd.Grouper(key="BRCWeekNum")])['Count'].aggregate(np.mean)
+    elif freq == "year":
+        dataf = dataf.set_index('DateTime').groupby(
+            ['Location',pd.Grouper(key="BRCYear")])['Count'].aggregate(np.mean)
+
+    return dataf
+
+
+@instrument_stage
+def set_lockdown_timeframe(dataf):
+    """Filters the dataframe to be 2020/2021
+
+           VALUE: return an edited dataframe
+
+           PARAMETERS:
+             - dataf is a Pandas Dataframe
+           """
+    dataf = dataf.loc[(dataf.BRCYear == 2020) | (dataf.BRCYear == 2021)]
+
+    return dataf
+
+
+@instrument_stage
+def calculate_baseline(dataf, engine=None):
+
+    """Calculate percentage change from a baseline of between 3rd January 2020 and 5th March 2020.
+
+           VALUE: return an edited dataframe
+
+           PARAMETERS:
+             - dataf is a Pandas Dataframe
+             - engine is 'pandas' or 'polars', defaulting to the engine set with set_engine.
+           """
+
+    if resolve_engine(engine) == "polars":
+        return aggregation_engine.calculate_baseline(dataf)
+
+    #Extract the day name from DateTime index
+    dataf['Day_Name'] = dataf.index.day_name()
+
+    #Resample to daily frequency and include the Day_Name variable, aggregating by the sum of footfall counts
+    dataf = dataf.groupby([pd.Grouper(level='DateTime', freq="D"), 'Day_Name'])['Count'].sum().reset_index()
+    dataf = dataf.set_index('DateTime')
+
+    #create a baseline dataframe and filter by a specific date range
+    baseline = dataf[(dataf.index >= "2020-01-03") & (dataf.index <= "2020-03-05")]
+
+    #Group by Day Name and calculate the median footfall for each day across the time period
+    baseline = baseline.groupby([pd.Grouper(key="Day_Name")])['Count'].aggregate(np.median)
+
+    #Filter dataf and create baseline percentage change from median baseline calculations by mapping to a dictionary
+    dataf = dataf.loc[dataf.index > "2020-03-05"]
+    dataf.loc[:, 'baseline'] = dataf.Day_Name.map(baseline.to_dict())
+    dataf.loc[:, 'baseline_change'] = dataf.Count - dataf.baseline
+    dataf.loc[:, 'baseline_per_change'] = (dataf.baseline_change / dataf.baseline) * 100
+
+    return dataf
+
+
+@instrument_stage
+def combine_cameras(dataf):
+
+    """Rename cameras that have moved location to a combined label.
+
+           VALUE: return an edited dataframe
+
+           PARAMETERS:
+             - dataf is a Pandas Dataframe
+           """
+
+    cameras_to_combine = dataf.loc[dataf.Location.isin(["Commercial Street at Lush",
+                                                        "Commercial Street at Sharps"])]
+
+    total_when_seperate = sum(cameras_to_combine['Count'])
+
+    dataf = dataf.replace({'Location': {'Commercial Street at Lush': 'Commercial Street Combined',
+                                        'Commercial Street at Sharps': 'Commercial Street Combined'}})
+
+    total_combined = sum(dataf.loc[dataf.Location == "Commercial Street Combined", "Count"])
+
+    if total_when_seperate == total_combined:
+        print("Footfall hasn't changed when combining cameras")
+    else:
+        print("Footfall has changed when combining cameras")
+
+    return dataf
+
+
+@instrument_stage
+def set_start_date(dataf,date):
+    dataf = dataf.loc[dataf.DateTime >= date]
+
+    return dataf
+
+
+def movecol(df, cols_to_move=[], ref_col='', place='After'):
+
+    cols = df.columns.tolist()
+    if place == 'After':
+        seg1 = cols[:list(cols).index(ref_col) + 1]
+        seg2 = cols_to_move
+    if place == 'Before':
+        seg1 = cols[:list(cols).index(ref_col)]
+        seg2 = cols_to_move + [ref_col]
+
+    seg1 = [i for i in seg1 if i not in seg2]
+    seg3 = [i for i in cols if i not in seg1 + seg2]
+
+    return(df[seg1 + seg2 + seg3])
+
+
+# Function to process date and recreate it in a different format
+def create_date_format (col, old_time_format, new_time_format):
+    col = pd.to_datetime(col, format = old_time_format )
+    if type(col) == pd.core.series.Series:
+        col = col.apply(lambda x: x.strftime(new_time_format))
+    elif type(col) ==  pd.tslib.Timestamp:
+        col = col.strftime(new_time_format)
+    return col
+
+
+@instrument_stage
+def drop_na(dataf):
+
+    dataf = dataf.dropna()
+
+    return dataf
+
+
+def doubleMADsfromMedian(y, thresh=3.5):
+    """Find outliers using the Median Average Distance.
+
+    VALUE: return a list of true/false denoting whether the element in y is an outlier or not
+
+    PARAMETERS:
+      - y is a pandas Series, or something like that.
+
+    warning: this function does not check for NAs
+    nor does it address issues when
+    more than 50% of your data have identical values
+    """
+    # Calculate the upper and lower limits
+    m = np.median(y)  # The median
+    abs_dev = np.abs(y - m)  # The absolute difference between each y and the median
+    # The upper and lower limits are the median of the difference
+    # of each data point from the median of the data
+    left_mad = np.median(abs_dev[y <= m])  # The left limit (median of lower half)
+    right_mad = np.median(abs_dev[y >= m])  # The right limit (median of upper half)
+
+    # Now create an array where each value has left_mad if it is in the lower half of the data,
+    # or right_mad if it is in the upper half
+    y_mad = left_mad * np.ones(len(y))  # Initially every value is 'left_mad'
+    y_mad[y > m] = right_mad  # Now larger values are right_mad
+
+    # Calculate the z scores for each element
+    modified_z_score = 0.6745 * abs_dev / y_mad
+    modified_z_score[y == m] = 0
+
+    # Return boolean list showing whether each y is an outlier
+    return modified_z_score > thresh
+
+
+@instrument_stage
+def remove_outliers(dataf):
+
+    # Make a list of true/false for whether the footfall is an outlier
+    no_outliers = pd.DataFrame(doubleMADsfromMedian(dataf['Count']))
+    no_outliers.columns = ['outlier']  # Rename the column to 'outlier'
+
+    # Join to the original footfall data to the list of outliers, then select a few useful columns
+    join = pd.concat([dataf, no_outliers], axis=1)
+    join = pd.DataFrame(join, columns=['outlier', 'Count'])
+
+    # Choose just the outliers
+    outliers = join[join['outlier'] == True]
+    outliers_list = list(outliers.index)  # A list of the days that are outliers
+
+    # Now remove all outliers from the original data
+    df = dataf.loc[~dataf.index.isin(outliers_list)]
+
+    # Check that the lengths all make sense
+    assert (len(df) == len(dataf) - len(outliers_list))
+
+    print("I found {} outliers from {} days in total. Removing them leaves us with {} events".format(
+        len(outliers_list), len(join), len(df)))
+
+    return df
+
+
+# Streaming camera fault detection.  Each camera keeps a fixed amount of state however long it has been
+# running: an exponentially weighted expected count and absolute deviation for each of the 168 hours of the
+# week, plus the current runs of zero and repeated counts.  Rows are checked as they arrive, and flagged rows
+# don't update the expected profile so a fault can't teach the detector that it is normal.  Two cases are
+# decided late: a repeated count only updates the profile once its run is too short or too quiet to be stuck,
+# and a long run of spikes is taken as a real change in footfall (e.g. the end of a lockdown), unflagged and
+# learnt.
+FAULT_TYPES = ['duplicate', 'out_of_order', 'dropout', 'stuck', 'spike']
+
+
+class CameraFaultDetector:
+    """Flag dropouts, stuck counters and implausible spikes in hourly footfall rows as they are ingested.
+
+    PARAMETERS:
+      - alpha is the weight given to each new count in the expected hourly profile and deviation, between 0 and 1.
+      - warmup is the number of weeks of counts an hour of the week needs before it can be flagged as a dropout
+        or spike.
+      - dropout_min is the expected count above which a zero counts as a dropout rather than a quiet hour.
+      - zero_hours is the length of a run of zeros that counts as a dropout whatever the expected count.
+      - stuck_hours is the number of hours a camera must repeat the same non-zero count to be flagged as stuck.
+        Only runs at busy times (an expected or repeated count of at least dropout_min) are flagged, as quiet
+        cameras often repeat small counts.
+      - spike_thresh is the number of (MAD scaled) deviations above the expected count that counts as a spike.
+      - shift_hours is the number of spikes, with no count at or below the expected count between them, after
+        which the spikes are taken as a level shift: they are unflagged and learnt, and so are further spikes
+        until a count is back at or below the expected count.
+    """
+
+    def __init__(self, alpha=0.1, warmup=3, dropout_min=20, zero_hours=24, stuck_hours=4, spike_thresh=8,
+                 shift_hours=12):
+        self.alpha = alpha
+        self.warmup = warmup
+        self.dropout_min = dropout_min
+        self.zero_hours = zero_hours
+        self.stuck_hours = stuck_hours
+        self.spike_thresh = spike_thresh
+        self.shift_hours = shift_hours
+        self.cameras = {}
+
+    def new_state(self):
+        return {'expected': np.zeros(168), 'deviation': np.zeros(168), 'seen': np.zeros(168, dtype=np.int32),
+                'last_time': None, 'last_count': None, 'zero_run': 0, 'repeat_run': 0, 'gap_hours': 0,
+                'last_expected': np.nan, 'pending': [], 'spikes': [], 'shifted': False, 'relearnt': 0}
+
+    def learn(self, state, rows):
+        """Update the expected profile and deviation with a list of (hour of the week, count) rows."""
+        for hour, count in rows:
+            seen, expected = state['seen'][hour], state['expected'][hour]
+            if seen == 0:
+                state['expected'][hour] = count
+            else:
+                # Plain means until there are enough counts for the exponential weights to take over
+                residual = count - expected
+                state['expected'][hour] += max(self.alpha, 1 / (seen + 1)) * residual
+                state['deviation'][hour] += max(self.alpha, 1 / seen) * (abs(residual) - state['deviation'][hour])
+            state['seen'][hour] += 1
+
+    def update(self, location, when, count):
+        """Check one hourly row and update the camera's state.
+
+        When a stuck run first reaches stuck_hours the earlier hours of the run were passed as fine, and only this
+        row is flagged, though none of the run has updated the profile.  ingest flags the whole run.  Likewise
+        when a run of spikes reaches shift_hours only this row is unflagged, and the number of spikes learnt is
+        left in the camera's state as 'relearnt' for ingest to unflag the rest.  The expected count for the
+        row, or NaN before the hour of the week has warmed up, is left in the camera's state as 'last_expected'.
+
+        VALUE: return the fault type from FAULT_TYPES, or None if the row looks fine
+
+        PARAMETERS:
+          - location is the camera name.
+          - when is the hour the count is for.
+          - count is the footfall count for that hour.
+        """
+        state = self.cameras.get(location)
+        if state is None:
+            state = self.cameras[location] = self.new_state()
+
+        if state['last_time'] is not None:
+            if when == state['last_time']:
+                return 'duplicate'
+            if when < state['last_time']:
+                return 'out_of_order'
+            state['gap_hours'] = int((when - state['last_time']) / pd.Timedelta(hours=1)) - 1
+
+        # Run lengths are broken by missing hours as well as by a different count
+        contiguous = state['gap_hours'] == 0 and state['last_time'] is not None
+        state['zero_run'] = state['zero_run'] + 1 if count == 0 and contiguous else int(count == 0)
+        state['repeat_run'] = state['repeat_run'] + 1 if count == state['last_count'] and contiguous else 1
+        state['last_time'], state['last_count'] = when, count
+
+        hour = when.dayofweek * 24 + when.hour
+        expected, deviation = state['expected'][hour], state['deviation'][hour]
+        warm = state['seen'][hour] >= self.warmup
+        state['last_expected'] = expected if warm else np.nan
+
+        fault = None
+        if count == 0 and ((warm and expected >= self.dropout_min) or state['zero_run'] >= self.zero_hours):
+            fault = 'dropout'
+        elif (count > 0 and state['repeat_run'] >= self.stuck_hours and warm and
+              max(expected, count) >= self.dropout_min):
+            fault = 'stuck'
+        elif warm and count - expected > self.spike_thresh * max(1.4826 * deviation, 1.0, 0.1 * expected):
+            fault = 'spike'
+
+        # A run of spikes carries on until a count is back at or below the expected count
+        state['relearnt'] = 0
+        if fault == 'spike':
+            state['spikes'].append((hour, count))
+            if state['shifted'] or len(state['spikes']) >= self.shift_hours:
+                self.learn(state, state['spikes'])
+                state['relearnt'], state['spikes'], state['shifted'] = len(state['spikes']), [], True
+                fault = None
+        elif count <= expected or not warm:
+            state['spikes'], state['shifted'] = [], False
+
+        # Rows of a repeated count wait until the run is decided, so a stuck counter never reaches the profile
+        if state['repeat_run'] == 1:
+            self.learn(state, state['pending'])
+            state['pending'] = []
+        if fault == 'stuck':
+            state['pending'] = []
+        elif fault is None and state['relearnt'] == 0:
+            if count > 0 and state['repeat_run'] < self.stuck_hours:
+                state['pending'].append((hour, count))
+            else:
+                self.learn(state, state['pending'] + [(hour, count)])
+                state['pending'] = []
+
+        return fault
+
+    def ingest(self, dataf):
+        """Check every row of a footfall dataframe, in time order within each camera.
+
+        Stuck runs are flagged from their first hour, and runs of spikes learnt as a level shift are unflagged.
+
+        VALUE: return a tuple of Pandas Series with dataf's index, of fault types (None where the row looks fine)
+        and of each row's expected count (NaN before the detector has warmed up)
+
+        PARAMETERS:
+          - dataf is a Pandas Dataframe with Location, DateTime and Count columns.
+        """
+        times = pd.DatetimeIndex(dataf['DateTime'])
+        order = np.argsort(times.values, kind='stable')
+        locations, counts = dataf['Location'].values, dataf['Count'].values
+
+        faults = np.empty(len(dataf), dtype=object)
+        expected = np.full(len(dataf), np.nan)
+        # The positions of each camera's latest rows, enough to reach back to the start of a stuck run, and of
+        # its current run of spikes
+        recent, spikes = {}, {}
+        for i in order:
+            location = locations[i]
+            faults[i] = self.update(location, times[i], counts[i])
+            if faults[i] in ['duplicate', 'out_of_order']:
+                continue
+            state = self.cameras[location]
+            expected[i] = state['last_expected']
+
+            rows = recent.setdefault(location, deque(maxlen=self.stuck_hours))
+            rows.append(i)
+            if faults[i] == 'stuck' and state['repeat_run'] == self.stuck_hours:
+                for j in rows:
+                    faults[j] = 'stuck'
+
+            spike_rows = spikes.setdefault(location, [])
+            if state['relearnt']:
+                for j in spike_rows:
+                    faults[j] = None
+                spike_rows.clear()
+            elif faults[i] == 'spike':
+                spike_rows.append(i)
+            elif not state['spikes']:
+                spike_rows.clear()
+
+        return pd.Series(faults, index=dataf.index), pd.Series(expected, index=dataf.index)
+
+
+@instrument_stage
+def flag_faults(dataf, detector=None):
+    """Add Fault and Expected columns from a streaming fault detector, e.g. before check_remove_dup.
+
+    Of a set of duplicate rows only the first is checked.  The rest are flagged 'duplicate', or with the first
+    row's fault if it has one, so check_remove_dup can't keep a copy of a faulty row.
+
+    VALUE: return a Pandas dataframe with extra 'Fault' and 'Expected' columns
+
+    PARAMETERS:
+      - dataf is a Pandas Dataframe with Location, DateTime and Count columns.
+      - detector is a CameraFaultDetector, a default one if None.  Pass the same detector to carry its state
+        across batches of data.
+    """
+    detector = detector if detector is not None else CameraFaultDetector()
+    dataf = dataf.copy()
+    dataf['Fault'], dataf['Expected'] = detector.ingest(dataf)
+
+    duplicate = (dataf['Fault'] == 'duplicate').values
+    if duplicate.any():
+        first = dataf.groupby(['Location', 'DateTime'])[['Fault', 'Expected']].transform('first')
+        dataf['Fault'] = np.where(duplicate, first['Fault'].values, dataf['Fault'].values)
+        dataf['Expected'] = np.where(duplicate, first['Expected'].values, dataf['Expected'].values)
+
+    counts = dataf['Fault'].value_counts()
+    print(f"Faults found: {counts.to_dict() if len(counts) else 'none'}")
+
+    return dataf
+
+
+@instrument_stage
+def remove_faults(dataf, faults=('dropout', 'stuck', 'spike'), impute=True):
+    """Keep the hours flagged by flag_faults out of the aggregates.
+
+    With impute, a flagged hour's count is replaced by the detector's expected count for it, so daily totals
+    stay complete.  Flagged hours without an expected count (the detector hadn't warmed up), or every flagged
+    hour without impute, make their whole camera-day incomplete: every row of that camera on that day is
+    removed, so daily_location_counts shows the day as missing rather than undercounting it.  Duplicates are
+    left for check_remove_dup, which keeps the first of them.
+
+    VALUE: return a Pandas dataframe without the Fault and Expected columns
+
+    PARAMETERS:
+      - dataf is a Pandas Dataframe with 'Fault' and 'Expected' columns from flag_faults.
+      - faults is the list of fault types to act on.
+      - impute, if True, fills flagged hours from the expected count where there is one.
+    """
+    flagged = dataf['Fault'].isin(list(faults)).values
+    dataf = dataf.copy()
+
+    imputed = flagged & dataf['Expected'].notna().values if impute else np.zeros(len(dataf), dtype=bool)
+    if imputed.any():
+        count = dataf['Count'].values.astype(float)
+        count[imputed] = np.round(dataf['Expected'].values[imputed])
+        dataf['Count'] = count.astype(dataf['Count'].dtype) if not np.isnan(count).any() else count
+
+    # Camera-days with a flagged hour that couldn't be imputed
+    day = pd.DatetimeIndex(dataf['DateTime']).normalize()
+    camera_day = pd.MultiIndex.from_arrays([dataf['Location'].values, day])
+    incomplete = camera_day.isin(camera_day[flagged & ~imputed])
+
+    print(f"Imputed {imputed.sum()} faulty rows and removed {incomplete.sum()} rows from "
+          f"{len(camera_day[flagged & ~imputed].unique())} incomplete camera-days")
+
+    return dataf.loc[~incomplete].drop(columns=['Fault', 'Expected'])
@@ -0,0 +1,539 @@
+import pandas as pd
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from instrumentation import instrument_stage
+from weather_features import build_weather_tables, join_weather
+from footfall.core import movecol
+
+# Features layer: lockdown, weather, calendar and holiday predictors and the lagged supervised learning frame.
+
+# Lockdown restriction timeline.  Each predictor starts at its default level and each period in
+# restriction_periods then sets it to another level from start (inclusive) to end (exclusive, None for open
+# ended), applied in order so later periods override earlier ones.  The lockdown predictors and the lockdown
+# chart annotations are both built from these tables.
+restriction_defaults = {
+    'hosp_indoor': 3,
+    'hosp_outdoor': 3,
+    'hotels': 4,
+    'ent_indoor': 5,
+    'ent_outdoor': 5,
+    'weddings': 5,
+    'self_acc': 5,
+    'sport_lei_indoor': 5,
+    'sport_lei_outdoor': 5,
+    'non_ess_retail': 1,
+    'prim_sch': 1,
+    'sec_sch': 1,
+    'uni_campus': 1,
+    'outdoor_grp_public': 5,
+    'outdoor_grp_private': 5,
+    'indoor_grp': 4,
+    'eat_out': 0,
+}
+
+
+restriction_periods = pd.DataFrame([
+    ('hosp_indoor', '2020-03-20', '2020-06-15', 1),
+    ('hosp_indoor', '2020-10-14', '2020-11-02', 2),
+    ('hosp_indoor', '2020-11-02', '2021-05-17', 1),
+
+    ('hosp_outdoor', '2020-03-20', '2020-06-15', 1),
+    ('hosp_outdoor', '2020-10-14', '2020-11-02', 2),
+    ('hosp_outdoor', '2020-11-02', '2021-04-12', 1),
+
+    ('hotels', '2020-03-26', '2020-07-04', 1),
+    ('hotels', '2020-07-04', '2020-11-02', 3),
+    ('hotels', '2020-11-05', '2020-12-02', 1),
+    ('hotels', '2020-11-02', '2020-11-05', 2),
+    ('hotels', '2020-12-02', '2021-01-06', 2),
+    ('hotels', '2021-01-06', '2021-05-17', 1),
+
+    # full closure until reopening on 4th July 2020
+    ('ent_indoor', '2020-03-20', '2020-07-04', 1),
+    # reopens on 4th July with up to 30 people legally allowed until rule of 6 legally introduced on 14th Sept 2020
+    ('ent_indoor', '2020-07-04', '2020-09-14', 4),
+    # open with rule of 6 until 14th October 2020 when put into tier 2
+    ('ent_indoor', '2020-09-14', '2020-10-14', 3),
+    # open but only with household until 2nd November when put into tier 3
+    ('ent_indoor', '2020-10-14', '2021-11-02', 2),
+    # full closed after being put in tier 3, through national lockdown 2, Christmas in tier 3 and national lockdown 3.
+    ('ent_indoor', '2020-11-02', '2021-05-17', 1),
+    # Reopens to rule of 6 on 17th May 2020
+    ('ent_indoor', '2021-05-17', None, 3),
+
+    # full closure until reopening on 4th July 2020
+    ('ent_outdoor', '2020-03-20', '2020-07-04', 1),
+    # reopens on 4th July with up to 30 people legally allowed until rule of 6 legally introduced on 14th Sept 2020
+    ('ent_outdoor', '2020-07-04', '2020-09-14', 5),
+    # open with rule of 6 until 5th november 2020 when national lockdown starts
+    ('ent_outdoor', '2020-09-14', '2020-11-05', 3),
+    # full closure during 2nd national lockdown until put back into tier 3 on 2nd December 2020.
+    ('ent_outdoor', '2020-11-05', '2020-12-02', 1),
+    # open with rule of 6 until 6th January 2021 when 3rd national lockdown starts
+    ('ent_outdoor', '2020-12-02', '2021-01-06', 3),
+    # full closure during 3rd national lockdown until reopens on 12th April 2021
+    ('ent_outdoor', '2021-01-06', '2021-04-12', 1),
+    # Reopens to rule of 6 on 12th April 2021
+    ('ent_outdoor', '2021-04-12', None, 3),
+
+    # Fully banned during lockdown 1 until restrictions eased on 4th July
+    ('weddings', '2020-03-23', '2020-07-04', 1),
+    # Weddings of up to 30 people allowed
+    ('weddings', '2020-07-04', '2020-09-28', 4),
+    # Weddings of up to 15 people allowed
+    ('weddings', '2020-09-28', '2020-11-05', 3),
+    # Weddings banned during lockdown 2 until restrictions eased on 2nd December
+    ('weddings', '2020-11-05', '2020-12-02', 1),
+    # Weddings of up to 15 people allowed until start of lockdown 3 in January 2021
+    ('weddings', '2020-12-02', '2021-01-06', 3),
+    # Weddings banned during lockdown 3 until restrictions eased on 29th March 2021
+    ('weddings', '2021-01-05', '2021-03-29', 1),
+    # Weddings of up to 6 people allowed until 12th April 2021
+    ('weddings', '2021-03-29', '2021-04-12', 2),
+    # Weddings of up to 15 people allowed until 17th May 2021
+    ('weddings', '2021-04-12', '2021-05-17', 3),
+    # Weddings of up to 30 people allowed until 21st June 2021
+    ('weddings', '2021-05-17', '2021-06-21', 4),
+
+    # Fully banned during lockdown 1 until restrictions eased on 4th July
+    ('self_acc', '2020-03-23', '2020-07-04', 1),
+    # Allowed with max legal limits of 30 people up to rule of 6 on 14th September
+    ('self_acc', '2020-07-04', '2020-09-14', 4),
+    # Rule of 6
+    ('self_acc', '2020-09-14', '2020-10-14', 3),
+    # Household only
+    ('self_acc', '2020-10-14', '2020-11-05', 2),
+    # Fully banned during lockdown 2 until special Christmas rules 24-26th December
+    ('self_acc', '2020-11-05', '2020-12-24', 1),
+    # Special christmas rules allow more than one household of any size up to 3 households to get together.  Just classify as rule of 6 for the purposes of modelling
+    ('self_acc', '2020-12-24', '2020-12-27', 3),
+    # Fully banned under tier 3 and all through national lockdown 3 until 12th April 2021
+    ('self_acc', '2020-12-27', '2021-04-12', 1),
+    # Household only
+    ('self_acc', '2021-04-12', '2021-05-17', 2),
+    # Household only
+    ('self_acc', '2021-05-17', None, 2),
+
+    # Fully banned during lockdown 1 until restrictions eased on 25th July
+    ('sport_lei_indoor', '2020-03-23', '2020-07-25', 1),
+    # Reopen legally for groups of up to 30 (although guidance states rule of 6)
+    ('sport_lei_indoor', '2020-07-25', '2020-09-14', 4),
+    # Open with rule of 6
+    ('sport_lei_indoor', '2020-09-14', '2020-10-14', 3),
+    # Household only
+    ('sport_lei_indoor', '2020-10-14', '2020-11-05', 4),
+    # Fully banned during lockdown 2, through tier 3 and lockdown 3 until restrictions eased on 12 April
+    ('sport_lei_indoor', '2020-11-05', '2021-04-12', 1),
+    # Open to household only
+    ('sport_lei_indoor', '2021-04-12', None, 1),
+
+    # Fully banned during lockdown 1 until restrictions eased on 4th July
+    ('sport_lei_outdoor', '2020-03-23', '2020-07-04', 1),
+    # No restrictions on organised sport or leisure organised formally
+    ('sport_lei_outdoor', '2020-07-04', '2020-11-05', 5),
+    # Fully banned during lockdown 2, through tier 3 until restrictions eased on
+    ('sport_lei_outdoor', '2020-11-05', '2021-03-29', 1),
+    # Fully banned during lockdown 1 until restrictions eased on 4th July
+    ('sport_lei_outdoor', '2021-03-29', None, 5),
+
+    # Fully closed during lockdown 1 until restrictions eased on 15th June
+    ('non_ess_retail', '2020-03-23', '2020-06-15', 0),
+    # Fully closed during lockdown  until restrictions eased on 2nd December
+    ('non_ess_retail', '2020-11-05', '2020-12-02', 0),
+    # Fully closed during lockdown 3 until restrictions eased on 12th April
+    ('non_ess_retail', '2021-01-05', '2021-04-12', 0),
+
+    # Fully closed during lockdown 1 until restrictions eased on 1st June 2020
+    ('prim_sch', '2020-03-23', '2020-06-01', 0),
+    # Fully closed during lockdown 3 until restrictions eased on 8th March 2021
+    ('prim_sch', '2021-01-06', '2021-03-08', 0),
+
+    # Fully closed during lockdown until restrictions eased on
+    ('sec_sch', '2020-03-23', '2020-06-15', 0),
+    # Fully closed during lockdown until restrictions eased on
+    ('sec_sch', '2021-01-06', '2021-03-08', 0),
+
+    # Mostly closed during lockdown until start of 2020/2021 academic year
+    ('uni_campus', '2020-03-23', '2020-09-01', 0),
+    # Mostly closed during lockdown 3 until restrictions eased on 17th May
+    ('uni_campus', '2021-01-05', None, 0),
+
+    # Max two people gathering outside of household
+    ('outdoor_grp_public', '2020-03-23', '2020-06-01', 2),
+    # Max 6 people gathering
+    ('outdoor_grp_public', '2020-06-01', '2020-07-04', 3),
+    # Max 30 people gathering (although rule of 6 as 'guidance')
+    ('outdoor_grp_public', '2020-07-04', '2020-09-14', 4),
+    # Rule of 6 becomes legal
+    ('outdoor_grp_public', '2020-09-14', '2020-11-05', 3),
+    # Max two people gathering outside of household
+    ('outdoor_grp_public', '2020-11-05', '2020-12-02', 2),
+    # Rule of 6
+    ('outdoor_grp_public', '2020-12-02', '2021-01-05', 3),
+    # Max two people gathering outside of household
+    ('outdoor_grp_public', '2021-01-05', '2021-03-29', 2),
+    # Rule of 6
+    ('outdoor_grp_public', '2021-03-29', None, 3),
+
+    # Max two people gathering outside of household
+    ('outdoor_grp_private', '2020-03-23', '2020-06-01', 2),
+    # Max 6 people gathering
+    ('outdoor_grp_private', '2020-06-01', '2020-07-04', 3),
+    # Max 30 people gathering (although rule of 6 as 'guidance')
+    ('outdoor_grp_private', '2020-07-04', '2020-09-14', 4),
+    # Rule of 6 becomes legal
+    ('outdoor_grp_private', '2020-09-14', '2020-11-02', 3),
+    # Household only
+    ('outdoor_grp_private', '2020-11-02', '2020-11-05', 1),
+    # Max two people gathering outside of household
+    ('outdoor_grp_private', '2020-11-05', '2020-12-02', 2),
+    # Household only
+    ('outdoor_grp_private', '2020-12-02', '2021-03-29', 1),
+    # Rule of 6
+    ('outdoor_grp_private', '2021-03-29', None, 3),
+
+    # Household group only
+    ('indoor_grp', '2020-03-23', '2020-07-04', 1),
+    # Max 30 people gathering (although rule of 6 as 'guidance')
+    ('indoor_grp', '2020-07-04', '2020-09-14', 3),
+    # Rule of 6
+    ('indoor_grp', '2020-09-14', '2020-10-14', 2),
+    # Household only
+    ('indoor_grp', '2020-10-14', '2020-12-24', 1),
+    # Special christmas rules allow more than one household of any size up to 3 households to get together.  Just classify as rule of 6 for the purposes of modelling
+    ('indoor_grp', '2020-12-24', '2020-12-27', 2),
+    # Household only
+    ('indoor_grp', '2020-12-27', None, 1),
+
+    # Eat out to Help out scheme active, encouraging people to go and use hospitality venues.
+    ('eat_out', '2020-08-03', '2020-09-01', 1),
+], columns=['variable', 'start', 'end', 'value'])
+
+# Restriction changes marked on the lockdown charts, keyed by date with a description and whether the label
+# has an arrow.  Each must be a start or end date in restriction_periods, except the advice only changes in
+# lockdown_guidance_dates which move no predictor.
+lockdown_events = {
+    '2020-03-16': ("Advice to avoid non-essential contact and travel", True),
+    '2020-03-23': ("First national lockdown", False),
+    '2020-06-01': ("Groups of six outdoors and primary schools reopen", False),
+    '2020-06-15': ("Non-essential retail and secondary schools reopen", False),
+    '2020-07-04': ("Hospitality, hotels and entertainment reopen", False),
+    '2020-08-03': ("Eat Out to Help Out starts", False),
+    '2020-09-22': ("Return to working from home advised", False),
+    '2020-10-14': ("Tier system introduced", False),
+    '2020-11-02': ("Local ban on mixing households", True),
+    '2020-11-05': ("Second national lockdown", False),
+    '2020-12-02': ("Tier 3", False),
+    '2021-01-05': ("Third national lockdown", False),
+    '2021-03-08': ("Schools reopen", False),
+    '2021-03-29': ("Rule of six outdoors", True),
+    '2021-04-12': ("Non-essential retail and outdoor hospitality reopen", False),
+}
+lockdown_guidance_dates = ['2020-03-16', '2020-09-22']
+
+# National lockdowns (red) and the restricted periods between them (orange) shaded on the lockdown charts, each
+# running from its key date to the next phase, the last until lockdown_phases_end
+lockdown_phase_colours = {'2020-03-23': 'red', '2020-06-15': 'orange', '2020-11-05': 'red', '2020-12-02': 'orange',
+                          '2021-01-05': 'red', '2021-03-29': 'orange'}
+lockdown_phases_end = '2021-04-25'
+
+
+def build_lockdown_key_dates(periods=restriction_periods):
+
+    """Builds the chart key dates from the restriction timeline, numbered in date order.
+
+           VALUE: return a Pandas Dataframe of date, description, showarrow and label
+
+           PARAMETERS:
+             - periods is a Pandas Dataframe of restriction periods, e.g. restriction_periods
+           """
+
+    changes = set(periods['start']) | set(periods['end'].dropna()) | set(lockdown_guidance_dates)
+    missing = sorted(set(lockdown_events) - changes)
+    if missing:
+        raise Exception(f"Invalid lockdown_events - {missing} are not changes in the restriction periods.")
+
+    dates = sorted(date for date in changes if date in lockdown_events)
+    key_dates = pd.DataFrame([(date, ) + lockdown_events[date] for date in dates],
+                             columns=['date', 'description', 'showarrow'])
+    key_dates['label'] = [f"({i})" for i in range(1, len(key_dates) + 1)]
+
+    return key_dates
+
+
+def build_lockdown_phases(key_dates):
+
+    """Builds the shaded chart phases, each running from its key date to the start of the next phase.
+
+           VALUE: return a Pandas Dataframe of start, end and fillcolor
+
+           PARAMETERS:
+             - key_dates is a Pandas Dataframe from build_lockdown_key_dates
+           """
+
+    starts = [date for date in key_dates['date'] if date in lockdown_phase_colours]
+    if len(starts) != len(lockdown_phase_colours):
+        raise Exception("Invalid lockdown_phase_colours - Needs every phase to start on a key date.")
+
+    return pd.DataFrame({'start': starts,
+                         'end': starts[1:] + [lockdown_phases_end],
+                         'fillcolor': [lockdown_phase_colours[date] for date in starts]})
+
+
+lockdown_key_dates = build_lockdown_key_dates()
+lockdown_phases = build_lockdown_phases(lockdown_key_dates)
+
+
+def apply_restrictions(dataf, variable):
+
+    """Creates a lockdown predictor column from the restriction timeline.
+
+           VALUE: return a dataframe with the predictor column added
+
+           PARAMETERS:
+             - dataf is a Pandas Dataframe with a DateTime index
+             - variable is the predictor name, a key of restriction_defaults
+           """
+
+    dataf[variable] = restriction_defaults[variable]
+    for period in restriction_periods.loc[restriction_periods.variable == variable].itertuples():
+        in_period = dataf.index >= period.start
+        if pd.notna(period.end):
+            in_period &= dataf.index < period.end
+        dataf.loc[in_period, variable] = period.value
+
+    return dataf
+
+
+def hosp_indoor(dataf):
+
+    return apply_restrictions(dataf, 'hosp_indoor')
+
+
+def hosp_outdoor(dataf):
+
+    return apply_restrictions(dataf, 'hosp_outdoor')
+
+
+def hotels(dataf):
+
+    return apply_restrictions(dataf, 'hotels')
+
+
+def ent_indoor(dataf):
+
+    return apply_restrictions(dataf, 'ent_indoor')
+
+
+def ent_outdoor(dataf):
+
+    return apply_restrictions(dataf, 'ent_outdoor')
+
+
+def weddings(dataf):
+
+    return apply_restrictions(dataf, 'weddings')
+
+
+def self_acc(dataf):
+
+    return apply_restrictions(dataf, 'self_acc')
+
+
+def sport_lei_indoor(dataf):
+
+    return apply_restrictions(dataf, 'sport_lei_indoor')
+
+
+def sport_lei_outdoor(dataf):
+
+    return apply_restrictions(dataf, 'sport_lei_outdoor')
+
+
+def non_essential_retail(dataf):
+
+    return apply_restrictions(dataf, 'non_ess_retail')
+
+
+def primary_schools(dataf):
+
+    return apply_restrictions(dataf, 'prim_sch')
+
+
+def secondary_schools(dataf):
+
+    return apply_restrictions(dataf, 'sec_sch')
+
+
+def university(dataf):
+
+    return apply_restrictions(dataf, 'uni_campus')
+
+
+def outdoor_grp_public(dataf):
+
+    return apply_restrictions(dataf, 'outdoor_grp_public')
+
+
+def outdoor_grp_private(dataf):
+
+    return apply_restrictions(dataf, 'outdoor_grp_private')
+
+
+def indoor_grp(dataf):
+
+    return apply_restrictions(dataf, 'indoor_grp')
+
+
+def eat_out(dataf):
+
+    return apply_restrictions(dataf, 'eat_out')
+
+
+@instrument_stage
+def create_lockdown_predictors(dataf):
+
+    lockdown_var_list = [hosp_indoor,
+                         hosp_outdoor,
+                         hotels,
+                         ent_indoor,
+                         ent_outdoor,
+                         weddings,
+                         self_acc,
+                         sport_lei_indoor,
+                         sport_lei_outdoor,
+                         non_essential_retail,
+                         primary_schools,
+                         secondary_schools,
+                         university,
+                         outdoor_grp_public,
+                         outdoor_grp_private,
+                         indoor_grp,
+                         eat_out]
+
+    for func in lockdown_var_list:
+        dataf = func(dataf)
+
+    return dataf
+
+
+@instrument_stage
+def create_weather_predictors(dataf,new_weather,previous_weather,freq="day",tolerance=None,lags=None,rolling=None):
+    """Create weather dataset and normalise values across the same range.
+
+    The hourly and daily weather tables are built once per session by weather_features.build_weather_tables and
+    joined to dataf through its DatetimeIndex, keeping dataf's index.
+
+    PARAMETERS:
+      - weather 1 is a pandas dataframe containing combined weather data from the NCAS archive from 01/04/2017.
+      - weather 2 is a pandas dataframe containing weather data from a previous intern project up to 31/03/2017.
+      - freq is the weather table to join, either "day" or "hour".
+      - tolerance is the largest gap allowed between a row of dataf and its weather, e.g. '1D' to join daily
+        weather to hourly footfall.  None means an exact timestamp match.
+      - lags and rolling are optional lagged and rolling weather features, see weather_features.add_weather_features.
+    """
+    if freq not in ["day", "hour"]:
+        raise Exception("Invalid freq - Needs either 'day' or 'hour'.")
+
+    tables = build_weather_tables(new_weather, previous_weather, lags, rolling)
+
+    return join_weather(dataf, tables[freq], tolerance)
+
+
+@instrument_stage
+def create_date_predictors(dataf):
+
+    #dataf['year'] = pd.DatetimeIndex(dataf.index).year
+    dataf['month'] = pd.DatetimeIndex(dataf.index).month_name()
+    dataf['dayofweek'] = pd.DatetimeIndex(dataf.index).day_name()
+
+    #dataf = pd.get_dummies(dataf, columns=['year'], drop_first=True, prefix='year')
+    dataf = pd.get_dummies(dataf, columns=['month'], drop_first=True, prefix='month')
+    dataf = pd.get_dummies(dataf, columns=['dayofweek'], drop_first=True, prefix='wday')
+
+    return dataf
+
+
+@instrument_stage
+def create_holiday_predictors(dataf,bankholdf,schooltermdf):
+    bankholdf['bank_hols'] = 1
+
+    schooltermdf['schoolholidays'] = np.where(schooltermdf['schoolStatus']=='Close',1,0)
+    schooltermdf = schooltermdf.loc[schooltermdf.index >= '2008'].sort_index()
+    schooltermdf = schooltermdf.asfreq('D')
+    schooltermdf.ffill(inplace=True)
+
+    dataf = dataf.merge(bankholdf, left_on=dataf.index,right_on='ukbankhols',how='left')
+    dataf = dataf.set_index('ukbankhols')
+    dataf.bank_hols = dataf.bank_hols.fillna(0)
+
+    dataf = dataf.merge(schooltermdf,how='left',left_on=dataf.index,right_on=schooltermdf.index).set_index('key_0').drop(['schoolStatus'],axis=1)
+
+    return dataf
+
+
+#The following workflow performs some data management to account for the dataframe requiring transformation into a numpy array to work with the walk forward validation code
+@instrument_stage
+def arrange_cols(dataf,n_in):
+#Extract columns that need moving for walk forward validation later
+    #cols_to_move = [col for col in dataf.iloc[:,0:7]] DEPRECATED, MAY NEED IN FutureWarning
+    cols_to_move = []
+    n_in = n_in+1
+    for i in range(1,n_in):
+        cols_to_move.append(f'var1(t-{i})')
+
+    cols_to_move.append('var1(t)')
+    #Identify reference column as last column
+    ref_col = [col for col in dataf.iloc[:,-1:]][0]
+
+    #Calls a function that moves specified columns to the end of the dataframe.
+    dataf = movecol(dataf,
+                 cols_to_move=cols_to_move,
+                 ref_col=ref_col,
+                 place='After')
+
+    return dataf
+
+
+# transform a time series dataset into a supervised learning dataset
+@instrument_stage
+def series_to_supervised(data, n_in=1, n_out=1, dropnan=True):
+    n_vars = 1 if type(data) is list else data.shape[1]
+    df = pd.DataFrame(data)
+    cols,names = list(),list()
+    # input sequence (t-n, ... t-1)
+    for i in range(n_in, 0, -1):
+        cols.append(df.shift(i))
+        names += [('var%d(t-%d)' % (j+1, i)) for j in range(n_vars)]
+    # forecast sequence (t, t+1, ... t+n)
+    for i in range(0, n_out):
+        cols.append(df.shift(-i))
+        if i == 0:
+            names += [('var%d(t)' % (j+1)) for j in range(n_vars)]
+        else:
+            names += [('var%d(t+%d)' % (j+1, i)) for j in range(n_vars)]
+    # put it all together
+    agg = pd.concat(cols, axis=1)
+    agg.columns = names
+    # drop rows with NaN values
+    if dropnan:
+        agg.dropna(inplace=True)
+    return agg
+
+
+def create_horizon_targets(dataf, n_out):
+    """Build the targets for every step of a forecast horizon as one matrix.
+
+    Row t of the result holds var1(t), var1(t+1) ... var1(t+n_out-1), taken as a strided view over the
+    var1(t) column rather than by shifting the dataframe once per horizon step.
+
+    VALUE: return a Pandas dataframe with one column per horizon step, n_out - 1 rows shorter than dataf
+
+    PARAMETERS:
+      - dataf is a Pandas Dataframe prepared for walk forward validation, containing a var1(t) column.
+      - n_out is the number of days in the forecast horizon.
+    """
+    windows = sliding_window_view(dataf['var1(t)'].values, n_out)
+    names = ['var1(t)'] + [f'var1(t+{i})' for i in range(1, n_out)]
+
+    return pd.DataFrame(windows, index=dataf.index[:len(windows)], columns=names)
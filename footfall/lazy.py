@@ -0,0 +1,50 @@
+import importlib
+
+# Deferred imports for the heavy plotting and modelling libraries.  A Lazy stands in for a module, class,
+# function or object and only imports (or creates) it the first time an attribute is used or it is called, so
+# importing the library doesn't pay for plotly or scikit-learn until a chart or model is actually made.
+
+
+class Lazy:
+    """Stand-in for a module or object that is loaded on first use.
+
+    Attribute access and calls are passed on to the loaded object.  isinstance checks against a Lazy class
+    don't work, use the real class for those.
+
+    PARAMETERS:
+      - loader is a function with no arguments returning the object.
+      - name is the name shown when the stand-in is printed.
+    """
+
+    def __init__(self, loader, name):
+        self._loader = loader
+        self._name = name
+        self._target = None
+
+    def _load(self):
+        if self._target is None:
+            self._target = self._loader()
+        return self._target
+
+    def __getattr__(self, attr):
+        # Only called for attributes the stand-in doesn't have itself
+        if attr in ['_loader', '_name', '_target']:
+            raise AttributeError(attr)
+        return getattr(self._load(), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+    def __repr__(self):
+        state = "loaded" if self._target is not None else "not loaded"
+        return f"<lazy {self._name} ({state})>"
+
+
+def lazy_import(module):
+    """Return a stand-in for a module that is imported on first use, e.g. go = lazy_import('plotly.graph_objects')."""
+    return Lazy(lambda: importlib.import_module(module), module)
+
+
+def lazy_from(module, name):
+    """Return a stand-in for a name imported from a module on first use, like a deferred 'from module import name'."""
+    return Lazy(lambda: getattr(importlib.import_module(module), name), f"{module}.{name}")
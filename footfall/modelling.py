@@ -0,0 +1,471 @@
+import pandas as pd
+import numpy as np
+from numpy import asarray
+import os, os.path
+import time
+from footfall.lazy import Lazy, lazy_import, lazy_from
+from footfall.features import arrange_cols, create_horizon_targets
+
+# Modelling layer: walk forward validation, regressor backends and feature importance.  scikit-learn and
+# joblib are only imported when a model is first built.
+
+joblib = lazy_import('joblib')
+Parallel = lazy_from('joblib', 'Parallel')
+delayed = lazy_from('joblib', 'delayed')
+mean_absolute_error = lazy_from('sklearn.metrics', 'mean_absolute_error')
+mean_squared_error = lazy_from('sklearn.metrics', 'mean_squared_error')
+RandomForestRegressor = lazy_from('sklearn.ensemble', 'RandomForestRegressor')
+ExtraTreesRegressor = lazy_from('sklearn.ensemble', 'ExtraTreesRegressor')
+clone = lazy_from('sklearn.base', 'clone')
+MultiOutputRegressor = lazy_from('sklearn.multioutput', 'MultiOutputRegressor')
+MinMaxScaler = lazy_from('sklearn.preprocessing', 'MinMaxScaler')
+
+
+def import_hist_gradient_boosting():
+    try:
+        from sklearn.ensemble import HistGradientBoostingRegressor
+    except ImportError:
+        # scikit-learn < 1.0 keeps the histogram based estimator behind an experimental flag
+        from sklearn.experimental import enable_hist_gradient_boosting
+        from sklearn.ensemble import HistGradientBoostingRegressor
+    return HistGradientBoostingRegressor
+
+
+HistGradientBoostingRegressor = Lazy(import_hist_gradient_boosting, 'sklearn.ensemble.HistGradientBoostingRegressor')
+
+# Shared scaler for walk forward validation, created on first use
+min_max_scaler = Lazy(lambda: MinMaxScaler(), 'min_max_scaler')
+
+# Permutation importance results keyed by model and data fingerprint
+permutation_importance_cache = {}
+
+
+# split a univariate dataset into train/test sets
+def train_test_split(data, n_test):
+    return data.iloc[:-n_test, :].copy(), data.iloc[-n_test:, :].copy()
+
+
+def regressor_backends():
+    """Create a dictionary of the regressor backends available to the walk forward forecaster.
+
+    VALUE: return a dictionary mapping backend names to the estimator class and the name of its size parameter
+
+    """
+    backends = {
+        "random_forest": (RandomForestRegressor, "n_estimators"),
+        "extra_trees": (ExtraTreesRegressor, "n_estimators"),
+        "hist_gradient_boosting": (HistGradientBoostingRegressor, "max_iter")
+    }
+    return backends
+
+
+def backend_name(backend):
+    """Return a readable name for a regressor backend.
+
+    VALUE: return a string
+
+    PARAMETERS:
+      - backend is either a backend name from regressor_backends or an unfitted scikit-learn estimator.
+    """
+    if isinstance(backend, str):
+        return backend
+
+    return type(backend).__name__
+
+
+def create_regressor(backend, tree):
+    """Create an unfitted regressor for the chosen backend.
+
+    VALUE: return an unfitted scikit-learn estimator
+
+    PARAMETERS:
+      - backend is either a backend name from regressor_backends or an unfitted scikit-learn estimator.
+      - tree is the number of trees (or boosting iterations) to build, ignored for estimator backends.
+    """
+    # Estimators passed in directly are cloned so each refit starts from a clean model
+    if not isinstance(backend, str):
+        return clone(backend)
+
+    backends = regressor_backends()
+    if backend not in backends:
+        raise Exception(f"Invalid regressor backend - Needs one of {list(backends)} or a scikit-learn estimator.")
+
+    model_class, size_param = backends[backend]
+
+    return model_class(**{size_param: tree})
+
+
+def tree_predictions(model, X):
+    """Predict with every tree of a fitted forest.
+
+    A forest's prediction is the mean of its trees' predictions, so this costs the same as model.predict and
+    the point forecast is the mean over the first axis.
+
+    VALUE: return an array of shape (trees, samples), or (trees, samples, outputs) for multi-output forests
+
+    PARAMETERS:
+      - model is a fitted random forest or extra-trees regressor.
+      - X is the array of features to predict.
+    """
+    from sklearn.ensemble import RandomForestRegressor, ExtraTreesRegressor
+    if not isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)):
+        raise Exception("Invalid model - Needs a fitted random_forest or extra_trees model for per-tree predictions.")
+
+    # Trees work on C ordered float32, so convert and check once rather than once per tree
+    X = np.ascontiguousarray(X, dtype=np.float32)
+
+    return np.stack([estimator.predict(X, check_input=False) for estimator in model.estimators_])
+
+
+def forest_quantiles(model, X, quantiles=(0.05, 0.5, 0.95)):
+    """Quantiles of a forest's per-tree predictions.
+
+    VALUE: return an array with one row per quantile and one column per sample
+
+    PARAMETERS:
+      - model is a fitted random forest or extra-trees regressor.
+      - X is the array of features to predict.
+      - quantiles is a list of quantiles between 0 and 1.
+    """
+    return np.quantile(tree_predictions(model, X), quantiles, axis=0)
+
+
+def conformal_adjustment(y, lower, upper, alpha=0.1):
+    """Calibrate forest intervals with the errors from walk forward validation (conformalised quantiles).
+
+    Each validation step scores how far the actual value fell outside its interval (negative when inside).
+    Widening future intervals by the (1 - alpha) quantile of the scores gives them (1 - alpha) coverage when
+    the future errors look like the validation errors.
+
+    VALUE: return the amount to widen both sides of an interval by, negative if the raw intervals are too wide
+
+    PARAMETERS:
+      - y is the array of actual values.
+      - lower and upper are the arrays of interval bounds predicted for them.
+      - alpha is the target miscoverage, e.g. 0.1 for 90% intervals.
+    """
+    scores = np.maximum(np.asarray(lower) - np.asarray(y), np.asarray(y) - np.asarray(upper))
+    n = len(scores)
+    level = min(1.0, np.ceil((n + 1) * (1 - alpha)) / n)
+
+    return float(np.quantile(scores, level))
+
+
+def prediction_intervals(model, X, alpha=0.1, adjustment=0.0, index=None):
+    """Point forecasts and prediction intervals from one pass over a forest's trees.
+
+    VALUE: return a Pandas dataframe of predicted, lower and upper
+
+    PARAMETERS:
+      - model is a fitted random forest or extra-trees regressor.
+      - X is the array of features to predict.
+      - alpha is the miscoverage, e.g. 0.1 for the 5% to 95% per-tree quantiles.
+      - adjustment is the amount to widen the intervals by, from conformal_adjustment.
+      - index is an optional index for the dataframe, e.g. the test dates.
+    """
+    trees = tree_predictions(model, X)
+    lower, upper = np.quantile(trees, [alpha / 2, 1 - alpha / 2], axis=0)
+
+    return pd.DataFrame({'predicted': trees.mean(axis=0),
+                         'lower': lower - adjustment,
+                         'upper': upper + adjustment}, index=index)
+
+
+# fit a regressor and make a one step prediction
+def random_forest_forecast(train, testX, tree, backend="random_forest", timings=None, intervals=None, alpha=0.1):
+    # transform list into array
+    train = asarray(train)
+    # split into input and output columns
+    trainX, trainy = train[:, :-1], train[:, -1]
+    # fit model
+    model = create_regressor(backend, tree)
+    start = time.perf_counter()
+    model.fit(trainX, trainy)
+    fitted = time.perf_counter()
+    # make a one-step prediction, with its interval from the per-tree predictions if the caller is recording them
+    if intervals is not None:
+        trees = tree_predictions(model, [testX])
+        yhat = trees.mean(axis=0)
+        intervals.append(tuple(np.quantile(trees[:, 0], [alpha / 2, 1 - alpha / 2])))
+    else:
+        yhat = model.predict([testX])
+    predicted = time.perf_counter()
+    # accumulate fit and predict times if the caller is recording them
+    if timings is not None:
+        timings['fit_time'] = timings.get('fit_time', 0) + (fitted - start)
+        timings['predict_time'] = timings.get('predict_time', 0) + (predicted - fitted)
+    return yhat[0]
+
+
+# walk-forward validation for univariate data - NEEDS SOME WORK TO ADAPT FOR REFITTING SCALING TO TRAINING DATA AND APPLYING TO TEST
+# pass a list as intervals to record the per-tree (1 - alpha) prediction interval for each test step
+def walk_forward_validation(data, n_test, scalecols, n_in, tree, backend="random_forest", timings=None,
+                            intervals=None, alpha=0.1):
+    print(f'Validation has started on {tree} trees with {n_in} time lag(s) using the {backend_name(backend)} backend.  Please be patient, it may take a while and a message will be displayed when finished.')
+    predictions = list()
+
+    # split dataset
+    train, test = train_test_split(data, n_test)
+    #scale numerical data
+    train.loc[:,scalecols] = min_max_scaler.fit_transform(train.loc[:,scalecols])
+    test.loc[:,scalecols] = min_max_scaler.transform(test.loc[:,scalecols])
+    #rearrange columns and record variable names in a dictionary
+    train, test = arrange_cols(train,n_in), arrange_cols(test,n_in)
+    #convert dataframes to numpy arrays
+    train, test = train.values, test.values
+    # seed history with training dataset
+    history = [x for x in train]
+    # step over each time-step in the test set
+    for i in range(len(test)):
+        # split test row into input and output columns
+        testX, testy = test[i, :-1], test[i, -1]
+        # fit model on history and make a prediction
+        yhat = random_forest_forecast(history, testX, tree, backend, timings, intervals, alpha)
+        # store forecast in list of predictions
+        predictions.append(yhat)
+        # add actual observation to history for the next loop
+        history.append(test[i])
+        # summarize progress
+        #print(i,'>expected=%.1f, predicted=%.1f' % (testy, yhat))
+    # estimate prediction error
+    mae = mean_absolute_error(test[:, -1], predictions)
+    mse = mean_squared_error(test[:,-1], predictions)
+    return mae, mse, test[:, -1], predictions
+
+
+def compare_backends(data, n_test, scalecols, n_in, tree, backends=None):
+    """Run walk forward validation for several regressor backends and report their speed and accuracy.
+
+    VALUE: return a Pandas dataframe indexed by backend with fit time, predict time, MAE and MSE columns
+
+    PARAMETERS:
+      - data is a Pandas Dataframe prepared for walk forward validation.
+      - n_test is the number of time steps to hold back for testing.
+      - scalecols is a list of columns to scale.
+      - n_in is the number of time lags in the data.
+      - tree is the number of trees (or boosting iterations) for each backend.
+      - backends is a list of backend names or estimators, defaulting to every built-in backend.
+    """
+    if backends is None:
+        backends = list(regressor_backends())
+
+    results = []
+    for backend in backends:
+        timings = {'fit_time': 0, 'predict_time': 0}
+        mae, mse, y, yhat = walk_forward_validation(data, n_test, scalecols, n_in, tree, backend, timings)
+        results.append({'backend': backend_name(backend),
+                        'fit_time': timings['fit_time'],
+                        'predict_time': timings['predict_time'],
+                        'mae': mae,
+                        'mse': mse})
+
+    return pd.DataFrame(results).set_index('backend')
+
+
+def create_horizon_regressor(backend, tree, per_horizon=False, n_jobs=None):
+    """Create an unfitted regressor that predicts every step of a forecast horizon at once.
+
+    Random forest and extra-trees support multiple outputs natively, so one model covers the whole horizon.
+    Other backends, or per_horizon=True, fit one model per horizon step in parallel.
+
+    VALUE: return an unfitted scikit-learn estimator
+
+    PARAMETERS:
+      - backend is either a backend name from regressor_backends or an unfitted scikit-learn estimator.
+      - tree is the number of trees (or boosting iterations) to build.
+      - per_horizon, if True, forces one model per horizon step.
+      - n_jobs is the number of parallel jobs used when fitting one model per horizon step.
+    """
+    model = create_regressor(backend, tree)
+    if per_horizon or backend not in ["random_forest", "extra_trees"]:
+        model = MultiOutputRegressor(model, n_jobs=n_jobs)
+
+    return model
+
+
+# walk-forward validation predicting a whole forecast horizon from each origin with a single direct model
+def walk_forward_validation_horizon(data, n_test, scalecols, n_in, tree, n_out, backend="random_forest",
+                                    per_horizon=False, n_jobs=None):
+    print(f'Validation has started on {tree} trees with {n_in} time lag(s) and a {n_out} day horizon using the {backend_name(backend)} backend.  Please be patient, it may take a while and a message will be displayed when finished.')
+
+    # build the horizon targets and drop origins whose horizon runs past the end of the data
+    targets = create_horizon_targets(data, n_out)
+    data = data.iloc[:len(targets)]
+
+    # split dataset
+    train, test = train_test_split(data, n_test)
+    #scale numerical data
+    train.loc[:,scalecols] = min_max_scaler.fit_transform(train.loc[:,scalecols])
+    test.loc[:,scalecols] = min_max_scaler.transform(test.loc[:,scalecols])
+    #rearrange columns so var1(t) is last and can be dropped from the inputs
+    train, test = arrange_cols(train,n_in), arrange_cols(test,n_in)
+    X = np.vstack([train.values[:, :-1], test.values[:, :-1]])
+    Y = targets.values
+
+    predictions = np.empty((n_test, n_out))
+    for i in range(n_test):
+        origin = len(train) + i
+        # only rows whose whole horizon had been observed before the origin can be trained on
+        model = create_horizon_regressor(backend, tree, per_horizon, n_jobs)
+        model.fit(X[:origin - n_out + 1], Y[:origin - n_out + 1])
+        # predict the whole horizon for this origin in one call
+        predictions[i] = model.predict(X[origin:origin + 1])[0]
+
+    expected = targets.iloc[-n_test:]
+    predicted = pd.DataFrame(predictions, index=expected.index, columns=expected.columns)
+
+    # estimate prediction error for each step of the horizon
+    errors = pd.DataFrame({'horizon': range(1, n_out + 1),
+                           'mae': mean_absolute_error(expected, predicted, multioutput='raw_values'),
+                           'mse': mean_squared_error(expected, predicted, multioutput='raw_values')}).set_index('horizon')
+
+    return errors, expected, predicted
+
+
+def create_prediction_data(yhatdf,test,intervals=None,adjustment=0.0):
+    yhatdf = pd.DataFrame(yhatdf)
+
+    yhatdf['datetime'] = test.index
+    yhatdf = yhatdf.set_index('datetime').rename(columns={0:'predicted'})
+    yhatdf['roll_7_mean'] = yhatdf['predicted'].rolling(7).mean()
+    # interval bounds recorded by walk_forward_validation, widened by any conformal adjustment
+    if intervals is not None:
+        bounds = np.asarray(intervals)
+        yhatdf['lower'] = bounds[:, 0] - adjustment
+        yhatdf['upper'] = bounds[:, 1] + adjustment
+
+    return yhatdf
+
+
+def create_data_cols(dataf):
+    data_cols = [col for col in dataf] #List containing column names from daily dataframe
+    data_col_keys = list(range(len(data_cols))) # List containing integer positions of dataframe columns
+
+    #Creates a dictionary of column names with integer keys representing position
+    data_col_dict = dict(zip(data_col_keys, data_cols))
+
+    return data_col_keys, data_cols
+
+
+def create_importance_df(feature_import,datacols,lag):
+    importance = pd.DataFrame(feature_import)
+    importance['feature_name'] = datacols[:-1]
+    importance = importance.set_index('feature_name')
+    importance = importance.rename(columns={0:f'feat_importance_lag{lag}'}).sort_values(by=f'feat_importance_lag{lag}',ascending=False)
+
+    return importance
+
+
+def create_feature_groups(datacols, prefixes=('month_', 'wday_')):
+    """Group dummy columns that share a prefix so they are permuted together.
+
+    VALUE: return a dictionary mapping group names to lists of column positions
+
+    PARAMETERS:
+      - datacols is a list of feature column names.
+      - prefixes is a tuple of column name prefixes to group, by default the month and weekday dummies.
+    """
+    groups = {}
+    for i, col in enumerate(datacols):
+        prefix = [p for p in prefixes if col.startswith(p)]
+        name = prefix[0].rstrip('_') if prefix else col
+        groups.setdefault(name, []).append(i)
+
+    return groups
+
+
+def permute_groups(model, X, y, groups, n_repeats, random_state, positions):
+    """Score a batch of feature groups by permutation.  Called from the parallel workers.
+
+    A single copy of the test matrix is made per batch and each group's columns are shuffled in place and then
+    restored, so no further copies are made per feature or repeat.  Each group's permutations are seeded from
+    random_state and the group's position, so the scores do not depend on how the groups are batched.
+
+    VALUE: return a dictionary mapping group names to an array of MAE increases, one per repeat
+
+    PARAMETERS:
+      - model is a fitted regressor.
+      - X is a numpy array of test features and y the matching targets.
+      - groups is a dictionary of group names to column positions.
+      - n_repeats is the number of permutations per group.
+      - random_state is the seed for the permutations.
+      - positions is a dictionary of group names to the group's position among all the groups.
+    """
+    X_perm = X.copy()
+    baseline = mean_absolute_error(y, model.predict(X))
+
+    scores = {}
+    for name, cols in groups.items():
+        rng = np.random.default_rng([random_state, positions[name]])
+        scores[name] = np.empty(n_repeats)
+        for r in range(n_repeats):
+            # Shuffle the rows of the whole group together so grouped dummies stay consistent
+            X_perm[:, cols] = X[np.ix_(rng.permutation(len(X)), cols)]
+            scores[name][r] = mean_absolute_error(y, model.predict(X_perm)) - baseline
+        X_perm[:, cols] = X[:, cols]
+
+    return scores
+
+
+def create_permutation_importance_df(model, testX, testy, datacols, lag, groups=None, n_repeats=5,
+                                     random_state=0, n_jobs=-1, cache_dir=None):
+    """Calculate permutation importance for a fitted model, permuting grouped features together.
+
+    Importance is the increase in mean absolute error when a feature (or group of features) is shuffled.
+    Groups are split across parallel workers and results are cached by a fingerprint of the model, the test
+    data and the settings, in memory and optionally on disk.
+
+    VALUE: return a Pandas dataframe of mean and standard deviation of importance, sorted by mean importance
+
+    PARAMETERS:
+      - model is a fitted regressor.
+      - testX is an array of test features and testy the matching targets.
+      - datacols is a list of column names as in create_importance_df, with the target column last.
+      - lag is the number of time lags, used to name the output columns.
+      - groups is a dictionary of group names to column positions, defaulting to create_feature_groups.
+      - n_repeats is the number of permutations per group.
+      - random_state is the seed for the permutations, or None to draw one, so the results aren't reproduced by
+        a later call or served from the cache.
+      - n_jobs is the number of parallel workers, -1 for one per CPU.
+      - cache_dir is an optional directory to persist results in.
+    """
+    if random_state is None:
+        random_state = int(np.random.default_rng().integers(2 ** 32))
+    elif not isinstance(random_state, (int, np.integer)):
+        raise Exception("Invalid random_state - Needs an int or None.")
+    testX, testy = asarray(testX, dtype=float), asarray(testy, dtype=float)
+    if groups is None:
+        groups = create_feature_groups(datacols[:-1])
+
+    key = joblib.hash((joblib.hash(model), testX, testy, groups, n_repeats, random_state))
+    cache_path = os.path.join(cache_dir, f"perm_importance_{key}.pkl") if cache_dir is not None else None
+
+    if key in permutation_importance_cache:
+        scores = permutation_importance_cache[key]
+    elif cache_path is not None and os.path.isfile(cache_path):
+        scores = joblib.load(cache_path)
+    else:
+        # Split the groups into one batch per worker, threads share the model and test data without copying
+        n_workers = joblib.effective_n_jobs(n_jobs)
+        names = list(groups)
+        # Seeded by sorted position, as the cache key hashes the groups dictionary in sorted key order
+        positions = {name: i for i, name in enumerate(sorted(names))}
+        batches = [names[i::n_workers] for i in range(n_workers) if names[i::n_workers]]
+        results = Parallel(n_jobs=n_jobs, prefer="threads")(
+            delayed(permute_groups)(model, testX, testy, {name: groups[name] for name in batch}, n_repeats,
+                                    random_state, positions)
+            for batch in batches)
+        scores = {name: score for result in results for name, score in result.items()}
+        if cache_path is not None:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            joblib.dump(scores, cache_path)
+
+    permutation_importance_cache[key] = scores
+
+    importance = pd.DataFrame({f'perm_importance_lag{lag}': {name: s.mean() for name, s in scores.items()},
+                               f'perm_importance_std_lag{lag}': {name: s.std() for name, s in scores.items()}})
+    importance.index.name = 'feature_name'
+    importance = importance.sort_values(by=f'perm_importance_lag{lag}', ascending=False)
+
+    return importance
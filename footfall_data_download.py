@@ -4,8 +4,9 @@ from urllib.request import (
 import os, os.path
 import sys
 import pandas as pd
+import numpy as np
 
-def csv_check(soup):
+def csv_check(soup, datadir="data/lcc_footfall"):
     for link in soup.find_all('a'):
         # print("\n****",link,"****\n")
         url = link.get('href')
@@ -25,7 +26,7 @@ def csv_check(soup):
                 continue
 
             # Save the csv file (unless it already exists already)
-            full_path = os.path.join("data/lcc_footfall", filename)
+            full_path = os.path.join(datadir, filename)
             if os.path.isfile(full_path):
                 continue
             else:
@@ -42,7 +43,7 @@ def download_data(datadir):
     soup = BeautifulSoup(urlopen(root), 'html.parser')
 
     # Iterate over all links and see which are csv files
-    csv_check(soup)
+    csv_check(soup, datadir)
 
 def create_template_df():
     templatedf = pd.DataFrame(columns=["Location", "Date", "Hour", "Count", "DateTime", "FileName"])
@@ -138,7 +139,7 @@ def import_data(datadir):
         raise Exception(f"The number of rows in the individual files {total_rows} does \
     not match those in the final dataframe {len(merged_frames)}.")
 
-    footfall_data = template.append(merged_frames)
+    footfall_data = pd.concat([template, merged_frames])
     return footfall_data
 
 def convert_hour(series):
@@ -170,40 +171,57 @@ def convert_hour(series):
 # There are various checks to ensure duplicate files are not downloaded and merged into the final dataframe.  Initially the code included a check on the filename to filter out anything that started with 'Copy of', however after visualising the data I discovered that a lot of the data was missing from
 # earlier years (mostly 2015-2017) as many of the files had been named 'Copy of....' yet were not duplicates.  The code already ensures files that exist are not downloaded and I've gone through and eyeballed the files to do a sense check of whether duplicates exist or not.
 
-#set data directory
-data_dir = "data/lcc_footfall"
+# Files with a different layout that import_data skips on its first pass, patched in by import_special_cases
+SPECIAL_CASE_FILES = ['Monthly%20Data%20Feed-April%202017%20-%2020170510.csv',
+                      'Copy%20of%20Monthly%20Data%20Feed-November%202016%20-%2020161221.csv']
 
-#Function to parse the html and download the csv files to specified location
-download_data(data_dir)
+def import_special_cases(footfalldf, datadir, importlist=SPECIAL_CASE_FILES):
+    for file in importlist:
+        path = os.path.join(datadir, file)
+        if not os.path.exists(path):
+            print(f"{file} not found in {datadir}, skipping")
+            continue
+        df = pd.read_csv(path,
+                         parse_dates=['Date'],
+                         #dtype={"BRCYear": int,"BRCWeekNum":int},
+                         index_col=[0])
 
-#import data and output to a merged csv
-footfalldf_imported = import_data(data_dir)
+        df = df.rename(columns={'BRCWeek':'BRCWeekNum','DayOfWeek':'DayName','BRCMonthName':'BRCMonth','InCount':'Count'})
+        df = df.dropna(subset=['Hour'])
+        df['FileName'] = file
+        df['Hour'] = convert_hour(df['Hour'])
+        df['Hour'] = df['Hour'].astype(int)
+        df['DateTime'] = pd.to_datetime(pd.Series(data=[date.replace(hour=hour) for date,hour in zip(df.Date,df.Hour)]))
+        footfalldf = pd.concat([footfalldf,df])
 
-importlist = ['Monthly%20Data%20Feed-April%202017%20-%2020170510.csv',
-            'Copy%20of%20Monthly%20Data%20Feed-November%202016%20-%2020161221.csv']
+    return footfalldf
 
+def normalise_data(datadir):
+    """Import the downloaded csv files, patch in the special cases and tidy the columns.
 
+    VALUE: return the merged footfall dataframe, as written to data/LCC_footfall_2021.gz
 
-for file in importlist:
-    df = pd.read_csv(f"data/lcc_footfall/{file}",
-                     parse_dates=['Date'],
-                     #dtype={"BRCYear": int,"BRCWeekNum":int},
-                     index_col=[0])
+    PARAMETERS:
+      - datadir is the folder of downloaded csv files.
+    """
+    footfalldf_imported = import_data(datadir)
+    footfalldf_imported = import_special_cases(footfalldf_imported, datadir)
 
-    df = df.rename(columns={'BRCWeek':'BRCWeekNum','DayOfWeek':'DayName','BRCMonthName':'BRCMonth','InCount':'Count'})
-    df = df.dropna(subset=['Hour'])
-    df['FileName'] = file
-    df['Hour'] = convert_hour(df['Hour'])
-    df['Hour'] = df['Hour'].astype(int)
-    df['DateTime'] = pd.to_datetime(pd.Series(data=[date.replace(hour=hour) for date,hour in zip(df.Date,df.Hour)]))
-    footfalldf_imported = pd.concat([footfalldf_imported,df])
+    footfalldf_imported = footfalldf_imported.loc[:,'Location':'BRCYear']
 
+    footfalldf_imported['Location'] = footfalldf_imported['Location'].str.strip()
 
-footfalldf_imported = footfalldf_imported.loc[:,'Location':'BRCYear']
+    return footfalldf_imported
 
-footfalldf_imported['Location'] = footfalldf_imported['Location'].str.strip()
+if __name__ == "__main__":
+    #set data directory
+    data_dir = "data/lcc_footfall"
 
+    #Function to parse the html and download the csv files to specified location
+    download_data(data_dir)
 
-footfalldf_imported.to_csv("data/LCC_footfall_2021.csv",index=False)
-footfalldf_imported.to_csv("data/LCC_footfall_2021.gz",compression="gzip", index=False)
+    #import data, patch in the special case files and output to a merged csv
+    footfalldf_imported = normalise_data(data_dir)
 
+    footfalldf_imported.to_csv("data/LCC_footfall_2021.csv",index=False)
+    footfalldf_imported.to_csv("data/LCC_footfall_2021.gz",compression="gzip", index=False)
@@ -0,0 +1,270 @@
+import argparse
+import json
+import os, os.path
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+from urllib.parse import urlparse, parse_qs
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from source import create_horizon_targets, create_horizon_regressor
+from multi_series import camera_model_frame
+
+# Local forecast service.  Models are trained once with train_service_models and saved alongside the shared
+# calendar/weather/lockdown feature block.  The service loads both at startup and answers
+# "forecast camera X for the next N days" requests from the CLI or over HTTP on localhost, serving repeated
+# requests from an LRU cache.
+
+MODELS_FILE = "models.joblib"
+FEATURES_FILE = "features.pkl"
+LATENCY_WINDOW = 1000
+
+
+def train_service_models(daily, shared, n_in, n_out, tree, backend="random_forest"):
+    """Fit a direct multi-horizon model for each camera on all of its history.
+
+    Tree based backends are unaffected by the min-max scaling used during validation so the models are
+    trained on unscaled features.
+
+    VALUE: return a dictionary of model bundles keyed by camera name
+
+    PARAMETERS:
+      - daily is a Pandas Dataframe of daily footfall with one column per camera (see daily_location_counts).
+      - shared is a Pandas Dataframe of calendar/weather/lockdown predictors indexed by day.
+      - n_in is the number of time lags.
+      - n_out is the longest forecast horizon the service can answer.
+      - tree is the number of trees (or boosting iterations).
+      - backend is a regressor backend name or unfitted scikit-learn estimator.
+    """
+    models = {}
+    for location in daily.columns:
+        data = camera_model_frame(daily[location], shared, n_in)
+        targets = create_horizon_targets(data, n_out)
+        X = data.drop(columns='var1(t)').iloc[:len(targets)]
+
+        model = create_horizon_regressor(backend, tree)
+        model.fit(X.values, targets.values)
+
+        history = daily[location].dropna()
+        models[location] = {'model': model,
+                            'feature_columns': list(X.columns),
+                            'n_in': n_in,
+                            'n_out': n_out,
+                            'history': history.iloc[-n_in:].values,
+                            'last_date': history.index[-1]}
+
+    return models
+
+
+def save_service(dirpath, models, shared):
+    """Persist trained models and the shared feature block for the forecast service.
+
+    PARAMETERS:
+      - dirpath is the directory to write to, created if it doesn't exist.
+      - models is a dictionary of model bundles from train_service_models.
+      - shared is a Pandas Dataframe of calendar/weather/lockdown predictors indexed by day.
+    """
+    if not os.path.isdir(dirpath):
+        os.makedirs(dirpath)
+
+    joblib.dump(models, os.path.join(dirpath, MODELS_FILE))
+    shared.to_pickle(os.path.join(dirpath, FEATURES_FILE))
+
+
+class ForecastService:
+    """Answer footfall forecast requests from models and features loaded once at startup.
+
+    PARAMETERS:
+      - dirpath is a directory written by save_service.
+      - cache_size is the number of distinct (camera, days) responses kept in the LRU cache.
+    """
+
+    def __init__(self, dirpath, cache_size=256):
+        self.models = joblib.load(os.path.join(dirpath, MODELS_FILE))
+        self.features = pd.read_pickle(os.path.join(dirpath, FEATURES_FILE))
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        # Latency of the latest requests only, so the state stays the same size however long the service runs
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.cache_hits = 0
+        self.lock = Lock()
+
+    def cameras(self):
+        return sorted(self.models)
+
+    def predict(self, location, days):
+        """Forecast a camera for the days after its last observation.
+
+        VALUE: return a list of dictionaries with date and predicted footfall
+
+        PARAMETERS:
+          - location is the camera name.
+          - days is the number of days to forecast, up to the horizon the model was trained for.
+        """
+        if location not in self.models:
+            raise KeyError(f"Unknown camera '{location}'")
+        bundle = self.models[location]
+        if days < 1 or days > bundle['n_out']:
+            raise ValueError(f"Days needs to be between 1 and {bundle['n_out']}")
+
+        # Features for the forecast origin are the shared predictors for the next day plus the latest lags
+        origin = bundle['last_date'] + pd.Timedelta(days=1)
+        if origin not in self.features.index:
+            raise ValueError(f"No precomputed features for {origin.date()}")
+        lags = dict(zip([f'var1(t-{i})' for i in range(bundle['n_in'], 0, -1)], bundle['history']))
+        row = self.features.loc[origin]
+        X = np.array([[lags[col] if col in lags else row[col] for col in bundle['feature_columns']]])
+
+        yhat = bundle['model'].predict(X)[0][:days]
+        dates = pd.date_range(origin, periods=days, freq='D')
+
+        return [{'date': str(date.date()), 'predicted': float(value)} for date, value in zip(dates, yhat)]
+
+    def forecast(self, location, days):
+        """Forecast a camera, serving repeated requests from the LRU cache and recording latency.
+
+        The cached result is never handed out itself, each caller gets its own copy.
+
+        VALUE: return a list of dictionaries with date and predicted footfall
+
+        PARAMETERS:
+          - location is the camera name.
+          - days is the number of days to forecast.
+        """
+        start = time.perf_counter()
+        key = (location, days)
+        with self.lock:
+            self.requests += 1
+            result = self.cache.get(key)
+            if result is not None:
+                self.cache_hits += 1
+                self.cache.move_to_end(key)
+
+        if result is None:
+            result = self.predict(location, days)
+            with self.lock:
+                self.cache[key] = result
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+        with self.lock:
+            self.latencies.append(time.perf_counter() - start)
+
+        return [dict(row) for row in result]
+
+    def metrics(self):
+        """Summarise request counts, cache hits and the latency of the latest LATENCY_WINDOW requests in milliseconds.
+
+        VALUE: return a dictionary
+        """
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            metrics = {'requests': self.requests,
+                       'cache_hits': self.cache_hits,
+                       'cache_size': len(self.cache)}
+        if len(latencies) > 0:
+            metrics.update({'latency_mean_ms': float(latencies.mean()),
+                            'latency_p50_ms': float(np.percentile(latencies, 50)),
+                            'latency_p95_ms': float(np.percentile(latencies, 95)),
+                            'latency_max_ms': float(latencies.max())})
+
+        return metrics
+
+
+def make_handler(service):
+    """Create an HTTP request handler class bound to a forecast service.
+
+    Handles GET /forecast?camera=<name>&days=<n>, GET /cameras and GET /metrics, all returning JSON.
+
+    VALUE: return a BaseHTTPRequestHandler subclass
+
+    PARAMETERS:
+      - service is a ForecastService.
+    """
+
+    class ForecastHandler(BaseHTTPRequestHandler):
+
+        def send_json(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == "/forecast":
+                if 'camera' not in query:
+                    self.send_json(400, {'error': "Missing camera parameter"})
+                    return
+                try:
+                    camera = query['camera'][0]
+                    days = int(query.get('days', ['1'])[0])
+                    self.send_json(200, {'camera': camera, 'forecast': service.forecast(camera, days)})
+                except KeyError as e:
+                    self.send_json(404, {'error': e.args[0]})
+                except ValueError as e:
+                    self.send_json(400, {'error': str(e)})
+            elif url.path == "/cameras":
+                self.send_json(200, {'cameras': service.cameras()})
+            elif url.path == "/metrics":
+                self.send_json(200, service.metrics())
+            else:
+                self.send_json(404, {'error': f"Unknown path {url.path}"})
+
+        def log_message(self, format, *args):
+            # Keep the console quiet, request latency is available from /metrics
+            pass
+
+    return ForecastHandler
+
+
+def serve(service, host="127.0.0.1", port=8050):
+    """Serve forecasts over HTTP until interrupted.
+
+    PARAMETERS:
+      - service is a ForecastService.
+      - host is the interface to bind to, localhost by default.
+      - port is the port to listen on.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"Serving forecasts for {len(service.models)} cameras on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve footfall forecasts from saved models.")
+    parser.add_argument("modeldir", help="directory written by save_service")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    forecast_parser = subparsers.add_parser("forecast", help="print a forecast for one camera")
+    forecast_parser.add_argument("camera")
+    forecast_parser.add_argument("--days", type=int, default=1)
+
+    serve_parser = subparsers.add_parser("serve", help="serve forecasts over local HTTP")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8050)
+
+    args = parser.parse_args(argv)
+    service = ForecastService(args.modeldir)
+
+    if args.command == "forecast":
+        print(json.dumps(service.forecast(args.camera, args.days), indent=2))
+    else:
+        serve(service, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from footfall.lazy import lazy_from
+
+# Hourly forecasting mode.  Moving from daily totals to hourly counts multiplies the rows by 24, and with
+# series_to_supervised lags at 24 and 168 hours the DataFrame based feature building runs out of memory.
+# HourlyDesign instead keeps the hourly counts, calendar codes and daily feature block as compact numpy arrays
+# and writes the lag, hour of day, day of week and daily (lockdown/weather) columns straight into a
+# preallocated float32 matrix for just the rows asked for.  fit_hourly keeps the design matrix within a memory
+# budget by training on a subsample of rows, or by growing a forest a few trees at a time on separate chunks.
+#
+# Example:
+#   counts = hourly_location_counts(cleandf)
+#   design = HourlyDesign(counts['Briggate'], create_lockdown_predictors(pd.DataFrame(index=daily_index)))
+#   train_rows, test_rows = design.split(24 * 28)
+#   model = fit_hourly(design, 200, memory_budget_mb=256, rows=train_rows)
+#   mae, mse, y, yhat = evaluate_hourly(model, design, test_rows)
+
+create_regressor = lazy_from('footfall.modelling', 'create_regressor')
+mean_absolute_error = lazy_from('sklearn.metrics', 'mean_absolute_error')
+mean_squared_error = lazy_from('sklearn.metrics', 'mean_squared_error')
+
+HOURLY_LAGS = [1, 2, 3, 24, 168]
+
+# Backends that can be grown a few trees at a time on separate chunks with warm_start
+CHUNKED_BACKENDS = ["random_forest", "extra_trees"]
+
+
+def hourly_location_counts(dataf, dtype=np.float32):
+    """Resample cleaned footfall data to hourly counts with one column per camera.
+
+    Unlike daily_location_counts zero counts are kept, as empty streets overnight are genuine.  Hours with no
+    record are missing.
+
+    VALUE: return a Pandas dataframe with a row for every hour and a column of footfall per Location
+
+    PARAMETERS:
+      - dataf is a cleaned Pandas Dataframe with Location, DateTime and Count columns.
+      - dtype is the numeric type of the counts.
+    """
+    dataf = dataf.groupby(['Location', pd.Grouper(key='DateTime', freq=pd.offsets.Hour())])['Count'].sum(min_count=1)
+    dataf = dataf.unstack(level='Location').asfreq(pd.offsets.Hour())
+
+    return dataf.astype(dtype)
+
+
+def rows_for_budget(n_columns, memory_budget_mb, dtype=np.float32):
+    """Return the number of design matrix rows (features and target) that fit in a memory budget."""
+    row_bytes = (n_columns + 1) * np.dtype(dtype).itemsize
+
+    return max(1, int(memory_budget_mb * 2 ** 20 // row_bytes))
+
+
+class HourlyDesign:
+    """Hourly design matrix builder for one camera (or the total) that never materialises a DataFrame.
+
+    PARAMETERS:
+      - series is a Pandas Series of hourly footfall with a regular hourly DatetimeIndex, e.g. a column of
+        hourly_location_counts.
+      - daily is an optional Pandas dataframe of numeric predictors indexed by day, e.g. the lockdown and weather
+        block used by the daily models.  Each hour gets its day's row.  Hours on days missing from it are
+        not used.
+      - lags is a list of lags in hours.
+      - dtype is the numeric type of the design matrix.
+    """
+
+    def __init__(self, series, daily=None, lags=HOURLY_LAGS, dtype=np.float32):
+        times = pd.DatetimeIndex(series.index)
+        if len(times) > 1 and (times[1:] - times[:-1] != pd.Timedelta(hours=1)).any():
+            raise Exception("Invalid series - Needs a regular hourly index, see hourly_location_counts.")
+
+        self.times = times
+        self.lags = sorted(lags)
+        self.dtype = dtype
+        self.counts = series.values.astype(dtype)
+        self.hours = times.hour.values.astype(np.int8)
+        self.weekdays = times.dayofweek.values.astype(np.int8)
+
+        if daily is not None:
+            self.daily_index = pd.DatetimeIndex(daily.index)
+            self.daily_columns = list(daily.columns)
+            self.daily_values = daily.values.astype(dtype)
+        else:
+            self.daily_index, self.daily_columns = None, []
+            self.daily_values = np.empty((1, 0), dtype=dtype)
+        self.day_pos = self.day_positions(times)
+
+        self.columns = ([f'var1(t-{lag})' for lag in self.lags] + [f'hour_{h}' for h in range(1, 24)] +
+                        [f'wday_{d}' for d in range(1, 7)] + self.daily_columns)
+        self.rows = self.valid_rows()
+
+    def day_positions(self, times):
+        """Return the row of the daily predictors for each hour, -1 for days they don't cover."""
+        if self.daily_index is None:
+            return np.zeros(len(times), dtype=np.int32)
+
+        return self.daily_index.get_indexer(times.normalize()).astype(np.int32)
+
+    def valid_rows(self):
+        """Return the positions of the hours with a count, every lag and a daily feature row."""
+        observed = ~np.isnan(self.counts)
+        valid = observed & (self.day_pos >= 0)
+        valid[:self.lags[-1]] = False
+        for lag in self.lags:
+            valid[lag:] &= observed[:-lag]
+
+        return np.flatnonzero(valid)
+
+    def split(self, n_test):
+        """Split the usable rows into training rows and the last n_test rows for testing."""
+        return self.rows[:-n_test], self.rows[-n_test:]
+
+    def matrix(self, rows=None, out=None):
+        """Build the design matrix and target for some hours.
+
+        VALUE: return a tuple of the float design matrix and the target array
+
+        PARAMETERS:
+          - rows is an array of hour positions, from rows, split or a subsample of them.  None for every usable row.
+          - out is an optional preallocated array of at least len(rows) rows to write the matrix into.
+        """
+        rows = self.rows if rows is None else np.asarray(rows)
+        if out is None:
+            out = np.empty((len(rows), len(self.columns)), dtype=self.dtype)
+        X = out[:len(rows)]
+        self.fill(X, rows, self.counts, self.hours, self.weekdays, self.day_pos)
+
+        return X, self.counts[rows]
+
+    def fill(self, X, rows, counts, hours, weekdays, day_pos):
+        """Write the design matrix rows for the hour positions rows of the given hourly arrays into X."""
+        n_lags = len(self.lags)
+        for i, lag in enumerate(self.lags):
+            X[:, i] = counts[rows - lag]
+
+        # Hour of day and day of week dummies, dropping hour 0 and Monday
+        X[:, n_lags:n_lags + 29] = 0
+        line = np.arange(len(rows))
+        hours, weekdays = hours[rows], weekdays[rows]
+        X[line[hours > 0], n_lags - 1 + hours[hours > 0]] = 1
+        X[line[weekdays > 0], n_lags + 22 + weekdays[weekdays > 0]] = 1
+
+        X[:, n_lags + 29:] = self.daily_values[day_pos[rows]]
+
+    def fill_row(self, X, time, lag_values):
+        """Write the design matrix row for a single hour, given its lag values, into X[0]."""
+        n_lags = len(self.lags)
+        X[0, :n_lags] = lag_values
+        X[0, n_lags:n_lags + 29] = 0
+        if time.hour > 0:
+            X[0, n_lags - 1 + time.hour] = 1
+        if time.dayofweek > 0:
+            X[0, n_lags + 22 + time.dayofweek] = 1
+
+        day_pos = self.day_positions(pd.DatetimeIndex([time]))[0]
+        if day_pos < 0:
+            raise Exception(f"Invalid time - The daily predictors don't cover {time.date()}.")
+        X[0, n_lags + 29:] = self.daily_values[day_pos]
+
+    def chunks(self, rows, max_rows):
+        """Yield the design matrix and target for rows in chunks of up to max_rows, reusing one buffer."""
+        buffer = np.empty((min(max_rows, len(rows)), len(self.columns)), dtype=self.dtype)
+        for start in range(0, len(rows), max_rows):
+            yield self.matrix(rows[start:start + max_rows], out=buffer)
+
+    def forecast(self, model, steps):
+        """Forecast the hours after the end of the series, feeding each prediction back in as a lag.
+
+        The daily predictors must cover the forecast days.
+
+        VALUE: return a Pandas Series of forecasts indexed by hour
+
+        PARAMETERS:
+          - model is a model fitted by fit_hourly on this design.
+          - steps is the number of hours to forecast.
+        """
+        future = pd.date_range(self.times[-1] + pd.Timedelta(hours=1), periods=steps, freq=pd.offsets.Hour())
+        day_pos = np.concatenate([self.day_pos, self.day_positions(future)])
+        if (day_pos[len(self.times):] < 0).any():
+            raise Exception("Invalid steps - The daily predictors don't cover every forecast day.")
+
+        counts = np.concatenate([self.counts, np.full(steps, np.nan, dtype=self.dtype)])
+        hours = np.concatenate([self.hours, future.hour.values.astype(np.int8)])
+        weekdays = np.concatenate([self.weekdays, future.dayofweek.values.astype(np.int8)])
+
+        X = np.empty((1, len(self.columns)), dtype=self.dtype)
+        for t in range(len(self.times), len(counts)):
+            self.fill(X, np.array([t]), counts, hours, weekdays, day_pos)
+            if np.isnan(X[0, :len(self.lags)]).any():
+                raise Exception("Invalid series - Needs every lag observed at the end of the series to forecast.")
+            counts[t] = model.predict(X)[0]
+
+        return pd.Series(counts[len(self.times):], index=future)
+
+
+def fit_hourly(design, tree, backend="random_forest", memory_budget_mb=256, strategy="subsample", rows=None,
+               seed=0):
+    """Fit an hourly model without the design matrix growing past a memory budget.
+
+    The budget covers the design matrix only, not the fitted trees.  If every row fits it is used as is.
+    Otherwise strategy 'subsample' fits on a random sample of rows that fits, and 'chunks' splits the rows
+    into random chunks that each fit and grows a share of the forest's trees on each chunk in turn, so every
+    row is used.  Forests take the float32 matrix without copying it.
+
+    VALUE: return a fitted scikit-learn estimator
+
+    PARAMETERS:
+      - design is an HourlyDesign.
+      - tree is the number of trees (or boosting iterations).
+      - backend is a regressor backend name or unfitted scikit-learn estimator.  'chunks' needs random_forest
+        or extra_trees.
+      - memory_budget_mb is the largest design matrix to build, in megabytes.
+      - strategy is either 'subsample' or 'chunks'.
+      - rows is the array of hour positions to train on, e.g. from design.split.  None for every usable row.
+      - seed is the random seed for the subsample or chunks.
+    """
+    if strategy not in ["subsample", "chunks"]:
+        raise Exception("Invalid strategy - Needs either 'subsample' or 'chunks'.")
+
+    rows = design.rows if rows is None else np.asarray(rows)
+    max_rows = rows_for_budget(len(design.columns), memory_budget_mb, design.dtype)
+    rng = np.random.default_rng(seed)
+    model = create_regressor(backend, tree)
+
+    if len(rows) <= max_rows or strategy == "subsample":
+        if len(rows) > max_rows:
+            print(f"Training on {max_rows} of {len(rows)} hours to stay within {memory_budget_mb}MB")
+            rows = np.sort(rng.choice(rows, max_rows, replace=False))
+        X, y = design.matrix(rows)
+        return model.fit(X, y)
+
+    if backend not in CHUNKED_BACKENDS:
+        raise Exception(f"Invalid backend - Chunked training needs one of {CHUNKED_BACKENDS}.")
+
+    n_chunks = math.ceil(len(rows) / max_rows)
+    if n_chunks > tree:
+        raise Exception(f"Invalid memory_budget_mb - {n_chunks} chunks needs at least as many trees.")
+    print(f"Training on {len(rows)} hours in {n_chunks} chunks to stay within {memory_budget_mb}MB")
+
+    chunks = np.array_split(rng.permutation(rows), n_chunks)
+    trees = np.diff(np.linspace(0, tree, n_chunks + 1).round().astype(int))
+    buffer = np.empty((len(chunks[0]), len(design.columns)), dtype=design.dtype)
+    model.set_params(warm_start=True, n_estimators=0)
+    for chunk, chunk_trees in zip(chunks, trees):
+        X, y = design.matrix(np.sort(chunk), out=buffer)
+        model.set_params(n_estimators=model.n_estimators + chunk_trees)
+        model.fit(X, y)
+
+    return model
+
+
+def predict_hourly(model, design, rows, memory_budget_mb=256):
+    """Predict the hours at rows with their observed lags, building the design matrix in chunks.
+
+    VALUE: return an array of predictions
+    """
+    max_rows = rows_for_budget(len(design.columns), memory_budget_mb, design.dtype)
+
+    return np.concatenate([model.predict(X) for X, y in design.chunks(np.asarray(rows), max_rows)])
+
+
+def evaluate_hourly(model, design, rows, memory_budget_mb=256):
+    """Score one step ahead hourly predictions for the test rows.
+
+    VALUE: return a tuple of MAE, MSE, the observed counts and the predictions
+
+    PARAMETERS:
+      - model is a model from fit_hourly.
+      - design is the HourlyDesign it was fitted on.
+      - rows is the array of test hour positions, e.g. from design.split.
+      - memory_budget_mb is the largest design matrix chunk to build, in megabytes.
+    """
+    y = design.counts[rows]
+    yhat = predict_hourly(model, design, rows, memory_budget_mb)
+
+    return mean_absolute_error(y, yhat), mean_squared_error(y, yhat), y, yhat
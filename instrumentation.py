@@ -0,0 +1,193 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+# Stage level instrumentation for the .pipe pipelines.  Stage functions in source.py are wrapped with
+# instrument_stage, which does nothing but call the function unless a trace_pipeline block is active.  Inside
+# the block each stage records its wall time, rows in and out, the frame's memory before and after and the peak
+# memory allocated while it ran.
+
+# The active trace, or None when instrumentation is switched off
+_trace = None
+
+
+def frame_memory(obj, deep):
+    """Return the memory footprint of a dataframe or series in bytes, or None for anything else."""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(deep=deep)
+        return int(usage.sum()) if isinstance(obj, pd.DataFrame) else int(usage)
+
+    return None
+
+
+def frame_rows(obj):
+    """Return the number of rows in a dataframe or series, or None for anything else."""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return len(obj)
+
+    return None
+
+
+class PipelineTrace:
+    """Collects stage records for one traced pipeline run.
+
+    PARAMETERS:
+      - deep_memory, if True, measures object (string) columns exactly, which is slower on large frames.
+      - trace_memory, if True, records each stage's peak allocation with tracemalloc.
+    """
+
+    def __init__(self, deep_memory=True, trace_memory=True):
+        self.deep_memory = deep_memory
+        self.trace_memory = trace_memory
+        self.records = []
+        self.stack = []
+        self.origin = time.perf_counter()
+        self.thread = threading.get_ident()
+
+    def enter(self, name, dataf):
+        if self.trace_memory:
+            # Hand the peak so far to the enclosing stage before resetting it for this one
+            current, peak = tracemalloc.get_traced_memory()
+            if self.stack:
+                self.stack[-1]['peak_abs'] = max(self.stack[-1]['peak_abs'], peak)
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+        else:
+            current = 0
+
+        frame = {'stage': name,
+                 'depth': len(self.stack),
+                 'rows_in': frame_rows(dataf),
+                 'mem_in': frame_memory(dataf, self.deep_memory),
+                 'start_current': current,
+                 'peak_abs': current,
+                 'start': time.perf_counter()}
+        self.stack.append(frame)
+
+    def exit(self, result):
+        end = time.perf_counter()
+        frame = self.stack.pop()
+
+        peak_alloc = None
+        if self.trace_memory:
+            frame['peak_abs'] = max(frame['peak_abs'], tracemalloc.get_traced_memory()[1])
+            peak_alloc = frame['peak_abs'] - frame['start_current']
+            if self.stack:
+                self.stack[-1]['peak_abs'] = max(self.stack[-1]['peak_abs'], frame['peak_abs'])
+
+        self.records.append({'stage': frame['stage'],
+                             'depth': frame['depth'],
+                             'start_s': frame['start'] - self.origin,
+                             'time_s': end - frame['start'],
+                             'rows_in': frame['rows_in'],
+                             'rows_out': frame_rows(result),
+                             'mem_in': frame['mem_in'],
+                             'mem_out': frame_memory(result, self.deep_memory),
+                             'peak_alloc': peak_alloc})
+
+    def report(self):
+        """Summarise the traced stages in the order they started.
+
+        The copies column is the peak allocation divided by the size of the incoming frame, a rough count of
+        how many full copies of the data the stage made.
+
+        VALUE: return a Pandas dataframe with one row per stage call
+        """
+        report = pd.DataFrame(self.records, columns=['stage', 'depth', 'start_s', 'time_s', 'rows_in', 'rows_out',
+                                                     'mem_in', 'mem_out', 'peak_alloc'])
+        report = report.sort_values('start_s').reset_index(drop=True)
+
+        for col in ['mem_in', 'mem_out', 'peak_alloc']:
+            report[f'{col}_mb'] = report[col].astype(float) / 1024 ** 2
+        report['copies'] = report['peak_alloc'].astype(float) / report['mem_in'].astype(float)
+
+        return report.drop(columns=['mem_in', 'mem_out', 'peak_alloc'])
+
+    def write_trace(self, path):
+        """Write the stages as a Chrome trace event file, which can be opened in chrome://tracing or Perfetto.
+
+        PARAMETERS:
+          - path is the json file to write.
+        """
+        events = []
+        for record in self.records:
+            events.append({'name': record['stage'],
+                           'ph': 'X',
+                           'ts': record['start_s'] * 1e6,
+                           'dur': record['time_s'] * 1e6,
+                           'pid': os.getpid(),
+                           'tid': self.thread,
+                           'args': {k: record[k] for k in ['rows_in', 'rows_out', 'mem_in', 'mem_out', 'peak_alloc']}})
+
+        with open(path, "w") as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+class trace_pipeline:
+    """Context manager that switches stage instrumentation on for the code inside it.
+
+    Example:
+        with trace_pipeline(trace_file="clean.json") as trace:
+            footfalldf = footfalldf_imported.pipe(start_pipeline).pipe(combine_cameras)
+        trace.report()
+
+    PARAMETERS:
+      - trace_file is an optional path to write a Chrome trace event file to when the block exits.
+      - deep_memory, if True, measures object (string) columns exactly, which is slower on large frames.
+      - trace_memory, if True, records each stage's peak allocation with tracemalloc.
+    """
+
+    def __init__(self, trace_file=None, deep_memory=True, trace_memory=True):
+        self.trace = PipelineTrace(deep_memory, trace_memory)
+        self.trace_file = trace_file
+        self.started_tracemalloc = False
+
+    def __enter__(self):
+        global _trace
+        if _trace is not None:
+            raise Exception("A pipeline trace is already active.")
+        if self.trace.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+        _trace = self.trace
+        return self.trace
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _trace
+        _trace = None
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+        if self.trace_file is not None:
+            self.trace.write_trace(self.trace_file)
+        return False
+
+
+def instrument_stage(func):
+    """Decorate a pipeline stage function so it is recorded while a trace_pipeline block is active.
+
+    When no trace is active the wrapper only checks one module variable before calling the function.  Calls
+    from other threads than the one that started the trace are not recorded.
+
+    PARAMETERS:
+      - func is a stage function taking a dataframe as its first argument.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        trace = _trace
+        if trace is None or threading.get_ident() != trace.thread:
+            return func(*args, **kwargs)
+
+        trace.enter(func.__name__, args[0] if args else None)
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        finally:
+            trace.exit(result)
+
+    return wrapper
@@ -0,0 +1,311 @@
+import numpy as np
+import pandas as pd
+
+from source import *
+
+# Lazy pipeline execution.  LazyPipeline records .pipe stages as plan nodes instead of running them.  When the
+# result is collected the planner moves row filters as early as the stages allow, fuses neighbouring filters
+# into a single boolean mask, projects away columns that a later select doesn't need and drops copies that
+# aren't needed to protect the input, before running the plan once.  The result is the same as running the
+# stages eagerly with DataFrame.pipe.
+#
+# Each stage is described by the columns it reads and writes:
+#   - copy     start_pipeline style copies, which the planner replaces with copy-on-write tracking
+#   - filter   row-wise filters given as a mask function, which can move past stages that don't write the
+#              columns the mask reads
+#   - map      row-preserving stages, which filters can move past if the stage doesn't write what they read
+#   - rowset   stages that compare rows, which filters can move past only if they filter on the columns that
+#              define the row groups (check_remove_dup is a barrier, see its entry in stage_specs)
+#   - barrier  anything else (aggregations, re-indexing, unregistered functions), which nothing moves past
+#
+# The index is treated as a column called '__index__'.  reads=None means the stage depends on every column.
+
+INDEX = '__index__'
+
+
+class PlanNode:
+    """A single stage in a lazy pipeline plan.
+
+    PARAMETERS:
+      - name is the stage name shown by explain.
+      - kind is one of 'copy', 'filter', 'map', 'rowset', 'barrier' or 'select'.
+      - func is the function to run for map, rowset and barrier stages, called as func(dataf, *args, **kwargs).
+      - mask is the function returning a boolean mask for filter stages, called as mask(dataf, *args, **kwargs).
+      - reads is the set of columns the stage depends on, or None for every column.
+      - writes is the set of columns the stage changes, or None for every column.
+      - mutates, if True, means the stage changes the dataframe it is given in place.
+      - keys is the set of columns defining row groups for rowset stages.
+    """
+
+    def __init__(self, name, kind, func=None, mask=None, args=(), kwargs=None, reads=None, writes=None,
+                 mutates=False, keys=None, columns=None):
+        self.name = name
+        self.kind = kind
+        self.func = func
+        self.mask = mask
+        self.args = args
+        self.kwargs = kwargs if kwargs is not None else {}
+        self.reads = reads
+        self.writes = writes
+        self.mutates = mutates
+        self.keys = keys
+        self.columns = columns
+        self.fused = [self] if kind == 'filter' else []
+
+    def __repr__(self):
+        if self.kind == 'filter' and len(self.fused) > 1:
+            return f"filter[{' & '.join(n.name for n in self.fused)}]"
+        if self.kind in ['select', 'project']:
+            return f"{self.kind}{list(self.columns)}"
+        return f"{self.kind}[{self.name}]"
+
+
+# Plan node descriptions for the source.py stage functions, keyed by function.  Each entry takes the stage's
+# arguments and returns the keyword arguments for PlanNode.
+stage_specs = {
+    start_pipeline: lambda: dict(kind='copy'),
+    set_start_date: lambda date: dict(kind='filter', mask=lambda d, date: d.DateTime >= date,
+                                      reads={'DateTime'}),
+    date_range: lambda startdate, enddate: dict(kind='filter',
+                                                mask=lambda d, s, e: (d.index >= s) & (d.index <= e),
+                                                reads={INDEX}),
+    set_lockdown_timeframe: lambda: dict(kind='filter', mask=lambda d: (d.BRCYear == 2020) | (d.BRCYear == 2021),
+                                         reads={'BRCYear'}),
+    remove_new_cameras: lambda: dict(kind='filter',
+                                     mask=lambda d: ~((d['Location'] == "Albion Street at McDonalds") &
+                                                      (d['Location'] == "Park Row")),
+                                     reads={'Location'}),
+    drop_na: lambda: dict(kind='filter', mask=lambda d: d.notna().all(axis=1), reads=None),
+    combine_cameras: lambda: dict(kind='map', reads={'Location', 'Count'}, writes={'Location'}),
+    create_BRC_MonthNum: lambda: dict(kind='map', reads={'BRCMonth'}, writes={'BRCMonthNum'}, mutates=True),
+    # check_remove_dup only de-duplicates when more than one duplicate group exists, so a filter moved ahead of
+    # it can change whether the remaining duplicates are removed.  Nothing may move past it.
+    check_remove_dup: lambda: dict(kind='barrier', mutates=False),
+    set_dt_index: lambda: dict(kind='map', reads={'DateTime'}, writes={'DateTime', INDEX}),
+    create_lockdown_predictors: lambda: dict(kind='map', reads={INDEX}, mutates=True,
+                                             writes={'hosp_indoor', 'hosp_outdoor', 'hotels', 'ent_indoor',
+                                                     'ent_outdoor', 'weddings', 'self_acc', 'sport_lei_indoor',
+                                                     'sport_lei_outdoor', 'non_ess_retail', 'prim_sch', 'sec_sch',
+                                                     'uni_campus', 'outdoor_grp_public', 'outdoor_grp_private',
+                                                     'indoor_grp', 'eat_out'}),
+}
+
+
+def can_pass(filter_node, node):
+    """Return True if a filter can be moved before another stage without changing the result."""
+    if filter_node.reads is None:
+        return node.kind in ['copy', 'filter']
+    if node.kind in ['copy', 'filter']:
+        return True
+    if node.kind == 'map':
+        return node.writes is not None and not (node.writes & filter_node.reads)
+    if node.kind == 'rowset':
+        return filter_node.reads <= node.keys and not (node.writes & filter_node.reads)
+
+    return False
+
+
+def push_filters(nodes):
+    """Move each filter as early in the plan as the stages before it allow.
+
+    VALUE: return a new list of plan nodes
+    """
+    nodes = list(nodes)
+    for i in range(len(nodes)):
+        if nodes[i].kind != 'filter':
+            continue
+        j = i
+        while j > 0 and can_pass(nodes[i], nodes[j - 1]):
+            j -= 1
+        nodes.insert(j, nodes.pop(i))
+
+    return nodes
+
+
+def fuse_filters(nodes):
+    """Combine neighbouring filters into one node that applies a single combined mask.
+
+    VALUE: return a new list of plan nodes
+    """
+    fused = []
+    for node in nodes:
+        if node.kind == 'filter' and fused and fused[-1].kind == 'filter':
+            combined = PlanNode('fused', 'filter', reads=None)
+            combined.fused = fused[-1].fused + node.fused
+            fused[-1] = combined
+        else:
+            fused.append(node)
+
+    return fused
+
+
+def push_projection(nodes, columns):
+    """Select only the columns that a final select and the stages before it need, as early as possible.
+
+    Projection is only pushed when every stage before the select has known column dependencies.
+
+    VALUE: return a new list of plan nodes
+    """
+    select_at = [i for i, node in enumerate(nodes) if node.kind == 'select']
+    if not select_at:
+        return nodes
+
+    first = select_at[0]
+    needed = set(nodes[first].columns)
+    for node in reversed(nodes[:first]):
+        if node.kind == 'copy':
+            continue
+        if node.kind == 'filter':
+            for n in node.fused:
+                if n.reads is None:
+                    return nodes
+                needed |= n.reads
+            continue
+        if node.kind in ['barrier', 'select'] or node.reads is None or node.writes is None:
+            return nodes
+        needed = (needed - node.writes) | node.reads
+
+    needed = [col for col in columns if col in needed]
+    if len(needed) == len(columns):
+        return nodes
+
+    # Project straight after any leading filters so the filter and projection happen in one indexing step
+    at = 0
+    while at < len(nodes) and nodes[at].kind in ['copy', 'filter']:
+        at += 1
+
+    return nodes[:at] + [PlanNode('project', 'project', columns=needed)] + nodes[at:]
+
+
+class LazyPipeline:
+    """Build a footfall pipeline lazily and run an optimised plan when it is collected.
+
+    Example:
+        footfalldf = (LazyPipeline(footfalldf_imported)
+                      .pipe(start_pipeline)
+                      .pipe(set_start_date, '2008-08-27')
+                      .pipe(combine_cameras)
+                      .pipe(check_remove_dup)
+                      .pipe(remove_new_cameras)
+                      .pipe(create_BRC_MonthNum)
+                      .collect())
+
+    PARAMETERS:
+      - dataf is the Pandas Dataframe the pipeline starts from.  It is only modified in place if the eager chain
+        would have modified it too, i.e. when the plan has no start_pipeline copy.
+    """
+
+    def __init__(self, dataf, nodes=None):
+        self.dataf = dataf
+        self.nodes = nodes if nodes is not None else []
+
+    def pipe(self, func, *args, **kwargs):
+        """Add a stage to the plan.  Functions without a stage description run as barriers."""
+        if func in stage_specs:
+            spec = stage_specs[func](*args, **kwargs)
+            node = PlanNode(func.__name__, func=func, args=args, kwargs=kwargs, **spec)
+        else:
+            node = PlanNode(getattr(func, '__name__', 'function'), 'barrier', func=func, args=args, kwargs=kwargs,
+                            mutates=True)
+
+        return LazyPipeline(self.dataf, self.nodes + [node])
+
+    def select(self, columns):
+        """Add a column selection to the plan."""
+        return LazyPipeline(self.dataf, self.nodes + [PlanNode('select', 'select', columns=list(columns))])
+
+    def plan(self):
+        """Return the optimised list of plan nodes."""
+        nodes = push_filters(self.nodes)
+        nodes = fuse_filters(nodes)
+        nodes = push_projection(nodes, list(self.dataf.columns))
+
+        return [node for node in nodes if node.kind != 'copy']
+
+    def explain(self):
+        """Describe the recorded and optimised plans.
+
+        VALUE: return a string
+        """
+        recorded = " -> ".join(repr(node) for node in self.nodes)
+        optimised = " -> ".join(repr(node) for node in self.plan())
+
+        return f"recorded:  {recorded}\noptimised: {optimised}"
+
+    def collect(self):
+        """Run the optimised plan and return the result.
+
+        VALUE: return the result of the final stage, usually a Pandas Dataframe
+        """
+        dataf = self.dataf
+        # Without a copy in the plan the eager chain works on the input itself, so there is nothing to protect
+        owned = not any(node.kind == 'copy' for node in self.nodes)
+
+        nodes = self.plan()
+        i = 0
+        while i < len(nodes):
+            node = nodes[i]
+            if node.kind == 'filter':
+                mask = np.ones(len(dataf), dtype=bool)
+                for n in node.fused:
+                    mask &= np.asarray(n.mask(dataf, *n.args, **n.kwargs), dtype=bool)
+                # Apply a following projection in the same indexing step rather than copying twice
+                if i + 1 < len(nodes) and nodes[i + 1].kind == 'project':
+                    i += 1
+                    dataf = dataf.loc[mask, nodes[i].columns]
+                else:
+                    dataf = dataf.loc[mask]
+                owned = True
+            elif node.kind in ['select', 'project']:
+                dataf = dataf[node.columns]
+                owned = True
+            else:
+                if node.mutates and not owned:
+                    dataf = dataf.copy()
+                result = node.func(dataf, *node.args, **node.kwargs)
+                owned = owned or result is not dataf
+                dataf = result
+            i += 1
+
+        return dataf
+
+
+def check_equivalence(dataf, stages, columns=None):
+    """Run a chain of stages eagerly with DataFrame.pipe and lazily, and check the results match.
+
+    VALUE: return the eager result, raising an AssertionError if the lazy result differs
+
+    PARAMETERS:
+      - dataf is the Pandas Dataframe the chain starts from, copied for each run.
+      - stages is a list of functions or (function, args) tuples, e.g. [start_pipeline, (set_start_date, ('2008-08-27',))].
+      - columns is an optional list of columns to select at the end of both chains.
+    """
+    stages = [stage if isinstance(stage, tuple) else (stage, ()) for stage in stages]
+
+    expected, lazy = dataf.copy(), LazyPipeline(dataf.copy())
+    for func, args in stages:
+        expected = expected.pipe(func, *args)
+        lazy = lazy.pipe(func, *args)
+    if columns is not None:
+        expected, lazy = expected[list(columns)], lazy.select(columns)
+
+    pd.testing.assert_frame_equal(lazy.collect(), expected)
+
+    return expected
+
+
+if __name__ == "__main__":
+    # Equivalence checks, including a filter that could leave check_remove_dup with a single duplicate group
+    duplicates = pd.DataFrame({'Location': ['A', 'A', 'B', 'B', 'C'],
+                               'DateTime': pd.to_datetime(['2008-01-01', '2008-01-01', '2009-01-01', '2009-01-01',
+                                                           '2009-02-01']),
+                               'Count': [1, 1, 2, 2, 3],
+                               'BRCMonth': ['January', 'January', 'January', 'January', 'February'],
+                               'BRCYear': [2008, 2008, 2009, 2009, 2009]})
+    chains = [[start_pipeline, check_remove_dup, (set_start_date, ('2008-08-27',))],
+              [start_pipeline, (set_start_date, ('2008-08-27',)), combine_cameras, check_remove_dup,
+               remove_new_cameras, create_BRC_MonthNum],
+              [check_remove_dup, remove_new_cameras, (set_start_date, ('2008-08-27',))]]
+    for chain in chains:
+        result = check_equivalence(duplicates, chain)
+        print(f"{' -> '.join(getattr(s, '__name__', None) or s[0].__name__ for s in chain)}: {len(result)} rows match")
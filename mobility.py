@@ -0,0 +1,131 @@
+import hashlib
+import os, os.path
+
+import joblib
+import pandas as pd
+
+# Google COVID-19 Community Mobility Report ingest.  The national region reports are streamed in chunks reading
+# only the region and metric columns, each chunk is filtered to the wanted region before anything else is done
+# with it, and dates are parsed once on the small filtered result.  The filtered subset is cached as a parquet
+# file keyed by a hash of the source file and the region, so later sessions don't re-read the national files.
+#
+# Example:
+#   leedsmobility = load_mobility(["Data/googlemobility/2020_GB_Region_Mobility_Report.csv",
+#                                  "Data/googlemobility/2021_GB_Region_Mobility_Report.csv"])
+#   comparison = align_with_baseline(leedsmobility, calculate_baseline(footfalldf))
+
+MOBILITY_METRICS = ['retail_and_recreation_percent_change_from_baseline',
+                    'grocery_and_pharmacy_percent_change_from_baseline',
+                    'parks_percent_change_from_baseline',
+                    'transit_stations_percent_change_from_baseline',
+                    'workplaces_percent_change_from_baseline',
+                    'residential_percent_change_from_baseline']
+
+LEEDS = {'sub_region_1': "West Yorkshire", 'sub_region_2': "Leeds District"}
+
+
+def file_hash(path, blocksize=2 ** 20):
+    """Return the md5 hash of a file's contents, read in blocks."""
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(blocksize), b""):
+            md5.update(block)
+
+    return md5.hexdigest()
+
+
+def read_mobility(path, region=LEEDS, chunksize=200000):
+    """Stream one mobility report and keep only the rows for a region.
+
+    VALUE: return a Pandas dataframe of the region's daily mobility metrics indexed by date
+
+    PARAMETERS:
+      - path is the mobility report csv.
+      - region is a dictionary of region columns and the values to keep, e.g. {'sub_region_1': "West Yorkshire"}.
+      - chunksize is the number of csv rows parsed at a time.
+    """
+    usecols = list(region) + ['date'] + MOBILITY_METRICS
+    # Region columns repeat a few hundred values across the file, so parse them as categories
+    dtypes = dict({col: 'category' for col in region}, **{col: 'float64' for col in MOBILITY_METRICS})
+
+    chunks = []
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=chunksize):
+        keep = pd.Series(True, index=chunk.index)
+        for col, value in region.items():
+            keep &= chunk[col] == value
+        if keep.any():
+            chunks.append(chunk.loc[keep, ['date'] + MOBILITY_METRICS])
+
+    if not chunks:
+        raise Exception(f"Invalid region - No rows in {path} match {region}.")
+
+    dataf = pd.concat(chunks)
+    dataf['date'] = pd.to_datetime(dataf['date'], format="%Y-%m-%d")
+
+    return dataf.set_index('date').sort_index()
+
+
+def cached_mobility(path, region=LEEDS, cache_dir=None, chunksize=200000):
+    """Read a region from one mobility report through a parquet cache keyed by the file and region.
+
+    Parquet needs pyarrow or fastparquet.  Without either the region is re-read from the csv each time.
+
+    VALUE: return a Pandas dataframe of the region's daily mobility metrics indexed by date
+
+    PARAMETERS:
+      - path is the mobility report csv.
+      - region is a dictionary of region columns and the values to keep.
+      - cache_dir is the folder for cached subsets, defaulting to a 'cache' folder next to the csv.
+      - chunksize is the number of csv rows parsed at a time.
+    """
+    cache_dir = cache_dir if cache_dir is not None else os.path.join(os.path.dirname(path), "cache")
+    key = joblib.hash((file_hash(path), sorted(region.items())))
+    cache_path = os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(path))[0]}_{key}.parquet")
+
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+
+    dataf = read_mobility(path, region, chunksize)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        dataf.to_parquet(cache_path)
+    except ImportError:
+        print("Mobility subset not cached - parquet needs pyarrow or fastparquet")
+
+    return dataf
+
+
+def load_mobility(paths, region=LEEDS, cache_dir=None, chunksize=200000):
+    """Load a region's mobility metrics from several reports, e.g. the 2020 and 2021 files.
+
+    VALUE: return a Pandas dataframe of the region's daily mobility metrics indexed by date
+
+    PARAMETERS:
+      - paths is a list of mobility report csvs.
+      - region is a dictionary of region columns and the values to keep.
+      - cache_dir is the folder for cached subsets, defaulting to a 'cache' folder next to each csv.
+      - chunksize is the number of csv rows parsed at a time.
+    """
+    dataf = pd.concat([cached_mobility(path, region, cache_dir, chunksize) for path in paths])
+
+    return dataf.loc[~dataf.index.duplicated(keep='last')].sort_index()
+
+
+def align_with_baseline(mobility, baseline):
+    """Line up mobility metrics with the footfall percentage change from baseline by day.
+
+    Both measure the percentage change from a pre-pandemic baseline by day of the week, Google's over
+    3rd January to 6th February 2020 and the footfall baseline over 3rd January to 5th March 2020.
+
+    VALUE: return a Pandas dataframe of footfall_percent_change_from_baseline and the mobility metrics for the days
+    in both
+
+    PARAMETERS:
+      - mobility is a Pandas dataframe from load_mobility.
+      - baseline is a Pandas dataframe from calculate_baseline.
+    """
+    footfall = baseline[['baseline_per_change']].rename(
+        columns={'baseline_per_change': 'footfall_percent_change_from_baseline'})
+    footfall.index = footfall.index.normalize()
+
+    return footfall.join(mobility, how='inner')
@@ -0,0 +1,181 @@
+import pandas as pd
+import numpy as np
+from joblib import Parallel, delayed
+
+from source import series_to_supervised, walk_forward_validation, backend_name
+from sklearn.metrics import mean_absolute_error
+from sklearn.metrics import mean_squared_error
+
+# Multi-series forecasting driver.  Splits the cleaned footfall data by camera, builds each camera's lagged
+# features on top of a single shared calendar/weather/lockdown block and runs walk forward validation for every
+# camera in parallel worker processes.
+
+
+def daily_location_counts(dataf):
+    """Resample cleaned hourly footfall data to daily totals with one column per camera.
+
+    VALUE: return a Pandas dataframe indexed by day with a column of daily footfall per Location
+
+    PARAMETERS:
+      - dataf is a cleaned Pandas Dataframe with Location, DateTime and Count columns.
+    """
+    dataf = dataf.groupby(['Location', pd.Grouper(key='DateTime', freq='D')])['Count'].sum()
+    dataf = dataf.unstack(level='Location')
+
+    # Zero days are camera outages rather than genuinely empty streets, treat them as missing
+    dataf = dataf.replace(0, np.nan)
+
+    return dataf
+
+
+def shared_arrays(shared):
+    """Convert the shared feature block to the float array, day index and column names the cameras index into.
+
+    VALUE: return a tuple of a float64 numpy array, a DatetimeIndex and a list of column names
+
+    PARAMETERS:
+      - shared is a Pandas Dataframe of calendar/weather/lockdown predictors indexed by day.
+    """
+    return np.ascontiguousarray(shared.values, dtype=np.float64), pd.DatetimeIndex(shared.index), list(shared.columns)
+
+
+def camera_model_frame(series, shared, n_in):
+    """Build the walk forward validation frame for a single camera.
+
+    The camera's frame is a single float array allocated once, with the shared rows for the days the camera
+    has data taken straight into it with np.take, followed by the camera's lags and target.  The shared block
+    itself is only read, so it can be a read only memory map shared by every worker.
+
+    VALUE: return a Pandas dataframe of shared features followed by var1 lag columns and var1(t)
+
+    PARAMETERS:
+      - series is a Pandas Series of daily footfall for one camera.
+      - shared is a Pandas Dataframe of calendar/weather/lockdown predictors indexed by day, or a tuple from
+        shared_arrays.
+      - n_in is the number of time lags to create.
+    """
+    values, index, columns = shared_arrays(shared) if isinstance(shared, pd.DataFrame) else shared
+    series = series.dropna()
+    supervised = series_to_supervised(series.to_frame(), n_in)
+
+    # Only keep the days that also exist in the shared feature block
+    positions = index.get_indexer(supervised.index)
+    keep = positions >= 0
+    positions = positions[keep]
+
+    n_shared = values.shape[1]
+    matrix = np.empty((len(positions), n_shared + supervised.shape[1]), dtype=np.float64)
+    np.take(values, positions, axis=0, out=matrix[:, :n_shared])
+    matrix[:, n_shared:] = supervised.values[keep]
+
+    return pd.DataFrame(matrix, index=supervised.index[keep], columns=columns + list(supervised.columns),
+                        copy=False)
+
+
+def validate_camera(location, series, shared, n_test, scalecols, n_in, tree, backend):
+    """Run walk forward validation for a single camera.  Called from the worker processes.
+
+    VALUE: return a dictionary of the camera name, errors and expected/predicted series
+
+    PARAMETERS:
+      - location is the camera name.
+      - series is a Pandas Series of daily footfall for the camera.
+      - shared is a tuple from shared_arrays.
+      - n_test, scalecols, n_in, tree and backend are passed through to walk_forward_validation.
+    """
+    data = camera_model_frame(series, shared, n_in)
+    mae, mse, y, yhat = walk_forward_validation(data, n_test, scalecols, n_in, tree, backend)
+    index = data.index[-n_test:]
+
+    return {'Location': location,
+            'mae': mae,
+            'mse': mse,
+            'expected': pd.Series(y, index=index, name=location),
+            'predicted': pd.Series(yhat, index=index, name=location)}
+
+
+def reconcile_forecasts(camera_predictions, total_prediction):
+    """Proportionally scale per camera forecasts so that on each day they sum to the total forecast.
+
+    Only days where every camera and the total have a forecast are reconciled, as the total is only modelled
+    on days all the cameras report.  Forecasts on any other day are returned unchanged.
+
+    VALUE: return a Pandas dataframe of reconciled per camera forecasts
+
+    PARAMETERS:
+      - camera_predictions is a Pandas Dataframe indexed by day with a column of forecasts per camera.
+      - total_prediction is a Pandas Series of all-camera total forecasts indexed by day.
+    """
+    total_prediction = total_prediction.reindex(camera_predictions.index)
+    complete = camera_predictions.notna().all(axis=1) & total_prediction.notna()
+
+    scale = pd.Series(1.0, index=camera_predictions.index)
+    scale[complete] = total_prediction[complete] / camera_predictions.loc[complete].sum(axis=1)
+
+    return camera_predictions.mul(scale, axis=0)
+
+
+def forecast_locations(dataf, shared, n_test, scalecols, n_in, tree, backend="random_forest",
+                       locations=None, reconcile=False, n_jobs=-1):
+    """Train and validate a walk forward forecaster for every camera in parallel.
+
+    VALUE: return a tuple of a summary dataframe of errors by camera and a dataframe of predictions by camera
+
+    PARAMETERS:
+      - dataf is a cleaned Pandas Dataframe with Location, DateTime and Count columns.
+      - shared is a Pandas Dataframe of calendar/weather/lockdown predictors indexed by day, built once for all cameras
+        and memory mapped into the workers.
+      - n_test is the number of days to hold back for testing each camera.
+      - scalecols is a list of columns to scale (the shared numeric columns and the var1 lag columns).
+      - n_in is the number of time lags.
+      - tree is the number of trees (or boosting iterations).
+      - backend is a regressor backend name or unfitted scikit-learn estimator.
+      - locations is an optional list of cameras to model, defaulting to all of them.
+      - reconcile, if True, also models the all-camera total on the days every camera reports and scales the
+        camera forecasts to sum to it on the days every camera and the total have a forecast.
+      - n_jobs is the number of worker processes, -1 for one per CPU.
+    """
+    daily = daily_location_counts(dataf)
+    if locations is not None:
+        daily = daily.loc[:, locations]
+
+    # Cameras without enough history to train on cannot be validated
+    enough_data = daily.count() > 2 * n_test + n_in
+    for location in daily.columns[~enough_data]:
+        print(f"Skipping {location}, not enough days of footfall to validate {n_test} days")
+    daily = daily.loc[:, enough_data]
+
+    # The shared block is converted to one float array, which joblib dumps once and memory maps read only in
+    # every worker instead of pickling it into each camera's task
+    shared = shared_arrays(shared)
+    jobs = [delayed(validate_camera)(location, daily[location], shared, n_test, scalecols, n_in, tree, backend)
+            for location in daily.columns]
+    if reconcile:
+        # Only days every camera reports give a true total, partial days are left out rather than undercounted
+        total = daily.sum(axis=1, min_count=daily.shape[1]).rename('Total')
+        jobs.append(delayed(validate_camera)('Total', total, shared, n_test, scalecols, n_in, tree, backend))
+
+    results = Parallel(n_jobs=n_jobs, max_nbytes=0)(jobs)
+
+    summary = pd.DataFrame([{'Location': r['Location'], 'mae': r['mae'], 'mse': r['mse']} for r in results])
+    summary = summary.set_index('Location')
+    summary['backend'] = backend_name(backend)
+
+    predictions = pd.concat([r['predicted'] for r in results if r['Location'] != 'Total'], axis=1)
+
+    if reconcile:
+        expected = pd.concat([r['expected'] for r in results if r['Location'] != 'Total'], axis=1)
+        total_prediction = results[-1]['predicted']
+        predictions = reconcile_forecasts(predictions, total_prediction)
+
+        # Recalculate camera errors against the reconciled forecasts
+        for location in predictions.columns:
+            valid = predictions[location].notna() & expected[location].notna()
+            summary.loc[location, 'reconciled_mae'] = mean_absolute_error(
+                expected.loc[valid, location], predictions.loc[valid, location])
+            summary.loc[location, 'reconciled_mse'] = mean_squared_error(
+                expected.loc[valid, location], predictions.loc[valid, location])
+
+    print("Validation has finished for all cameras")
+
+    return summary, predictions
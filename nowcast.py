@@ -0,0 +1,259 @@
+import argparse
+import os, os.path
+import time
+from collections import deque
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# Online nowcasting.  A Nowcaster wraps an hourly model from hourly.fit_hourly, which stays fixed, and consumes
+# hourly counts as they arrive.  Each count is written into a ring buffer holding just the lag window, and the
+# model's one step forecast for that hour is compared with the count to update a ResidualCorrector, so an
+# update costs the same however long the feed has run.  After each update the rest of today and all of
+# tomorrow are re-forecast from the buffer with the correction applied, fading with the forecast horizon.
+#
+# The feed is a csv file of DateTime,Count rows that another process appends to, followed like 'tail -f'.
+#
+# Example:
+#   nowcaster = Nowcaster(model, design)
+#   nowcaster.save("models/briggate_nowcast.joblib")
+#   python nowcast.py models/briggate_nowcast.joblib data/feed/briggate.csv --follow --output nowcasts.csv
+
+LATENCY_WINDOW = 1000
+
+
+class ResidualCorrector:
+    """Exponentially weighted mean of recent forecast errors, added to the model's forecasts.
+
+    PARAMETERS:
+      - alpha is the weight given to the newest error, between 0 and 1.
+      - decay is how much of the correction carries over each hour ahead, so forecasts further out lean more on
+        the model.
+    """
+
+    def __init__(self, alpha=0.3, decay=0.9):
+        if not 0 < alpha <= 1:
+            raise Exception("Invalid alpha - Needs a value between 0 and 1.")
+        self.alpha = alpha
+        self.decay = decay
+        self.level = 0.0
+        self.updates = 0
+
+    def update(self, residual):
+        self.level += self.alpha * (residual - self.level)
+        self.updates += 1
+
+    def correction(self, steps_ahead):
+        """Return the correction for a forecast steps_ahead hours after the latest observation."""
+        return self.level * self.decay ** (steps_ahead - 1)
+
+
+class Nowcaster:
+    """Incrementally updated hourly forecasts for one camera.
+
+    PARAMETERS:
+      - model is a model fitted by hourly.fit_hourly, which is never refitted.
+      - design is the HourlyDesign the model was fitted on.  Its series seeds the lag window, so it should end
+        at the last hour before the feed starts.
+      - corrector is a ResidualCorrector, a default one if None.
+    """
+
+    def __init__(self, model, design, corrector=None):
+        self.model = model
+        self.design = design
+        self.corrector = corrector if corrector is not None else ResidualCorrector()
+
+        self.window = design.lags[-1]
+        self.lags = np.array(design.lags)
+        # Ring buffer of the latest counts, with the next count written at self.pos
+        self.buffer = design.counts[-self.window:].astype(np.float64)
+        self.pos = 0
+        self.time = design.times[-1]
+        self.row = np.empty((1, len(design.columns)), dtype=design.dtype)
+
+        # Latency of the latest updates only, so the state stays the same size however long the feed runs
+        self.update_seconds = deque(maxlen=LATENCY_WINDOW)
+        self.updates = 0
+        self.imputed = 0
+
+    def record_latency(self, seconds):
+        self.update_seconds.append(seconds)
+        self.updates += 1
+
+    def lag_values(self):
+        return self.buffer[(self.pos - self.lags) % self.window]
+
+    def push(self, value):
+        self.buffer[self.pos] = value
+        self.pos = (self.pos + 1) % self.window
+        self.time = self.time + pd.Timedelta(hours=1)
+
+    def predict_hour(self, when, lag_values):
+        """Return the model's forecast for an hour given its lag values, before correction."""
+        if np.isnan(lag_values).any():
+            return np.nan
+        self.design.fill_row(self.row, when, lag_values)
+
+        return float(self.model.predict(self.row)[0])
+
+    def predict_next(self):
+        """Return the model's forecast for the hour after the latest observation, before correction."""
+        return self.predict_hour(self.time + pd.Timedelta(hours=1), self.lag_values())
+
+    def update(self, when, count):
+        """Add an hourly count from the feed.
+
+        Counts at or before the latest hour are ignored.  Missing hours before when, and a missing (NaN) count,
+        are filled with the corrected forecast so the lags stay aligned and observed.
+
+        VALUE: return True if the count was used
+
+        PARAMETERS:
+          - when is the hour the count is for.
+          - count is the footfall count for that hour.
+        """
+        start = time.perf_counter()
+        when = pd.Timestamp(when)
+        if when <= self.time:
+            return False
+
+        while self.time + pd.Timedelta(hours=1) < when:
+            self.push(self.predict_next() + self.corrector.correction(1))
+            self.imputed += 1
+
+        forecast = self.predict_next()
+        if np.isnan(count):
+            # A blank count is filled like a missing hour, so it never reaches the lags
+            self.push(forecast + self.corrector.correction(1))
+            self.imputed += 1
+        else:
+            if not np.isnan(forecast):
+                self.corrector.update(count - forecast)
+            self.push(count)
+
+        self.record_latency(time.perf_counter() - start)
+        return True
+
+    def forecast(self, days=1):
+        """Forecast the rest of today and the next days, from the latest observation.
+
+        VALUE: return a Pandas dataframe indexed by hour with the model forecast, the correction and the
+        corrected forecast
+
+        PARAMETERS:
+          - days is the number of whole days after today to forecast.
+        """
+        end = self.time.normalize() + pd.Timedelta(days=days + 1)
+        steps = int((end - self.time) / pd.Timedelta(hours=1)) - 1
+
+        buffer, pos, when = self.buffer.copy(), self.pos, self.time
+        rows = []
+        for step in range(1, steps + 1):
+            when = when + pd.Timedelta(hours=1)
+            raw = self.predict_hour(when, buffer[(pos - self.lags) % self.window])
+            correction = self.corrector.correction(step)
+            buffer[pos] = raw + correction
+            pos = (pos + 1) % self.window
+            rows.append({'DateTime': when, 'model': raw, 'correction': correction, 'forecast': raw + correction})
+
+        return pd.DataFrame(rows, columns=['DateTime', 'model', 'correction', 'forecast']).set_index('DateTime')
+
+    def metrics(self):
+        """Summarise the updates made and the latency of the latest LATENCY_WINDOW updates in milliseconds.
+
+        VALUE: return a dictionary
+        """
+        latencies = np.array(self.update_seconds) * 1000
+        metrics = {'updates': self.updates,
+                   'imputed_hours': self.imputed,
+                   'latest_hour': str(self.time),
+                   'correction': self.corrector.level}
+        if len(latencies) > 0:
+            metrics.update({'latency_mean_ms': float(latencies.mean()),
+                            'latency_p95_ms': float(np.percentile(latencies, 95))})
+
+        return metrics
+
+    def save(self, path):
+        joblib.dump(self, path)
+
+    @staticmethod
+    def load(path):
+        return joblib.load(path)
+
+
+def follow_feed(path, follow=False, poll=1.0):
+    """Read DateTime,Count rows from a csv feed, waiting for new rows if follow is True.
+
+    VALUE: yield tuples of timestamp and count
+    """
+    with open(path) as f:
+        header = f.readline()
+        if not header.startswith("DateTime"):
+            raise Exception("Invalid feed - Needs a DateTime,Count header row.")
+        line = ""
+        while True:
+            part = f.readline()
+            if not part:
+                if not follow:
+                    break
+                time.sleep(poll)
+                continue
+            line += part
+            # A row is only complete once its newline has been written
+            if not line.endswith("\n"):
+                continue
+            when, count = line.strip().split(",")[:2]
+            line = ""
+            yield pd.Timestamp(when), float(count) if count != "" else np.nan
+
+
+def run_nowcast(nowcaster, feed, days=1, output=None):
+    """Update a Nowcaster from a feed, re-issuing its forecast after each count.
+
+    VALUE: return the latest forecast dataframe
+
+    PARAMETERS:
+      - nowcaster is a Nowcaster.
+      - feed is an iterable of (timestamp, count) tuples, e.g. from follow_feed.
+      - days is the number of whole days after today to forecast.
+      - output is an optional csv file the forecasts are appended to, with the hour they were issued at.
+    """
+    forecast = None
+    for when, count in feed:
+        if not nowcaster.update(when, count):
+            continue
+        forecast = nowcaster.forecast(days)
+        today = forecast.loc[forecast.index.normalize() == nowcaster.time.normalize(), 'forecast'].sum()
+        print(f"{nowcaster.time}: count {count:.0f}, correction {nowcaster.corrector.level:+.1f}, "
+              f"rest of today {today:.0f}")
+        if output is not None:
+            forecast.assign(issued=nowcaster.time).to_csv(output, mode="a", header=not os.path.exists(output))
+
+    return forecast
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update hourly footfall forecasts as counts arrive.")
+    parser.add_argument("nowcaster", help="file written by Nowcaster.save")
+    parser.add_argument("feed", help="csv feed of DateTime,Count rows")
+    parser.add_argument("--follow", action="store_true", help="keep waiting for new rows")
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument("--output", help="csv file to append forecasts to")
+    parser.add_argument("--save", action="store_true", help="save the updated state when the feed ends")
+    args = parser.parse_args(argv)
+
+    nowcaster = Nowcaster.load(args.nowcaster)
+    try:
+        run_nowcast(nowcaster, follow_feed(args.feed, args.follow), args.days, args.output)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(nowcaster.metrics())
+        if args.save:
+            nowcaster.save(args.nowcaster)
+
+
+if __name__ == "__main__":
+    main()
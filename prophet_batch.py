@@ -0,0 +1,184 @@
+import json
+import os, os.path
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import pandas as pd
+from prophet import Prophet
+from prophet.diagnostics import cross_validation, performance_metrics
+from prophet.serialize import model_to_json, model_from_json
+
+from source import create_lockdown_predictors, create_holiday_predictors
+
+# Batch Prophet training.  Fits a Prophet model per camera (and for the all-camera total) in worker processes,
+# with the bank holiday, school term and lockdown predictors as extra regressors.  Fitted models are serialised
+# to json next to a fingerprint of their training data and settings, and are reused for forecasting and
+# cross-validation until that fingerprint changes.
+
+
+def create_prophet_regressors(startdate, enddate, bankholdf, schooltermdf):
+    """Build the daily holiday and lockdown regressors shared by every Prophet model.
+
+    VALUE: return a Pandas dataframe indexed by day with one column per regressor
+
+    PARAMETERS:
+      - startdate and enddate are the first and last days to build regressors for, including forecast days.
+      - bankholdf is a Pandas Dataframe of UK bank holidays as used by create_holiday_predictors.
+      - schooltermdf is a Pandas Dataframe of school term dates as used by create_holiday_predictors.
+    """
+    regressors = pd.DataFrame(index=pd.date_range(startdate, enddate, freq='D'))
+    regressors = create_lockdown_predictors(regressors)
+    regressors = create_holiday_predictors(regressors, bankholdf.copy(), schooltermdf.copy())
+    regressors.index.name = 'ds'
+
+    return regressors.fillna(0)
+
+
+def prophet_frame(series, regressors):
+    """Combine a daily footfall series with the shared regressors in the layout Prophet expects.
+
+    VALUE: return a Pandas dataframe with ds, y and one column per regressor
+
+    PARAMETERS:
+      - series is a Pandas Series of daily footfall indexed by date.
+      - regressors is a Pandas Dataframe from create_prophet_regressors.
+    """
+    series = series.dropna()
+    frame = regressors.reindex(series.index)
+    frame.insert(0, 'y', series.values)
+    frame.insert(0, 'ds', series.index)
+
+    return frame.dropna().reset_index(drop=True)
+
+
+def model_path(model_dir, name):
+    """Return the file path for a serialised model, made safe for camera names with spaces and punctuation."""
+    return os.path.join(model_dir, re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_') + ".json")
+
+
+def fit_prophet_model(name, frame, prophet_params, model_dir):
+    """Fit and serialise a single Prophet model, or load it if the inputs haven't changed.  Called from the
+    worker processes.
+
+    VALUE: return a tuple of the model name and whether the model was refitted
+
+    PARAMETERS:
+      - name is the series (camera) name.
+      - frame is a Pandas Dataframe from prophet_frame.
+      - prophet_params is a dictionary of keyword arguments for Prophet.
+      - model_dir is the directory holding serialised models.
+    """
+    path = model_path(model_dir, name)
+    fingerprint = joblib.hash((frame, prophet_params))
+
+    if os.path.isfile(path):
+        with open(path) as f:
+            saved = json.load(f)
+        if saved['fingerprint'] == fingerprint:
+            return name, False
+
+    model = Prophet(**prophet_params)
+    for col in frame.columns[2:]:
+        model.add_regressor(col)
+    model.fit(frame)
+
+    with open(path, "w") as f:
+        json.dump({'name': name, 'fingerprint': fingerprint, 'model': model_to_json(model)}, f)
+
+    return name, True
+
+
+def load_prophet_model(model_dir, name):
+    """Load a serialised Prophet model and its fingerprint.
+
+    VALUE: return a tuple of the Prophet model and its fingerprint
+
+    PARAMETERS:
+      - model_dir is the directory holding serialised models.
+      - name is the series (camera) name.
+    """
+    with open(model_path(model_dir, name)) as f:
+        saved = json.load(f)
+
+    return model_from_json(saved['model']), saved['fingerprint']
+
+
+def fit_prophet_models(daily, regressors, model_dir, include_total=True, prophet_params=None, max_workers=None):
+    """Fit Prophet models for every camera and the total in parallel, reusing any whose inputs are unchanged.
+
+    VALUE: return a dictionary of fitted Prophet models keyed by camera name (and 'Total')
+
+    PARAMETERS:
+      - daily is a Pandas Dataframe of daily footfall with one column per camera (see daily_location_counts).
+      - regressors is a Pandas Dataframe from create_prophet_regressors.
+      - model_dir is the directory to serialise models to.
+      - include_total, if True, also fits a model to the all-camera daily total.
+      - prophet_params is an optional dictionary of keyword arguments for Prophet.
+      - max_workers is the number of worker processes, defaulting to one per CPU.
+    """
+    if prophet_params is None:
+        prophet_params = {'yearly_seasonality': True, 'weekly_seasonality': True, 'daily_seasonality': False}
+    if not os.path.isdir(model_dir):
+        os.makedirs(model_dir)
+
+    series = {name: daily[name] for name in daily.columns}
+    if include_total:
+        series['Total'] = daily.sum(axis=1, min_count=1)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(fit_prophet_model, name, prophet_frame(s, regressors), prophet_params, model_dir)
+                   for name, s in series.items()]
+        refitted = dict(f.result() for f in futures)
+
+    print(f"Fitted {sum(refitted.values())} Prophet model(s), reused {len(refitted) - sum(refitted.values())}")
+
+    return {name: load_prophet_model(model_dir, name)[0] for name in series}
+
+
+def prophet_forecast_all(models, regressors, periods):
+    """Forecast every fitted Prophet model a number of days ahead.
+
+    VALUE: return a Pandas dataframe of predicted footfall (yhat) with one column per model
+
+    PARAMETERS:
+      - models is a dictionary of fitted Prophet models from fit_prophet_models.
+      - regressors is a Pandas Dataframe from create_prophet_regressors covering the forecast days.
+      - periods is the number of days to forecast.
+    """
+    forecasts = {}
+    for name, model in models.items():
+        future = model.make_future_dataframe(periods=periods, include_history=False)
+        future = future.join(regressors, on='ds')
+        forecasts[name] = model.predict(future).set_index('ds')['yhat']
+
+    return pd.DataFrame(forecasts)
+
+
+def prophet_cross_validation_all(models, model_dir, horizon='14 days', initial='730 days', period='30 days'):
+    """Cross-validate every fitted Prophet model, reusing cached results while the model is unchanged.
+
+    VALUE: return a Pandas dataframe of Prophet performance metrics for each model and horizon
+
+    PARAMETERS:
+      - models is a dictionary of fitted Prophet models from fit_prophet_models.
+      - model_dir is the directory holding serialised models, where cross-validation results are also cached.
+      - horizon, initial and period are passed to Prophet's cross_validation.
+    """
+    metrics = []
+    for name, model in models.items():
+        fingerprint = load_prophet_model(model_dir, name)[1]
+        key = joblib.hash((fingerprint, horizon, initial, period))
+        cache_path = model_path(model_dir, name)[:-len(".json")] + f"_cv_{key}.pkl"
+
+        if os.path.isfile(cache_path):
+            cv = pd.read_pickle(cache_path)
+        else:
+            cv = cross_validation(model, horizon=horizon, initial=initial, period=period, parallel="processes")
+            cv.to_pickle(cache_path)
+
+        performance = performance_metrics(cv)
+        performance.insert(0, 'Location', name)
+        metrics.append(performance)
+
+    return pd.concat(metrics, ignore_index=True)
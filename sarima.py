@@ -0,0 +1,261 @@
+import json
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.seasonal import STL
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+from statsmodels.tsa.stattools import kpss
+
+# Batch SARIMA fitting.  Searches (p,d,q)(P,D,Q,s) orders for one or many daily footfall series across a
+# process pool, growing orders one term at a time and pruning any branch whose AIC is already well behind the
+# best model found.  AIC is only comparable between models with the same differencing, so the differencing
+# orders d and D are chosen per series first, from a seasonal strength measure and KPSS unit root tests, and
+# the AR/MA orders are then searched with those orders fixed.  Fitted parameters are saved to json so
+# forecasts can be regenerated by filtering the data with the stored parameters instead of refitting.
+
+
+def prepare_series(series):
+    """Put a daily footfall series on a regular daily frequency for SARIMA.
+
+    Missing days are left as NaN, which the state space model handles without imputation.
+
+    VALUE: return a Pandas Series with a daily frequency index
+
+    PARAMETERS:
+      - series is a Pandas Series of daily footfall indexed by date.
+    """
+    series = series.astype(float)
+    series.index = pd.DatetimeIndex(series.index)
+
+    return series.asfreq('D')
+
+
+def fit_sarima_order(name, series, order, seasonal_order):
+    """Fit a single SARIMA order.  Called from the worker processes.
+
+    VALUE: return a dictionary of the series name, orders, AIC and fitted parameters, or None if the fit fails
+
+    PARAMETERS:
+      - name is the series (camera) name.
+      - series is a Pandas Series with a daily frequency index.
+      - order is a (p,d,q) tuple.
+      - seasonal_order is a (P,D,Q,s) tuple.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            model = SARIMAX(series, order=order, seasonal_order=seasonal_order)
+            fitted = model.fit(disp=False)
+        except (ValueError, np.linalg.LinAlgError):
+            return None
+
+    if not np.isfinite(fitted.aic):
+        return None
+
+    return {'name': name,
+            'order': list(order),
+            'seasonal_order': list(seasonal_order),
+            'aic': float(fitted.aic),
+            'param_names': list(fitted.model.param_names),
+            'params': [float(p) for p in fitted.params],
+            'last_date': str(series.dropna().index[-1].date())}
+
+
+def select_differencing(series, max_d=1, max_D=1, s=7, seasonal_strength=0.64, alpha=0.05):
+    """Choose the differencing orders for a series before the AR/MA orders are searched.
+
+    A seasonal difference is taken while the STL seasonal strength of the series is above seasonal_strength,
+    then ordinary differences while a KPSS test rejects stationarity of the seasonally differenced series.
+
+    VALUE: return a tuple of (d, D)
+
+    PARAMETERS:
+      - series is a Pandas Series with a daily frequency index.
+      - max_d and max_D are the largest ordinary and seasonal differencing orders.
+      - s is the seasonal period in days.
+      - seasonal_strength is the strength above which the series is seasonally differenced.
+      - alpha is the significance level of the KPSS test.
+    """
+    # STL and KPSS need a gap free series, so short gaps are interpolated for the tests only
+    values = series.interpolate(limit_direction='both').dropna()
+
+    D = 0
+    while D < max_D and len(values) > 2 * s:
+        decomposed = STL(values, period=s).fit()
+        strength = 1 - np.var(decomposed.resid) / np.var(decomposed.seasonal + decomposed.resid)
+        if strength <= seasonal_strength:
+            break
+        values = values.diff(s).dropna()
+        D += 1
+
+    d = 0
+    with warnings.catch_warnings():
+        # kpss warns when the statistic is outside its p-value table, which still gives a usable bound
+        warnings.simplefilter("ignore")
+        while d < max_d and len(values) > 10:
+            if kpss(values, regression='c', nlags='auto')[1] >= alpha:
+                break
+            values = values.diff().dropna()
+            d += 1
+
+    return d, D
+
+
+def neighbour_orders(order, seasonal_order, max_order, max_seasonal_order):
+    """List the orders one term more complex than the given order.
+
+    VALUE: return a list of (order, seasonal_order) tuples
+
+    PARAMETERS:
+      - order is a (p,d,q) tuple and seasonal_order a (P,D,Q,s) tuple.
+      - max_order is the largest (p,d,q) to search and max_seasonal_order the largest (P,D,Q).
+    """
+    neighbours = []
+    for i in [0, 2]:
+        if order[i] < max_order[i]:
+            grown = list(order)
+            grown[i] += 1
+            neighbours.append((tuple(grown), seasonal_order))
+        if seasonal_order[i] < max_seasonal_order[i]:
+            grown = list(seasonal_order)
+            grown[i] += 1
+            neighbours.append((order, tuple(grown)))
+
+    return neighbours
+
+
+def search_sarima_orders(dataf, max_order=(2, 1, 2), max_seasonal_order=(1, 1, 1), s=7, prune_aic=10,
+                         max_workers=None, d=None, D=None):
+    """Search SARIMA orders for every series in one call, fitting candidates across a process pool.
+
+    The differencing orders are fixed for each series first, by select_differencing unless d and D are given,
+    because AIC values of models with different differencing are not comparable.  The search then starts from
+    the simplest AR/MA order and repeatedly grows the surviving orders by one term.  An order only survives
+    while its AIC is within prune_aic of the best AIC found for that series, so poor branches are never
+    expanded.
+
+    VALUE: return a dictionary of the best fit for each series, keyed by series name
+
+    PARAMETERS:
+      - dataf is a Pandas Dataframe of daily footfall with one column per camera, or a single Pandas Series.
+      - max_order is the largest (p,d,q) to search.
+      - max_seasonal_order is the largest seasonal (P,D,Q) to search.
+      - s is the seasonal period in days.
+      - prune_aic is how far behind the best AIC an order can be and still be expanded.
+      - max_workers is the number of worker processes, defaulting to one per CPU.
+      - d and D fix the ordinary and seasonal differencing orders for every series, chosen per series if None.
+    """
+    if isinstance(dataf, pd.Series):
+        dataf = dataf.to_frame(name=dataf.name if dataf.name is not None else 'Count')
+    series = {name: prepare_series(dataf[name].dropna()) for name in dataf.columns}
+
+    # Fix the differencing of each series, then start from its simplest ARMA terms
+    frontier = {}
+    for name in series:
+        if d is None or D is None:
+            chosen = select_differencing(series[name], max_order[1], max_seasonal_order[1], s)
+        else:
+            chosen = (d, D)
+        order = (0, chosen[0] if d is None else d, 0)
+        seasonal_order = (0, chosen[1] if D is None else D, 0, s)
+        print(f"{name}: d={order[1]}, D={seasonal_order[1]}")
+        frontier[name] = [(order, seasonal_order)]
+    tried = {name: set(roots) for name, roots in frontier.items()}
+    best = {}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        while any(frontier.values()):
+            futures = [executor.submit(fit_sarima_order, name, series[name], order, seasonal_order)
+                       for name, candidates in frontier.items() for order, seasonal_order in candidates]
+            fits = [f.result() for f in futures]
+            fits = [fit for fit in fits if fit is not None]
+
+            for fit in fits:
+                if fit['name'] not in best or fit['aic'] < best[fit['name']]['aic']:
+                    best[fit['name']] = fit
+
+            # Only grow orders whose AIC is still competitive with the best for that series
+            frontier = {name: [] for name in series}
+            for fit in fits:
+                name = fit['name']
+                if fit['aic'] > best[name]['aic'] + prune_aic:
+                    continue
+                for candidate in neighbour_orders(tuple(fit['order']), tuple(fit['seasonal_order']),
+                                                  max_order, max_seasonal_order):
+                    if candidate not in tried[name]:
+                        tried[name].add(candidate)
+                        frontier[name].append(candidate)
+
+    for name in series:
+        if name not in best:
+            print(f"No SARIMA order could be fitted for {name}")
+
+    return best
+
+
+def save_sarima_params(fits, path):
+    """Persist fitted SARIMA orders and parameters to a json file.
+
+    PARAMETERS:
+      - fits is a dictionary of fits from search_sarima_orders.
+      - path is the json file to write.
+    """
+    with open(path, "w") as f:
+        json.dump(fits, f, indent=2)
+
+
+def load_sarima_params(path):
+    """Load fitted SARIMA orders and parameters from a json file.
+
+    VALUE: return a dictionary of fits keyed by series name
+
+    PARAMETERS:
+      - path is a json file written by save_sarima_params.
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+def sarima_forecast(series, fit, steps):
+    """Forecast from stored SARIMA parameters without refitting.
+
+    The stored parameters are applied to the series with the Kalman filter, which is much faster than
+    estimating them again.
+
+    VALUE: return a Pandas Dataframe with predicted footfall and 95% interval bounds
+
+    PARAMETERS:
+      - series is a Pandas Series of daily footfall indexed by date.
+      - fit is one entry from search_sarima_orders or load_sarima_params.
+      - steps is the number of days to forecast.
+    """
+    series = prepare_series(series)
+    model = SARIMAX(series, order=tuple(fit['order']), seasonal_order=tuple(fit['seasonal_order']))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        filtered = model.filter(np.array(fit['params']))
+
+    forecast = filtered.get_forecast(steps)
+    bounds = forecast.conf_int()
+
+    return pd.DataFrame({'predicted': forecast.predicted_mean,
+                         'lower': bounds.iloc[:, 0],
+                         'upper': bounds.iloc[:, 1]})
+
+
+def sarima_forecast_all(dataf, fits, steps):
+    """Forecast every series that has stored SARIMA parameters.
+
+    VALUE: return a Pandas Dataframe of predicted footfall with one column per series
+
+    PARAMETERS:
+      - dataf is a Pandas Dataframe of daily footfall with one column per camera.
+      - fits is a dictionary of fits from search_sarima_orders or load_sarima_params.
+      - steps is the number of days to forecast.
+    """
+    forecasts = {name: sarima_forecast(dataf[name].dropna(), fit, steps)['predicted']
+                 for name, fit in fits.items() if name in dataf.columns}
+
+    return pd.DataFrame(forecasts)
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+
+from footfall.features import restriction_defaults, restriction_periods
+
+# Lockdown scenario simulation.  A scenario is an alternative restriction timeline, in the same layout as
+# restriction_periods.  simulate_scenarios builds the lockdown predictor values for every scenario into one
+# stacked array, writes them over the lockdown columns of a copy of the model's feature matrix per scenario and
+# scores the whole stack with a single predict call per model, returning each scenario's forecast and its
+# difference from the actual timeline.
+#
+# Lag columns keep their observed values, so the results are the model's one step ahead response to the
+# restrictions on each day rather than a full counterfactual history.
+#
+# Example:
+#   scenarios = {f"hospitality {d} days earlier": shift_restrictions(restriction_periods,
+#                    ['hosp_indoor', 'hosp_outdoor'], '2021-05-17', -d) for d in range(1, 29)}
+#   results = simulate_scenarios(model, data, scenarios)
+#   scenario_summary(results)
+
+
+def shift_restrictions(periods, variables, date, days):
+    """Move a restriction change to another date, e.g. to reopen hospitality two weeks earlier.
+
+    Every period of the variables starting or ending on date is changed to start or end days later (earlier for
+    negative days), so the periods either side of the change stay back to back.
+
+    VALUE: return a new restriction periods dataframe
+
+    PARAMETERS:
+      - periods is a Pandas dataframe of restriction periods, e.g. restriction_periods.
+      - variables is a list of predictor names, e.g. ['hosp_indoor', 'hosp_outdoor'].
+      - date is the date of the change to move.
+      - days is the number of days to move it by.
+    """
+    periods = periods.copy()
+    date = pd.Timestamp(date)
+    new_date = (date + pd.Timedelta(days=days)).strftime("%Y-%m-%d")
+    selected = periods['variable'].isin(variables)
+
+    matched = {col: selected & (pd.to_datetime(periods[col]) == date) for col in ['start', 'end']}
+    if not (matched['start'] | matched['end']).any():
+        raise Exception(f"Invalid date - No period of {variables} starts or ends on {date.date()}.")
+
+    for col in ['start', 'end']:
+        periods.loc[matched[col], col] = new_date
+
+    return periods
+
+
+def add_restriction(periods, variable, start, end, value):
+    """Add a period setting a predictor to a level, overriding any earlier period over the same days.
+
+    VALUE: return a new restriction periods dataframe
+
+    PARAMETERS:
+      - periods is a Pandas dataframe of restriction periods, e.g. restriction_periods.
+      - variable is the predictor name, a key of restriction_defaults.
+      - start and end are the first day and the day after the last day, end None for open ended.
+      - value is the restriction level.
+    """
+    if variable not in restriction_defaults:
+        raise Exception(f"Invalid variable - Needs one of {list(restriction_defaults)}.")
+    period = pd.DataFrame([(variable, start, end, value)], columns=periods.columns)
+
+    return pd.concat([periods, period], ignore_index=True)
+
+
+def restriction_values(index, scenarios, variables):
+    """Build the lockdown predictor values for many restriction timelines as one array.
+
+    Matches apply_restrictions: each predictor starts at its default and the periods are applied in order,
+    from start (inclusive) to end (exclusive).
+
+    VALUE: return an array of shape (scenarios, days, variables)
+
+    PARAMETERS:
+      - index is a sorted DatetimeIndex of days.
+      - scenarios is a list of restriction periods dataframes.
+      - variables is a list of predictor names, the last axis of the array.
+    """
+    index = pd.DatetimeIndex(index)
+    values = np.empty((len(scenarios), len(index), len(variables)), dtype=np.float32)
+    values[:] = [restriction_defaults[variable] for variable in variables]
+    positions = {variable: i for i, variable in enumerate(variables)}
+
+    for s, periods in enumerate(scenarios):
+        periods = periods.loc[periods['variable'].isin(variables)]
+        # Convert every period boundary to a row position at once
+        starts = index.searchsorted(pd.to_datetime(periods['start']).values, side='left')
+        ends = np.where(periods['end'].notna(),
+                        index.searchsorted(pd.to_datetime(periods['end']).values, side='left'), len(index))
+        for variable, start, end, value in zip(periods['variable'].values, starts, ends, periods['value'].values):
+            values[s, start:end, positions[variable]] = value
+
+    return values
+
+
+def simulate_scenarios(models, data, scenarios, baseline=None, target='var1(t)', scaler=None, scalecols=None):
+    """Forecast many restriction timelines with one batched predict per model.
+
+    VALUE: return a Pandas dataframe with a row per model, scenario and day of the forecast (yhat), the
+    baseline forecast and their difference (delta)
+
+    PARAMETERS:
+      - models is a fitted model or a dictionary of names and fitted models, all trained on data's columns.
+      - data is a Pandas dataframe of the model features and target indexed by day, e.g. from arrange_cols.
+      - scenarios is a dictionary of scenario names and restriction periods dataframes.
+      - baseline is the restriction periods the deltas are measured against, restriction_periods if None.
+      - target is the name of the target column in data, which is dropped from the features.
+      - scaler is an optional fitted scaler applied to scalecols before predicting, as in walk forward validation.
+      - scalecols is the list of columns the scaler was fitted on.
+    """
+    models = models if isinstance(models, dict) else {'model': models}
+    baseline = baseline if baseline is not None else restriction_periods
+
+    X = data.drop(columns=target)
+    variables = [col for col in X.columns if col in restriction_defaults]
+    if not variables:
+        raise Exception("Invalid data - Needs lockdown predictor columns, see create_lockdown_predictors.")
+
+    base = X.copy()
+    if scaler is not None:
+        base.loc[:, scalecols] = scaler.transform(base.loc[:, scalecols])
+    base = base.values.astype(np.float32)
+
+    names = ['baseline'] + list(scenarios)
+    values = restriction_values(X.index, [baseline] + list(scenarios.values()), variables)
+
+    # Every scenario's feature matrix stacked into one array, differing only in the lockdown columns
+    stacked = np.repeat(base[np.newaxis], len(names), axis=0)
+    stacked[:, :, [X.columns.get_loc(variable) for variable in variables]] = values
+    stacked = stacked.reshape(-1, base.shape[1])
+
+    results = []
+    for model_name, model in models.items():
+        yhat = np.asarray(model.predict(stacked)).reshape(len(names), len(X))
+        delta = yhat[1:] - yhat[0]
+        results.append(pd.DataFrame({'model': model_name,
+                                     'scenario': np.repeat(names[1:], len(X)),
+                                     'DateTime': np.tile(X.index.values, len(names) - 1),
+                                     'yhat': yhat[1:].ravel(),
+                                     'baseline': np.tile(yhat[0], len(names) - 1),
+                                     'delta': delta.ravel()}))
+
+    return pd.concat(results, ignore_index=True)
+
+
+def scenario_summary(results):
+    """Summarise simulate_scenarios results by model and scenario.
+
+    VALUE: return a Pandas dataframe of the total and mean daily delta, and the days each scenario changes
+    """
+    changed = results.assign(changed=results['delta'] != 0)
+
+    return changed.groupby(['model', 'scenario'], sort=False).agg(total_delta=('delta', 'sum'),
+                                                                   mean_delta=('delta', 'mean'),
+                                                                   days_changed=('changed', 'sum'))
@@ -0,0 +1,209 @@
+import os, os.path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from mobility import file_hash
+
+# Spatial helpers for the Leeds boundary data.  Boundary files are read for only the features inside a bounding
+# box or matching a name filter, and the Leeds geometries are clipped, simplified and cached as GeoParquet keyed
+# by the source files, so later sessions never reparse the national shapefiles.  AreaIndex builds an STRtree over
+# the cached areas for fast point-in-area lookups of camera locations.
+#
+# geopandas and shapely are optional dependencies and are only imported when these helpers are used.
+#
+# Example:
+#   areas = leeds_areas("data/Boundaries/Local_Authority_Districts_(December_2020)_UK_BFC.shp", 'LAD20NM')
+#   index = AreaIndex(areas, 'LAD20NM')
+#   cameras['area'] = index.locate(cameras, x='longitude', y='latitude')
+
+# Bounding box around the Leeds boundary in British National Grid (EPSG:27700) metres
+LEEDS_BBOX = (413000, 422500, 447000, 450500)
+LEEDS_NAMES = ["Leeds"]
+
+
+def import_geopandas():
+    try:
+        import geopandas as gpd
+    except ImportError:
+        raise ImportError("The spatial helpers need geopandas, install it with 'pip install geopandas'.")
+    return gpd
+
+
+def read_boundaries(path, bbox=None, names=None, name_col=None):
+    """Read the boundary features inside a bounding box and/or matching a list of names.
+
+    With pyogrio installed both filters are applied while the file is read, so features outside them are never
+    parsed.  Otherwise the bounding box is applied while reading and the names afterwards.
+
+    VALUE: return a GeoDataFrame
+
+    PARAMETERS:
+      - path is the boundary file, e.g. a shapefile.
+      - bbox is an optional (minx, miny, maxx, maxy) tuple in the file's coordinate system.
+      - names is an optional list of names to keep.
+      - name_col is the column holding the names, e.g. 'LAD20NM'.  Needed with names.
+    """
+    gpd = import_geopandas()
+    if names is not None and name_col is None:
+        raise Exception("Invalid name_col - Needs the name column to filter names on.")
+
+    try:
+        import pyogrio
+    except ImportError:
+        gdf = gpd.read_file(path, bbox=bbox)
+        if names is not None:
+            gdf = gdf.loc[gdf[name_col].isin(names)]
+        return gdf
+
+    where = None
+    if names is not None:
+        quoted = ", ".join("'" + str(name).replace("'", "''") + "'" for name in names)
+        where = f"{name_col} IN ({quoted})"
+
+    return pyogrio.read_dataframe(path, bbox=bbox, where=where)
+
+
+def simplify_areas(gdf, bbox=None, tolerance=10):
+    """Clip areas to a bounding box and simplify their outlines.
+
+    VALUE: return a GeoDataFrame
+
+    PARAMETERS:
+      - gdf is a GeoDataFrame of areas.
+      - bbox is an optional (minx, miny, maxx, maxy) tuple to clip to, in the areas' coordinate system.
+      - tolerance is the largest distance an outline may move when simplified, in the coordinate system's units
+        (metres for British National Grid).
+    """
+    gpd = import_geopandas()
+    from shapely.geometry import box
+
+    if bbox is not None:
+        gdf = gpd.clip(gdf, box(*bbox))
+    gdf = gdf.copy()
+    gdf['geometry'] = gdf.geometry.simplify(tolerance, preserve_topology=True)
+
+    return gdf.reset_index(drop=True)
+
+
+def source_files(path):
+    """Return the files making up a boundary dataset, i.e. a shapefile's .shp, .shx, .dbf and .prj files."""
+    stem, ext = os.path.splitext(path)
+    if ext.lower() != ".shp":
+        return [path]
+
+    return [stem + part for part in [".shp", ".shx", ".dbf", ".prj"] if os.path.exists(stem + part)]
+
+
+def leeds_areas(path, name_col, names=LEEDS_NAMES, bbox=LEEDS_BBOX, tolerance=10, cache_dir="data/Boundaries/cache"):
+    """Return the Leeds areas from a national boundary file, from a GeoParquet cache where possible.
+
+    The cache is keyed by a hash of the source files and the filter and simplification settings.  GeoParquet
+    needs pyarrow, and without it the areas are re-read each time.
+
+    VALUE: return a GeoDataFrame of clipped and simplified areas
+
+    PARAMETERS:
+      - path is the boundary file, e.g. a shapefile.
+      - name_col is the column holding the area names, e.g. 'LAD20NM' or 'CTYUA20NM'.
+      - names is the list of area names to keep, or None to keep every area in the bounding box.
+      - bbox is the (minx, miny, maxx, maxy) bounding box to read and clip to, or None.
+      - tolerance is the simplification tolerance passed to simplify_areas.
+      - cache_dir is the folder for the cached areas.
+    """
+    gpd = import_geopandas()
+    key = joblib.hash(([file_hash(f) for f in source_files(path)], name_col, names, bbox, tolerance))
+    cache_path = os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(path))[0]}_{key}.parquet")
+
+    if os.path.exists(cache_path):
+        return gpd.read_parquet(cache_path)
+
+    areas = simplify_areas(read_boundaries(path, bbox, names, name_col), bbox, tolerance)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        areas.to_parquet(cache_path)
+    except ImportError:
+        print("Areas not cached - GeoParquet needs pyarrow")
+
+    return areas
+
+
+class AreaIndex:
+    """STRtree index over a set of areas for fast point-in-area lookups.
+
+    PARAMETERS:
+      - areas is a GeoDataFrame of areas.
+      - name_col is the column holding the area names returned by locate.
+    """
+
+    def __init__(self, areas, name_col):
+        import shapely
+        from shapely.strtree import STRtree
+
+        self.areas = areas.reset_index(drop=True)
+        self.names = self.areas[name_col].values
+        self.geoms = list(self.areas.geometry.values)
+        self.tree = STRtree(self.geoms)
+        self.vectorised = int(shapely.__version__.split(".")[0]) >= 2
+        # Shapely 1.x queries return geometries rather than positions
+        self.positions = {id(geom): i for i, geom in enumerate(self.geoms)}
+
+    def points(self, dataf, x, y, crs):
+        """Convert coordinate columns to points in the areas' coordinate system."""
+        gpd = import_geopandas()
+        points = gpd.GeoSeries(gpd.points_from_xy(dataf[x], dataf[y]), crs=crs)
+        if self.areas.crs is not None and crs is not None:
+            points = points.to_crs(self.areas.crs)
+
+        return points.values
+
+    def area_positions(self, dataf, x, y, crs):
+        """Return the position in areas of the area containing each point, or -1 for points outside every area."""
+        points = self.points(dataf, x, y, crs)
+        area = np.full(len(points), -1)
+
+        if self.vectorised:
+            point_pos, area_pos = self.tree.query(np.asarray(points), predicate='within')
+            # A point on a shared border is given to the first area containing it
+            area[point_pos[::-1]] = area_pos[::-1]
+        else:
+            for i, point in enumerate(points):
+                for geom in self.tree.query(point):
+                    if geom.contains(point):
+                        area[i] = self.positions[id(geom)]
+                        break
+
+        return area
+
+    def locate(self, dataf, x='longitude', y='latitude', crs="EPSG:4326"):
+        """Find the area containing each point.
+
+        VALUE: return a Pandas Series of area names, missing for points outside every area, with dataf's index
+
+        PARAMETERS:
+          - dataf is a Pandas dataframe with coordinate columns, e.g. one row per camera.
+          - x and y are the coordinate column names.
+          - crs is the coordinate system of x and y, WGS84 longitude and latitude by default.
+        """
+        area = self.area_positions(dataf, x, y, crs)
+
+        return pd.Series(np.where(area >= 0, self.names[np.maximum(area, 0)], None), index=dataf.index)
+
+    def join(self, dataf, x='longitude', y='latitude', crs="EPSG:4326"):
+        """Add the attributes of the area containing each point to a dataframe.
+
+        VALUE: return dataf with the area columns (except geometry) added, missing for points outside every area
+
+        PARAMETERS:
+          - dataf is a Pandas dataframe with coordinate columns.
+          - x, y and crs are as for locate.
+        """
+        area = self.area_positions(dataf, x, y, crs)
+
+        attributes = pd.DataFrame(self.areas.drop(columns='geometry')).iloc[np.maximum(area, 0)]
+        attributes = attributes.reset_index(drop=True)
+        attributes.loc[area < 0, :] = np.nan
+        attributes.index = dataf.index
+
+        return pd.concat([dataf, attributes], axis=1)
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+from footfall.lazy import lazy_import
+
+# Weather feature layer.  The raw NCAS weather and the legacy daily weather file are turned into an hourly and a
+# daily weather table once per session, with any lagged and rolling weather features computed over the whole
+# table in one vectorised pass.  Footfall frames of any frequency are then joined to a table by a sorted as-of
+# lookup on the DatetimeIndex (binary search, no hashing or temporary key columns), taking the latest weather
+# row at or before each footfall timestamp within a tolerance.
+
+joblib = lazy_import('joblib')
+
+# Column names used for the weather tables
+WEATHER_COLUMNS = {'temp_°C': 'mean_temp', 'rain_mm': 'rain', "wind_ms¯¹": 'wind_speed'}
+WEATHER_AGG = {'mean_temp': 'mean', 'rain': 'sum', 'wind_speed': 'mean'}
+
+# Cache of built weather tables, keyed by a hash of the raw weather and feature settings
+weather_table_cache = {}
+
+
+def resample_weather(weather, freq):
+    """Resample raw NCAS weather to a regular frequency.
+
+    VALUE: return a Pandas dataframe of mean_temp, rain and wind_speed with a row for every period
+
+    PARAMETERS:
+      - weather is a Pandas dataframe of raw NCAS weather with a DatetimeIndex.
+      - freq is the pandas frequency to resample to, e.g. pd.offsets.Hour() or 'D'.
+    """
+    weather = weather[list(WEATHER_COLUMNS)].rename(columns=WEATHER_COLUMNS)
+
+    return weather.resample(freq).agg(WEATHER_AGG)
+
+
+def add_weather_features(table, lags=None, rolling=None):
+    """Add lagged and rolling weather features to a regular weather table.
+
+    Rolling features cover the periods before each row, e.g. ('rain', 3, 'sum') on the hourly table is the rain
+    in the previous 3 hours, named rain_sum3.  Lags are named like rain_lag1.
+
+    VALUE: return the weather table with the feature columns added
+
+    PARAMETERS:
+      - table is a Pandas dataframe of weather with a row for every period.
+      - lags is an optional dictionary of column names and lists of lags in periods, e.g. {'rain': [1, 2]}.
+      - rolling is an optional list of (column, window, aggregation) tuples, e.g. [('rain', 3, 'sum')].
+    """
+    features = {}
+    for col, col_lags in (lags or {}).items():
+        for lag in col_lags:
+            features[f"{col}_lag{lag}"] = table[col].shift(lag)
+
+    for col, window, agg in (rolling or []):
+        features[f"{col}_{agg}{window}"] = table[col].shift(1).rolling(window, min_periods=window).agg(agg)
+
+    if not features:
+        return table
+
+    return pd.concat([table, pd.DataFrame(features, index=table.index)], axis=1)
+
+
+def build_weather_tables(new_weather, previous_weather, lags=None, rolling=None):
+    """Build the hourly and daily weather tables, once per session for the same inputs.
+
+    The hourly table comes from the NCAS archive only.  The daily table uses the legacy weather up to
+    31/03/2017 and the NCAS archive after it, as create_weather_predictors always has.  Features are computed
+    on the complete regular tables, then rows missing any of the base weather columns are dropped.
+
+    VALUE: return a dictionary with 'hour' and 'day' weather tables indexed by time
+
+    PARAMETERS:
+      - new_weather is a Pandas dataframe of raw NCAS weather with a DatetimeIndex.
+      - previous_weather is a Pandas dataframe of the legacy daily weather with a DatetimeIndex.
+      - lags and rolling are the feature settings passed to add_weather_features, in periods of each table.
+    """
+    key = joblib.hash((new_weather, previous_weather, lags, rolling))
+    if key in weather_table_cache:
+        return weather_table_cache[key]
+
+    hourly = resample_weather(new_weather, pd.offsets.Hour())
+
+    daily = resample_weather(new_weather.loc[new_weather.index > '2017-03-31'], "D")
+    previous_weather = previous_weather[list(WEATHER_AGG)]
+    daily = pd.concat([previous_weather, daily]).sort_index()
+    daily = daily.loc[~daily.index.duplicated(keep='last')].asfreq("D")
+
+    tables = {}
+    for name, table in [('hour', hourly), ('day', daily)]:
+        table = add_weather_features(table, lags, rolling)
+        tables[name] = table.dropna(subset=list(WEATHER_AGG))
+
+    weather_table_cache[key] = tables
+
+    return tables
+
+
+def join_weather(dataf, table, tolerance=None):
+    """Join weather to a footfall frame by its DatetimeIndex with a sorted as-of lookup.
+
+    Each footfall row takes the latest weather row at or before its timestamp, so the daily table can be
+    joined to hourly footfall and the hourly table to 15 minute footfall.  The footfall frame's row order and
+    index are kept.
+
+    VALUE: return the footfall dataframe with the weather columns added, missing where no weather row is within
+    the tolerance
+
+    PARAMETERS:
+      - dataf is a Pandas dataframe with a DatetimeIndex.
+      - table is a weather table from build_weather_tables.
+      - tolerance is the largest gap allowed between a footfall timestamp and its weather row, e.g. '1D' to
+        join the daily table to hourly footfall.  None means an exact timestamp match.
+    """
+    tolerance = pd.Timedelta(tolerance) if tolerance is not None else pd.Timedelta(0)
+    times = pd.DatetimeIndex(dataf.index)
+
+    # Position of the latest weather row at or before each footfall timestamp
+    pos = table.index.searchsorted(times, side='right') - 1
+    matched = pos >= 0
+    matched[matched] = (times[matched] - table.index[pos[matched]]) <= tolerance
+
+    weather = table.iloc[np.where(matched, pos, 0)].reset_index(drop=True)
+    weather.loc[~matched, :] = np.nan
+    weather.index = dataf.index
+
+    return pd.concat([dataf, weather], axis=1)
@@ -0,0 +1,368 @@
+import argparse
+import glob
+import importlib
+import inspect
+import json
+import os, os.path
+import time
+
+import joblib
+import pandas as pd
+
+from footfall import core, features, modelling
+from footfall.lazy import lazy_from
+from mobility import file_hash
+
+# End to end footfall workflow run as a DAG of stages: download, normalise, dedup, clean, features, train and
+# evaluate.  Each stage's output is saved in the cache folder under a key hashed from the stage's code and the
+# source of the library modules it calls, its parameters and the output hashes of the stages it depends on.
+# A re-run loads or skips any stage whose key already has an output, so a failure part way through restarts
+# from the failed stage, and changing one stage's parameters or library code only recomputes that stage and
+# the stages downstream of it.
+#
+# The download stage always runs, as only the Data Mill North listing can say whether new files have arrived.
+# It skips files already downloaded, and its output is the hash of every csv, so nothing downstream reruns
+# unless the files have changed.
+#
+# Run from the repository root:
+#   python workflow.py run
+#   python workflow.py run --until clean --no-download
+#   python workflow.py run --tree 500 --force train
+#   python workflow.py status
+
+STAGE_NAMES = ["download", "normalise", "dedup", "clean", "features", "train", "evaluate"]
+
+download_data = lazy_from('footfall_data_download', 'download_data')
+normalise_data = lazy_from('footfall_data_download', 'normalise_data')
+MinMaxScaler = lazy_from('sklearn.preprocessing', 'MinMaxScaler')
+mean_absolute_error = lazy_from('sklearn.metrics', 'mean_absolute_error')
+mean_squared_error = lazy_from('sklearn.metrics', 'mean_squared_error')
+
+
+class Stage:
+    """One step of a workflow.
+
+    PARAMETERS:
+      - name is the stage name, used for its cache folder.
+      - func is called with the outputs of deps in order, followed by params as keyword arguments.
+      - deps is a list of the names of the stages whose outputs func needs.
+      - params is a dictionary of keyword arguments for func.  They are part of the stage's cache key.
+      - always_run, if True, runs the stage every time.  Downstream stages still skip when its output is unchanged.
+      - code is a list of the modules (by name, e.g. 'footfall.core') and helper functions func calls into.
+        Their source is part of the stage's cache key along with func's own, so editing them reruns the stage.
+    """
+
+    def __init__(self, name, func, deps=(), params=None, always_run=False, code=()):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.params = params or {}
+        self.always_run = always_run
+        self.code = list(code)
+
+    def code_hash(self):
+        sources = []
+        code = [importlib.import_module(obj) if isinstance(obj, str) else obj for obj in self.code]
+        for obj in [self.func] + code:
+            try:
+                sources.append(inspect.getsource(obj))
+            except (OSError, TypeError):
+                sources.append(getattr(obj, '__qualname__', obj.__name__))
+
+        return joblib.hash(sources)
+
+
+class Workflow:
+    """A DAG of stages whose outputs are persisted under a hash of their code, parameters and inputs.
+
+    PARAMETERS:
+      - stages is a list of Stage objects.
+      - cache_dir is the folder the stage outputs are saved in.
+    """
+
+    def __init__(self, stages, cache_dir):
+        self.stages = {stage.name: stage for stage in stages}
+        self.cache_dir = cache_dir
+        for stage in stages:
+            missing = [dep for dep in stage.deps if dep not in self.stages]
+            if missing:
+                raise Exception(f"Invalid deps - Stage {stage.name} needs unknown stages {missing}.")
+
+    def order(self, until=None):
+        """Return the stage names needed for until (every stage if None) with each stage after its deps."""
+        targets = [until] if until is not None else list(self.stages)
+        ordered, visiting = [], set()
+
+        def visit(name):
+            if name in ordered:
+                return
+            if name in visiting:
+                raise Exception(f"Invalid workflow - Stage {name} depends on itself.")
+            if name not in self.stages:
+                raise Exception(f"Invalid stage - Needs one of {list(self.stages)}.")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            ordered.append(name)
+
+        for name in targets:
+            visit(name)
+
+        return ordered
+
+    def stage_key(self, stage, dep_hashes):
+        return joblib.hash((stage.name, stage.code_hash(), stage.params, dep_hashes))
+
+    def paths(self, name, key):
+        folder = os.path.join(self.cache_dir, name)
+        return os.path.join(folder, f"{key}.joblib"), os.path.join(folder, f"{key}.json")
+
+    def load_meta(self, name, key):
+        output_path, meta_path = self.paths(name, key)
+        if not (os.path.exists(output_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path) as f:
+            return json.load(f)
+
+    def save(self, name, key, output, meta):
+        output_path, meta_path = self.paths(name, key)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        # Write to temporary files first so a failed run never leaves a half written output behind
+        joblib.dump(output, output_path + ".tmp")
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f, indent=1)
+        os.replace(output_path + ".tmp", output_path)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def run(self, until=None, force=()):
+        """Run the workflow, skipping stages whose output for the current key is already saved.
+
+        VALUE: return the output of until, or a dictionary of every stage's output if until is None
+
+        PARAMETERS:
+          - until is the last stage to run, e.g. 'clean'.  Only it and the stages it depends on are run.
+          - force is a list of stage names to rerun even if their output is saved.
+        """
+        keys, hashes, outputs = {}, {}, {}
+
+        def output(name):
+            if name not in outputs:
+                outputs[name] = joblib.load(self.paths(name, keys[name])[0])
+            return outputs[name]
+
+        for name in self.order(until):
+            stage = self.stages[name]
+            keys[name] = self.stage_key(stage, [hashes[dep] for dep in stage.deps])
+
+            meta = self.load_meta(name, keys[name])
+            if meta is not None and not stage.always_run and name not in force:
+                hashes[name] = meta['output_hash']
+                print(f"{name}: up to date ({keys[name][:8]})")
+                continue
+
+            print(f"{name}: running")
+            start = time.perf_counter()
+            result = stage.func(*[output(dep) for dep in stage.deps], **stage.params)
+            seconds = time.perf_counter() - start
+
+            hashes[name] = joblib.hash(result)
+            outputs[name] = result
+            if meta is None or meta['output_hash'] != hashes[name] or name in force:
+                self.save(name, keys[name], result, {'stage': name,
+                                                     'output_hash': hashes[name],
+                                                     'params': {k: repr(v) for k, v in stage.params.items()},
+                                                     'deps': dict(zip(stage.deps, [hashes[d] for d in stage.deps])),
+                                                     'seconds': seconds,
+                                                     'finished': time.strftime("%Y-%m-%dT%H:%M:%S")})
+            print(f"{name}: finished in {seconds:.1f}s ({keys[name][:8]})")
+
+        if until is not None:
+            return output(until)
+        return {name: output(name) for name in keys}
+
+    def status(self):
+        """Report whether each stage's output is saved for the current code, parameters and inputs.
+
+        Always run stages are checked against their last saved output.  A stage after a stage with no saved
+        output is reported as unknown, since its key depends on an output that doesn't exist yet.
+
+        VALUE: return a Pandas dataframe indexed by stage with key, status and the seconds the saved run took
+        """
+        hashes, rows = {}, []
+        for name in self.order():
+            stage = self.stages[name]
+            if any(hashes[dep] is None for dep in stage.deps):
+                hashes[name] = None
+                rows.append({'stage': name, 'key': None, 'status': 'unknown', 'seconds': None})
+                continue
+
+            key = self.stage_key(stage, [hashes[dep] for dep in stage.deps])
+            meta = self.load_meta(name, key)
+            hashes[name] = meta['output_hash'] if meta is not None else None
+            if stage.always_run:
+                state = 'always runs'
+            else:
+                state = 'saved' if meta is not None else 'to run'
+            rows.append({'stage': name, 'key': key[:8], 'status': state,
+                         'seconds': meta['seconds'] if meta is not None else None})
+
+        return pd.DataFrame(rows).set_index('stage')
+
+
+def download_stage(datadir, download=True):
+    """Download any new Data Mill North files.  VALUE: return a dictionary of each csv file name and its hash"""
+    if download:
+        download_data(datadir)
+    files = sorted(glob.glob(os.path.join(datadir, "*.csv")))
+    if not files:
+        raise Exception(f"Invalid datadir - No csv files found in {datadir}.")
+
+    return {os.path.basename(f): file_hash(f) for f in files}
+
+
+def normalise_stage(manifest, datadir):
+    """Import, merge and tidy the downloaded files, as written to data/LCC_footfall_2021.gz."""
+    return normalise_data(datadir)
+
+
+def dedup_stage(dataf, detect_faults=True):
+    """Combine the cameras that moved location, flag faulty camera hours and remove duplicate records."""
+    dataf = dataf.pipe(core.start_pipeline).pipe(core.combine_cameras)
+    if detect_faults:
+        dataf = dataf.pipe(core.flag_faults)
+
+    return dataf.pipe(core.check_remove_dup)
+
+
+def clean_stage(dataf, start_date='2008-08-27'):
+    """Apply the rest of the notebook cleaning chain to the deduplicated footfall.
+
+    Flagged faults are imputed from the detector's expected counts, and camera-days with a fault that cannot be
+    imputed are dropped whole, see core.remove_faults.
+    """
+    if 'Fault' in dataf.columns:
+        dataf = dataf.pipe(core.remove_faults)
+
+    return (dataf
+            .pipe(core.set_start_date, start_date)
+            .pipe(core.remove_new_cameras)
+            .pipe(core.create_BRC_MonthNum))
+
+
+def features_stage(dataf, n_in=7, date_predictors=True):
+    """Build the modelling frame from the all-camera daily total, lockdown (and date) predictors and lags."""
+    daily = dataf.groupby([pd.Grouper(key='DateTime', freq='D')])['Count'].sum().to_frame().astype(float)
+    predictors = features.create_lockdown_predictors(daily.drop(columns='Count'))
+    if date_predictors:
+        predictors = features.create_date_predictors(predictors)
+    supervised = features.series_to_supervised(daily[['Count']], n_in)
+
+    return features.arrange_cols(predictors.join(supervised, how='inner'), n_in)
+
+
+def scale_columns(n_in):
+    return [f'var1(t-{i})' for i in range(1, n_in + 1)]
+
+
+def train_stage(data, n_test=30, n_in=7, tree=100, backend="random_forest", seed=0):
+    """Fit a model on everything but the last n_test days, seeded so a refit gives the same model.
+
+    VALUE: return a dictionary of the model and scaler
+    """
+    train = data.iloc[:-n_test].copy()
+    scalecols = scale_columns(n_in)
+    scaler = MinMaxScaler()
+    train.loc[:, scalecols] = scaler.fit_transform(train.loc[:, scalecols])
+
+    model = modelling.create_regressor(backend, tree)
+    if 'random_state' in model.get_params():
+        model.set_params(random_state=seed)
+    model.fit(train.iloc[:, :-1].values, train.iloc[:, -1].values)
+
+    return {'model': model, 'scaler': scaler, 'scalecols': scalecols, 'columns': list(data.columns)}
+
+
+def evaluate_stage(data, trained, n_test=30):
+    """Score the trained model on the last n_test days.  VALUE: return a dictionary of mae, mse and predictions"""
+    test = data.iloc[-n_test:][trained['columns']].copy()
+    test.loc[:, trained['scalecols']] = trained['scaler'].transform(test.loc[:, trained['scalecols']])
+
+    y = test.iloc[:, -1].values
+    yhat = trained['model'].predict(test.iloc[:, :-1].values)
+
+    return {'mae': float(mean_absolute_error(y, yhat)),
+            'mse': float(mean_squared_error(y, yhat)),
+            'predictions': pd.DataFrame({'y': y, 'yhat': yhat}, index=test.index)}
+
+
+def footfall_workflow(datadir="data/lcc_footfall", cache_dir="data/workflow", download=True, detect_faults=True,
+                      start_date='2008-08-27', n_in=7, date_predictors=True, n_test=30, tree=100,
+                      backend="random_forest", seed=0):
+    """Build the end to end footfall workflow.
+
+    VALUE: return a Workflow
+
+    PARAMETERS:
+      - datadir is the folder the Data Mill North csv files are downloaded to.
+      - cache_dir is the folder the stage outputs are saved in.
+      - download, if False, uses the files already in datadir without checking for new ones.
+      - detect_faults, if True, flags camera dropouts, stuck counters and spikes in the dedup stage (see
+        CameraFaultDetector) and the clean stage removes them.
+      - start_date is the first date kept by the clean stage.
+      - n_in is the number of time lags.
+      - date_predictors, if True, adds month and weekday dummies to the lockdown predictors.
+      - n_test is the number of days held back to evaluate the model on.
+      - tree is the number of trees (or boosting iterations).
+      - backend is a regressor backend name, see regressor_backends.
+      - seed is the random_state the model is trained with.
+    """
+    return Workflow([
+        Stage("download", download_stage, params={'datadir': datadir, 'download': download}, always_run=True,
+              code=['footfall_data_download', 'mobility']),
+        Stage("normalise", normalise_stage, ["download"], {'datadir': datadir}, code=['footfall_data_download']),
+        Stage("dedup", dedup_stage, ["normalise"], {'detect_faults': detect_faults}, code=['footfall.core']),
+        Stage("clean", clean_stage, ["dedup"], {'start_date': start_date}, code=['footfall.core']),
+        Stage("features", features_stage, ["clean"], {'n_in': n_in, 'date_predictors': date_predictors},
+              code=['footfall.features', 'footfall.core']),
+        Stage("train", train_stage, ["features"],
+              {'n_test': n_test, 'n_in': n_in, 'tree': tree, 'backend': backend, 'seed': seed},
+              code=['footfall.modelling', scale_columns]),
+        Stage("evaluate", evaluate_stage, ["features", "train"], {'n_test': n_test}),
+    ], cache_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the footfall workflow, skipping stages that are up to date.")
+    parser.add_argument("command", choices=["run", "status"])
+    parser.add_argument("--until", choices=STAGE_NAMES)
+    parser.add_argument("--force", nargs="+", choices=STAGE_NAMES, default=[])
+    parser.add_argument("--datadir", default="data/lcc_footfall")
+    parser.add_argument("--cache-dir", default="data/workflow")
+    parser.add_argument("--no-download", action="store_true")
+    parser.add_argument("--no-fault-detection", action="store_true")
+    parser.add_argument("--start-date", default='2008-08-27')
+    parser.add_argument("--n-in", type=int, default=7)
+    parser.add_argument("--no-date-predictors", action="store_true")
+    parser.add_argument("--n-test", type=int, default=30)
+    parser.add_argument("--tree", type=int, default=100)
+    parser.add_argument("--backend", default="random_forest")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    workflow = footfall_workflow(args.datadir, args.cache_dir, not args.no_download, not args.no_fault_detection,
+                                 args.start_date, args.n_in, not args.no_date_predictors, args.n_test, args.tree,
+                                 args.backend, args.seed)
+
+    if args.command == "status":
+        print(workflow.status().to_string())
+        return
+
+    result = workflow.run(args.until, args.force)
+    if args.until in (None, "evaluate"):
+        evaluation = result['evaluate'] if args.until is None else result
+        print(f"MAE {evaluation['mae']:.1f}, MSE {evaluation['mse']:.1f}")
+
+
+if __name__ == "__main__":
+    main()